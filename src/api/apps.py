@@ -6,3 +6,9 @@ class ApiConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        """Открытие базы GeoIP при старте воркера."""
+        from .geo import open_geoip_reader
+
+        open_geoip_reader()
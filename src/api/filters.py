@@ -5,9 +5,14 @@ import django_filters
 from django.db.models import Q
 from django.utils import timezone
 from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
 
+from config.constants import MAX_DISTANCE, messages
 from events.models import Event
-from users.models import Friendship, User
+from users.models import User
+
+from .geo import filter_nearby
+from .services import FriendshipService
 
 
 class UserFilter(filters.FilterSet):
@@ -53,40 +58,58 @@ class OrganizerNameFilter(django_filters.Filter):
     """Класс фильтрации мероприятий по организатору."""
 
     def filter(self, queryset, value):
-        """Метод фильтрации мероприятий по имени/фамилии организатора."""
+        """Метод фильтрации мероприятий по имени/фамилии организатора.
+
+        Поиск идёт по подстроке в organizer_name, в PostgreSQL с
+        триграммным индексом, в SQLite полным просмотром таблицы.
+        """
         if value:
-            return queryset.filter(
-                Q(event__is_organizer=True)
-                & (
-                    Q(event__user__last_name__icontains=value)
-                    | Q(event__user__first_name__icontains=value)
-                )
-            )
+            return queryset.filter(organizer_name__contains=value.lower())
         return queryset
 
 
+def get_day_bounds(day):
+    """Границы дня в текущем часовом поясе: [начало дня, начало следующего)."""
+    return (
+        timezone.make_aware(datetime.datetime.combine(day, datetime.time())),
+        timezone.make_aware(
+            datetime.datetime.combine(
+                day + datetime.timedelta(days=1), datetime.time()
+            )
+        ),
+    )
+
+
+def get_weekend_bounds():
+    """Границы текущих или ближайших выходных: с субботы по понедельник."""
+    today = timezone.localdate()
+    if today.weekday() == 6:
+        saturday = today - datetime.timedelta(days=1)
+    else:
+        saturday = today + datetime.timedelta(days=5 - today.weekday())
+    return (
+        get_day_bounds(saturday)[0],
+        get_day_bounds(saturday + datetime.timedelta(days=1))[1],
+    )
+
+
 class EventDateFilter(django_filters.Filter):
     """Класс фильтрации мероприятий по дате."""
 
     def filter(self, queryset, value):
-        """Метод фильтрации в интервале дат start_date и end_date."""
+        """Метод фильтрации в интервале дат start_date и end_date.
+
+        Дата переводится в границы дня, чтобы сравнение шло по самим
+        полям дат и использовало индексы.
+        """
         if value:
             try:
                 date_value = datetime.datetime.strptime(
                     value, "%Y-%m-%d"
                 ).date()
-                return queryset.filter(
-                    Q(start_date__date__lte=date_value)
-                    & (
-                        Q(end_date__date__gte=date_value)
-                        | Q(end_date__isnull=True)
-                    )
-                )
-            except ValueError as error:
-                raise ValueError(
-                    "Фильтр по дате не соответствует шаблону '%Y-%m-%d'.",
-                    error,
-                )
+            except ValueError:
+                raise ValidationError({"date": messages.INVALID_EVENT_DATE})
+            return queryset.in_period(*get_day_bounds(date_value))
         return queryset
 
 
@@ -156,6 +179,28 @@ class EventsFilter(filters.FilterSet):
     organizer_is_friend = django_filters.Filter(
         method="filter_organizer_is_friend", label="Организатор-друг"
     )
+    near = django_filters.CharFilter(
+        method="filter_near", label="Координаты центра поиска: lat,lon"
+    )
+    radius = django_filters.NumberFilter(
+        method="filter_radius", min_value=0, label="Радиус поиска, км"
+    )
+    date_from = django_filters.IsoDateTimeFilter(
+        method="filter_date_from", label="Идут после момента"
+    )
+    date_to = django_filters.IsoDateTimeFilter(
+        method="filter_date_to", label="Начинаются до момента"
+    )
+    period = django_filters.ChoiceFilter(
+        method="filter_period",
+        choices=(("upcoming", "Предстоящие"), ("weekend", "Выходные")),
+        label="Период",
+    )
+    ordering = django_filters.ChoiceFilter(
+        method="filter_ordering",
+        choices=(("distance", "Расстояние"),),
+        label="Сортировка",
+    )
     # interests = filters.AllValuesMultipleFilter(field_name="interests__name")
 
     class Meta:
@@ -176,17 +221,56 @@ class EventsFilter(filters.FilterSet):
     def filter_organizer_is_friend(self, queryset, name, value):
         """Метод фильтрации по друзьям-организаторам."""
         if value and self.request.user.is_authenticated:
-            friendships = Friendship.objects.filter(
-                initiator=self.request.user
-            ) | Friendship.objects.filter(friend=self.request.user)
-            friends = []
-            for friendship in friendships:
-                if friendship.initiator == self.request.user:
-                    friends.append(friendship.friend)
-                else:
-                    friends.append(friendship.initiator)
-            friend_ids = [friend.id for friend in friends]
-            return Event.objects.filter(
-                event__user__in=friend_ids, event__is_organizer=True
-            )
+            friend_ids = FriendshipService.get_friend_ids(self.request.user.id)
+            return queryset.filter(organizer__in=friend_ids)
         return queryset
+
+    def filter_date_from(self, queryset, name, value):
+        """Метод фильтрации мероприятий, идущих после момента date_from."""
+        return queryset.in_period(start=value)
+
+    def filter_date_to(self, queryset, name, value):
+        """Метод фильтрации мероприятий, начинающихся до момента date_to."""
+        return queryset.in_period(end=value)
+
+    def filter_period(self, queryset, name, value):
+        """Метод фильтрации предстоящих мероприятий и мероприятий выходных."""
+        if value == "weekend":
+            return queryset.in_period(*get_weekend_bounds())
+        return queryset.in_period(start=timezone.now())
+
+    def filter_near(self, queryset, name, value):
+        """Метод фильтрации по расстоянию от точки near.
+
+        Радиус берётся из параметра radius, по умолчанию MAX_DISTANCE км.
+        Мероприятия получают аннотацию distance.
+        """
+        if not value:
+            return queryset
+        try:
+            lat, lon = (float(part) for part in value.split(","))
+        except ValueError:
+            raise ValidationError({"near": messages.INVALID_NEAR_PARAM})
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValidationError({"near": messages.INVALID_NEAR_PARAM})
+        radius = self.form.cleaned_data.get("radius")
+        return filter_nearby(
+            queryset,
+            (lat, lon),
+            MAX_DISTANCE if radius is None else float(radius),
+            prefix="eventlocation__",
+        )
+
+    def filter_radius(self, queryset, name, value):
+        """Радиус применяется вместе с near в filter_near."""
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        """Метод сортировки мероприятий по расстоянию от точки near."""
+        if value != "distance":
+            return queryset
+        if "distance" not in queryset.query.annotations:
+            raise ValidationError(
+                {"ordering": messages.DISTANCE_ORDERING_WITHOUT_NEAR}
+            )
+        return queryset.order_by("distance", "-start_date", "-id")
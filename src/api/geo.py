@@ -1,91 +1,144 @@
-import http.client
+import threading
+from functools import reduce
+from math import cos, radians
+from operator import or_
 
-from django.contrib.gis.geoip2 import GeoIP2
-from django.core.exceptions import ObjectDoesNotExist
+import numpy as np
+from django.contrib.gis.geoip2 import GeoIP2, GeoIP2Exception
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import (
+    ASin,
+    Cast,
+    Cos,
+    Least,
+    Radians,
+    Sin,
+    Sqrt,
+)
 from django.shortcuts import get_object_or_404
-from geopy.distance import geodesic as gd
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support import expected_conditions as ec
-from selenium.webdriver.support.ui import WebDriverWait
+from django.utils import timezone
+from geoip2.errors import AddressNotFoundError
 
+from config.constants import (
+    EARTH_RADIUS_KM,
+    GEOIP_CACHE_MAX_SIZE,
+    GEOIP_CACHE_TTL,
+    LOCATION_MIN_DISTANCE,
+    LOCATION_REFRESH_THROTTLE,
+    LOCATION_STALE_AFTER,
+)
+from config.logging import logger
 from events.models import EventLocation
 from users.models import UserLocation
 
-# Адрес сайта "Яндекс.Карты"
-URL_YANDEX_MAPS = "https://yandex.ru/maps"
-
-
-def get_geo_event(city, address):
-    """Получение геолокации по Яндекс.Картам."""
-    # Время ожидания
-    delay = 3
-    # Подключение драйвера Google
-    options = Options()
-    options.add_argument("--headless")
-    driver = webdriver.Chrome(options=options)
-    # Переход на сайт
-    driver.get(URL_YANDEX_MAPS)
-    # Поиск формы ввода на сайте
-    elem_search_string = WebDriverWait(driver, delay).until(
-        ec.presence_of_element_located(
-            (By.XPATH, "//input[@class='input__control _bold']")
-        )
-    )
-    # Вписываем данные в форму
-    elem_search_string.send_keys(f"{city}, {address}")
-    # Запускаем поиск
-    elem_search_string.send_keys(Keys.ENTER)
-    # Поиск координат на сайте
-    try:
-        elem_search = WebDriverWait(driver, delay).until(
-            ec.presence_of_element_located(
-                (
-                    By.XPATH,
-                    "//div[@class='toponym-card-title-view__coords-badge']",
-                )
-            )
-        )
-        # Возврат координат адреса
-        if elem_search.text:
-            return list(map(float, elem_search.text.split(", ")))
-    except TimeoutException:
-        pass
-    return None
+from .cache import MISSING, LRUCache
+from .geocoding import (
+    geocode_event_location,
+    geocoding_queue,
+    get_cached_coordinates,
+    normalize_address,
+    save_event_coordinates,
+)
+from .geohash import get_bounding_box, get_geohash_cells
 
+_geoip_reader = None
+_geoip_lock = threading.Lock()
+geoip_cache = LRUCache(GEOIP_CACHE_MAX_SIZE, ttl=GEOIP_CACHE_TTL)
 
-def get_current_ip():
-    """Получение текущего IP-адреса."""
-    conn = http.client.HTTPConnection("ifconfig.me")
-    conn.request("GET", "/ip")
-    return conn.getresponse().read().decode("utf-8")
 
+def open_geoip_reader():
+    """Открытие общей для процесса базы GeoIP.
 
-def get_geo_ip():
-    """Получение текущей геолокации."""
-    try:
-        g = GeoIP2()
-        address = get_current_ip()
-        return g.city(address)
-    except ObjectDoesNotExist:
+    База открывается в режиме отображения в память (MODE_MMAP): страницы
+    файла разделяются между потоками и процессами воркера и не читаются
+    заново при каждом запросе. Вызывается при старте приложения.
+    Возвращает None, если база недоступна.
+    """
+    global _geoip_reader
+    with _geoip_lock:
+        if _geoip_reader is None:
+            try:
+                _geoip_reader = GeoIP2(cache=GeoIP2.MODE_MMAP)
+            except GeoIP2Exception as error:
+                logger.warning(f"База GeoIP недоступна: {error}")
+                return None
+        return _geoip_reader
+
+
+def get_geoip_reader():
+    """Получение общего для процесса экземпляра GeoIP2."""
+    return _geoip_reader or open_geoip_reader()
+
+
+def get_geoip_cache_stats():
+    """Статистика кэша определения города по IP-адресу."""
+    return geoip_cache.stats()
+
+
+def get_client_ip(request):
+    """Получение IP-адреса клиента.
+
+    Заголовок X-Real-IP nginx выставляет из $remote_addr и
+    перезаписывает значение клиента. X-Forwarded-For не используется:
+    его левые адреса передаёт сам клиент и может их подделать.
+    """
+    return request.META.get("HTTP_X_REAL_IP") or request.META.get(
+        "REMOTE_ADDR"
+    )
+
+
+def get_geo_ip(ip_address):
+    """Получение геолокации по IP-адресу.
+
+    Результаты, в том числе ненайденные адреса, кэшируются в памяти
+    процесса.
+    """
+    if not ip_address:
+        return None
+    data = geoip_cache.get(ip_address)
+    if data is not MISSING:
+        return data
+    reader = get_geoip_reader()
+    if reader is None:
         return None
+    try:
+        data = reader.city(ip_address)
+    except (AddressNotFoundError, GeoIP2Exception, ValueError):
+        data = None
+    geoip_cache.set(ip_address, data)
+    return data
 
 
-def save_user_location(user):
-    """Сохранение геолокации пользователя."""
-    if user and user.is_authenticated and user.is_geoip_allowed:
-        data = get_geo_ip()
-        if data:
-            values_for_update = {
-                "lon": data["longitude"],
-                "lat": data["latitude"],
-            }
-            UserLocation.objects.update_or_create(
-                user=user, defaults=values_for_update
-            )
+def refresh_user_location(request):
+    """Обновление геолокации пользователя по IP-адресу клиента.
+
+    Определение геолокации выполняется не чаще одного раза в
+    LOCATION_REFRESH_THROTTLE секунд для пользователя. Запись в БД
+    происходит, только если геолокация устарела или пользователь
+    переместился дальше LOCATION_MIN_DISTANCE км.
+    """
+    user = request.user
+    if not (user and user.is_authenticated and user.is_geoip_allowed):
+        return
+    if not cache.add(
+        f"user_location_refresh_{user.id}", True, LOCATION_REFRESH_THROTTLE
+    ):
+        return
+    data = get_geo_ip(get_client_ip(request))
+    if not data:
+        return
+    lat, lon = data["latitude"], data["longitude"]
+    location = UserLocation.objects.filter(user=user).first()
+    if location is None:
+        UserLocation.objects.create(user=user, lat=lat, lon=lon)
+        return
+    age = (timezone.now() - location.updated_at).total_seconds()
+    _, distances = get_distances((location.lat, location.lon), [(lat, lon)])
+    if age > LOCATION_STALE_AFTER or distances[0] > LOCATION_MIN_DISTANCE:
+        location.lat, location.lon = lat, lon
+        location.save()
 
 
 def get_user_location(user):
@@ -108,15 +161,145 @@ def get_user_distance(user1, user2, location2=None):
             location2 = None
     if data1 and location2:
         return {
-            "distance": round(
-                gd((data1["latitude"], data1["longitude"]), location2).km, 3
+            "distance": get_distance(
+                (data1["latitude"], data1["longitude"]), location2
             )
         }
     return None
 
 
+def get_distances(origin, coordinates, max_distance=None, limit=None):
+    """Пакетный расчёт расстояний от точки до массива координат.
+
+    Расстояния (в км, по формуле гаверсинусов) считаются за один
+    векторизованный проход. Возвращает кортеж из индексов координат и
+    расстояний до них, отсортированных по возрастанию расстояния.
+    Необязательно отсекает точки дальше max_distance и оставляет
+    не более limit ближайших.
+    """
+    points = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    lat1, lon1 = np.radians(np.asarray(origin, dtype=np.float64))
+    lat2, lon2 = np.radians(points[:, 0]), np.radians(points[:, 1])
+    hav = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(hav, 0, 1)))
+    indexes = np.arange(len(distances))
+    if max_distance is not None:
+        indexes = indexes[distances <= max_distance]
+    if limit is not None and limit < len(indexes):
+        nearest = np.argpartition(distances[indexes], limit)[:limit]
+        indexes = indexes[nearest]
+    indexes = indexes[np.argsort(distances[indexes], kind="stable")]
+    return indexes, np.round(distances[indexes], 3)
+
+
+def get_distance(origin, point):
+    """Расстояние в км между двумя точками.
+
+    Считается той же формулой гаверсинусов, что и в get_distances и
+    get_distance_expression, поэтому совпадает с расстояниями в списках.
+    """
+    _, distances = get_distances(origin, [point])
+    return float(distances[0])
+
+
+def get_distance_expression(origin, lat_field, lon_field):
+    """Выражение расстояния в км от точки origin до координат в полях.
+
+    Формула гаверсинусов вычисляется в базе данных, поэтому расстояние
+    можно использовать для отбора и сортировки в том же запросе.
+    """
+    lat1, lon1 = (radians(float(value)) for value in origin)
+    lat2 = Radians(Cast(F(lat_field), FloatField()))
+    lon2 = Radians(Cast(F(lon_field), FloatField()))
+    lat_sin = Sin((lat2 - lat1) / 2.0)
+    lon_sin = Sin((lon2 - lon1) / 2.0)
+    hav = lat_sin * lat_sin + cos(lat1) * Cos(lat2) * lon_sin * lon_sin
+    return 2.0 * EARTH_RADIUS_KM * ASin(Sqrt(Least(hav, 1.0)))
+
+
+def filter_nearby(queryset, origin, max_distance, prefix=""):
+    """Отбор записей в радиусе от точки с аннотацией distance.
+
+    Кандидаты отбираются по индексу координат внутри ограничивающего
+    прямоугольника, точное расстояние считается только для них.
+    """
+    min_lat, min_lon, max_lat, max_lon = get_bounding_box(
+        *origin, max_distance
+    )
+    return (
+        queryset.filter(
+            **{
+                f"{prefix}lat__range": (min_lat, max_lat),
+                f"{prefix}lon__range": (min_lon, max_lon),
+            }
+        )
+        .annotate(
+            distance=get_distance_expression(
+                origin, f"{prefix}lat", f"{prefix}lon"
+            )
+        )
+        .filter(distance__lte=max_distance)
+    )
+
+
+def get_users_nearby(user, max_distance):
+    """Получение пользователей в радиусе от текущего пользователя.
+
+    Кандидаты отбираются по ячейкам геохеша и ограничивающему
+    прямоугольнику, точное расстояние считается только для них.
+    Результат отсортирован по возрастанию расстояния.
+    """
+    if not (user and user.is_authenticated and user.is_geoip_allowed):
+        return []
+    origin = UserLocation.objects.filter(user=user).first()
+    if origin is None:
+        return []
+    min_lat, min_lon, max_lat, max_lon = get_bounding_box(
+        origin.lat, origin.lon, max_distance
+    )
+    locations = UserLocation.objects.filter(
+        lat__range=(min_lat, max_lat),
+        lon__range=(min_lon, max_lon),
+        user__is_geoip_allowed=True,
+    ).exclude(user=user)
+    cells = get_geohash_cells(min_lat, min_lon, max_lat, max_lon)
+    if cells:
+        locations = locations.filter(
+            reduce(or_, (Q(geohash__startswith=cell) for cell in cells))
+        )
+    rows = list(
+        locations.values_list(
+            "user_id", "user__first_name", "user__last_name", "lat", "lon"
+        )
+    )
+    if not rows:
+        return []
+    indexes, distances = get_distances(
+        (origin.lat, origin.lon),
+        [(row[3], row[4]) for row in rows],
+        max_distance=max_distance,
+    )
+    return [
+        {
+            "user": rows[index][0],
+            "first_name": rows[index][1],
+            "last_name": rows[index][2],
+            "distance": float(distance),
+        }
+        for index, distance in zip(indexes, distances)
+    ]
+
+
 def save_event_location(event, validated_data):
-    """Сохранение геолокации мероприятия."""
+    """Сохранение геолокации мероприятия.
+
+    Адрес из кэша геокодирования сохраняется сразу, остальные
+    геокодируются в фоновой очереди после фиксации транзакции, и
+    геолокация мероприятия заполняется асинхронно.
+    """
     if event:
         if "city" in validated_data:
             city = validated_data["city"]
@@ -126,14 +309,17 @@ def save_event_location(event, validated_data):
             address = validated_data["address"]
         else:
             address = event.address
-        data = None
         if city and address:
-            data = get_geo_event(city, address)
-            if data:
-                values_for_update = {"lon": data[1], "lat": data[0]}
-                EventLocation.objects.update_or_create(
-                    event=event, defaults=values_for_update
+            data = get_cached_coordinates(normalize_address(city, address))
+            if data is not MISSING:
+                if data:
+                    save_event_coordinates(event.id, data)
+                return
+            transaction.on_commit(
+                lambda: geocoding_queue.submit(
+                    geocode_event_location, event.id, str(city), address
                 )
+            )
 
 
 def get_event_location(event):
@@ -156,8 +342,41 @@ def get_event_distance(user, event, location2=None):
             location2 = None
     if data1 and location2:
         return {
-            "distance": round(
-                gd((data1["latitude"], data1["longitude"]), location2).km, 3
+            "distance": get_distance(
+                (data1["latitude"], data1["longitude"]), location2
             )
         }
     return None
+
+
+def get_events_nearby(user, max_distance):
+    """Получение мероприятий в радиусе от текущего пользователя.
+
+    Результат отсортирован по возрастанию расстояния.
+    """
+    origin = get_user_location(user)
+    if not origin:
+        return []
+    min_lat, min_lon, max_lat, max_lon = get_bounding_box(
+        origin["latitude"], origin["longitude"], max_distance
+    )
+    rows = list(
+        EventLocation.objects.filter(
+            lat__range=(min_lat, max_lat), lon__range=(min_lon, max_lon)
+        ).values_list("event_id", "event__name", "lat", "lon")
+    )
+    if not rows:
+        return []
+    indexes, distances = get_distances(
+        (origin["latitude"], origin["longitude"]),
+        [(row[2], row[3]) for row in rows],
+        max_distance=max_distance,
+    )
+    return [
+        {
+            "event": rows[index][0],
+            "name": rows[index][1],
+            "distance": float(distance),
+        }
+        for index, distance in zip(indexes, distances)
+    ]
@@ -0,0 +1,218 @@
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support import expected_conditions as ec
+from selenium.webdriver.support.ui import WebDriverWait
+
+from config.constants import (
+    GEOCODE_CACHE_MAX_SIZE,
+    GEOCODE_CACHE_NEGATIVE_TTL,
+    GEOCODE_CACHE_TTL,
+)
+from config.logging import logger
+from events.models import Event, EventLocation, GeocodeCache
+
+from .cache import MISSING, LRUCache
+from .tasks import TaskQueue
+
+# Адрес сайта "Яндекс.Карты"
+URL_YANDEX_MAPS = "https://yandex.ru/maps"
+
+# Сокращения, приводимые к полной форме при нормализации адреса
+ADDRESS_ABBREVIATIONS = {
+    "г": "",
+    "город": "",
+    "д": "",
+    "дом": "",
+    "ул": "улица",
+    "пр": "проспект",
+    "пр-т": "проспект",
+    "просп": "проспект",
+    "пер": "переулок",
+    "пл": "площадь",
+    "наб": "набережная",
+    "ш": "шоссе",
+    "б-р": "бульвар",
+    "бул": "бульвар",
+    "мкр": "микрорайон",
+    "корп": "корпус",
+    "стр": "строение",
+}
+
+geocoding_queue = TaskQueue("geocoding")
+geocode_memory_cache = LRUCache(GEOCODE_CACHE_MAX_SIZE)
+
+
+class BaseGeocoder:
+    """Базовый класс геокодера.
+
+    Метод geocode возвращает координаты [широта, долгота] или None, если
+    адрес не найден. Исключение означает временную ошибку, и задача
+    геокодирования будет повторена.
+    """
+
+    def geocode(self, city, address):
+        """Получение координат по городу и адресу."""
+        raise NotImplementedError
+
+
+class YandexMapsGeocoder(BaseGeocoder):
+    """Геокодер, получающий координаты со страницы Яндекс.Карт."""
+
+    # Время ожидания
+    delay = 3
+
+    def geocode(self, city, address):
+        """Получение геолокации по Яндекс.Картам."""
+        # Подключение драйвера Google
+        options = Options()
+        options.add_argument("--headless")
+        driver = webdriver.Chrome(options=options)
+        try:
+            # Переход на сайт
+            driver.get(URL_YANDEX_MAPS)
+            # Поиск формы ввода на сайте
+            elem_search_string = WebDriverWait(driver, self.delay).until(
+                ec.presence_of_element_located(
+                    (By.XPATH, "//input[@class='input__control _bold']")
+                )
+            )
+            # Вписываем данные в форму
+            elem_search_string.send_keys(f"{city}, {address}")
+            # Запускаем поиск
+            elem_search_string.send_keys(Keys.ENTER)
+            # Поиск координат на сайте
+            try:
+                elem_search = WebDriverWait(driver, self.delay).until(
+                    ec.presence_of_element_located(
+                        (
+                            By.XPATH,
+                            "//div[@class='toponym-card-title-view__"
+                            "coords-badge']",
+                        )
+                    )
+                )
+                # Возврат координат адреса
+                if elem_search.text:
+                    return list(map(float, elem_search.text.split(", ")))
+            except TimeoutException:
+                pass
+            return None
+        finally:
+            driver.quit()
+
+
+class LocalGeocoder(BaseGeocoder):
+    """Локальный геокодер для разработки и тестов.
+
+    Координаты берутся из словаря GEOCODER_LOCAL_ADDRESSES вида
+    {"Город, адрес": [широта, долгота]}.
+    """
+
+    def geocode(self, city, address):
+        """Получение координат из локального словаря."""
+        coordinates = settings.GEOCODER_LOCAL_ADDRESSES.get(
+            f"{city}, {address}"
+        )
+        return list(coordinates) if coordinates else None
+
+
+def get_geocoder():
+    """Получение геокодера, указанного в GEOCODER_BACKEND."""
+    return import_string(settings.GEOCODER_BACKEND)()
+
+
+def geocode_event_location(event_id, city, address):
+    """Задача геокодирования адреса и сохранения геолокации мероприятия.
+
+    Координаты сохраняются, только если город и адрес мероприятия не
+    изменились после постановки задачи, иначе более старая задача,
+    завершившаяся последней, перезаписала бы геолокацию нового адреса.
+    Строка мероприятия блокируется до записи координат, поэтому
+    изменение адреса дожидается её завершения.
+    """
+    data = geocode_address(city, address)
+    if not data:
+        return
+    with transaction.atomic():
+        event = Event.objects.select_for_update().filter(pk=event_id).first()
+        if event is None:
+            return
+        if (str(event.city), event.address) != (city, address):
+            logger.info(
+                f"Адрес мероприятия {event_id} изменился, результат "
+                f"геокодирования адреса {city}, {address} пропущен"
+            )
+            return
+        save_event_coordinates(event_id, data)
+
+
+def normalize_address(city, address):
+    """Нормализация города и адреса для ключа кэша геокодирования."""
+    text = f"{city}, {address}".lower().replace("ё", "е")
+    words = []
+    for word in re.findall(r"\w+(?:-\w+)*", text):
+        word = ADDRESS_ABBREVIATIONS.get(word, word)
+        if word:
+            words.append(word)
+    return " ".join(words)
+
+
+def get_cached_coordinates(query):
+    """Поиск результата геокодирования в кэше.
+
+    Сначала проверяется кэш в памяти процесса, затем таблица в БД.
+    Запись из БД попадает в кэш в памяти на оставшееся ей время жизни.
+    Возвращает координаты, None для ненайденного адреса или MISSING.
+    """
+    coordinates = geocode_memory_cache.get(query)
+    if coordinates is not MISSING:
+        return coordinates
+    record = GeocodeCache.objects.filter(query=query).first()
+    if record is None:
+        return MISSING
+    ttl = record.get_remaining_ttl()
+    if ttl <= 0:
+        return MISSING
+    coordinates = record.get_coordinates()
+    geocode_memory_cache.set(query, coordinates, ttl)
+    return coordinates
+
+
+def geocode_address(city, address):
+    """Геокодирование адреса с использованием кэша."""
+    query = normalize_address(city, address)
+    coordinates = get_cached_coordinates(query)
+    if coordinates is not MISSING:
+        return coordinates
+    coordinates = get_geocoder().geocode(city, address)
+    is_found = bool(coordinates)
+    GeocodeCache.objects.update_or_create(
+        query=query,
+        defaults={
+            "lat": coordinates[0] if is_found else None,
+            "lon": coordinates[1] if is_found else None,
+            "is_found": is_found,
+        },
+    )
+    geocode_memory_cache.set(
+        query,
+        coordinates if is_found else None,
+        GEOCODE_CACHE_TTL if is_found else GEOCODE_CACHE_NEGATIVE_TTL,
+    )
+    return coordinates if is_found else None
+
+
+def save_event_coordinates(event_id, data):
+    """Сохранение координат [широта, долгота] мероприятия."""
+    values_for_update = {"lon": data[1], "lat": data[0]}
+    EventLocation.objects.update_or_create(
+        event_id=event_id, defaults=values_for_update
+    )
@@ -0,0 +1,96 @@
+from math import asin, cos, degrees, floor, radians, sin
+
+from config.constants import (
+    EARTH_RADIUS_KM,
+    GEOHASH_PRECISION,
+    MAX_GEOHASH_CELLS,
+)
+
+# Алфавит base32, используемый в геохешах
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode_geohash(lat, lon, precision=GEOHASH_PRECISION):
+    """Вычисление геохеша координат с заданной точностью."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    lat, lon = float(lat), float(lon)
+    geohash = []
+    bits = 0
+    bit_count = 0
+    is_lon = True
+    while len(geohash) < precision:
+        coord_range, value = (lon_range, lon) if is_lon else (lat_range, lat)
+        middle = (coord_range[0] + coord_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            coord_range[0] = middle
+        else:
+            coord_range[1] = middle
+        is_lon = not is_lon
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(geohash)
+
+
+def get_cell_size(precision):
+    """Размер ячейки геохеша в градусах (широта, долгота)."""
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def get_bounding_box(lat, lon, radius):
+    """Ограничивающий прямоугольник вокруг точки для радиуса в км.
+
+    Возвращает кортеж (min_lat, min_lon, max_lat, max_lon).
+    """
+    lat, lon = float(lat), float(lon)
+    angular_radius = radius / EARTH_RADIUS_KM
+    lat_delta = degrees(angular_radius)
+    min_lat, max_lat = lat - lat_delta, lat + lat_delta
+    if min_lat <= -90 or max_lat >= 90 or angular_radius >= 1:
+        # Радиус захватывает полюс: подходит любая долгота
+        return max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0
+    lon_delta = degrees(asin(min(sin(angular_radius) / cos(radians(lat)), 1)))
+    min_lon, max_lon = lon - lon_delta, lon + lon_delta
+    if min_lon < -180 or max_lon > 180:
+        # Прямоугольник пересекает 180-й меридиан
+        min_lon, max_lon = -180.0, 180.0
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def get_geohash_cells(min_lat, min_lon, max_lat, max_lon):
+    """Набор ячеек геохеша, покрывающих прямоугольник.
+
+    Выбирается максимальная точность, при которой число ячеек не превышает
+    MAX_GEOHASH_CELLS. Если прямоугольник слишком велик, возвращается None,
+    и отбор по ячейкам не применяется.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_step, lon_step = get_cell_size(precision)
+        max_lat_index = round(180.0 / lat_step) - 1
+        max_lon_index = round(360.0 / lon_step) - 1
+        lat_indexes = range(
+            min(floor((min_lat + 90) / lat_step), max_lat_index),
+            min(floor((max_lat + 90) / lat_step), max_lat_index) + 1,
+        )
+        lon_indexes = range(
+            min(floor((min_lon + 180) / lon_step), max_lon_index),
+            min(floor((max_lon + 180) / lon_step), max_lon_index) + 1,
+        )
+        if len(lat_indexes) * len(lon_indexes) <= MAX_GEOHASH_CELLS:
+            return {
+                encode_geohash(
+                    -90 + (lat_index + 0.5) * lat_step,
+                    -180 + (lon_index + 0.5) * lon_step,
+                    precision,
+                )
+                for lat_index in lat_indexes
+                for lon_index in lon_indexes
+            }
+    return None
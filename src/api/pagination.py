@@ -13,3 +13,10 @@ class EventPagination(PageNumberPagination):
 
     page_size_query_param = "limit"
     page_size = 4
+
+
+class ChatPagination(PageNumberPagination):
+    """Custom pagination."""
+
+    page_size_query_param = "limit"
+    page_size = 20
@@ -1,7 +1,6 @@
 from rest_framework import permissions
 
 from events.models import ParticipationRequest
-from users.models import User
 
 
 class IsAdminOrAuthorOrReadOnly(permissions.BasePermission):
@@ -58,14 +57,13 @@ class IsEventOrganizer(permissions.BasePermission):
 
         Eсли текущий пользователь является организатором мероприятия.
         """
-        event = int(view.kwargs["pk"])
-        participation = ParticipationRequest.objects.get(pk=event)
-        organizer = User.objects.get(
-            user__is_organizer=True, user__event=participation.event
-        )
+        if request.method in permissions.SAFE_METHODS:
+            return True
         return (
-            request.method in permissions.SAFE_METHODS
-            or request.user == organizer
+            request.user.is_authenticated
+            and ParticipationRequest.objects.filter(
+                pk=view.kwargs["pk"], event__organizer=request.user
+            ).exists()
         )
 
 
@@ -0,0 +1,240 @@
+import threading
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from config.constants import (
+    RECOMMENDATION_CANDIDATES_LIMIT,
+    RECOMMENDATION_MAX_DISTANCE,
+    RECOMMENDATION_MUTUAL_FRIEND_WEIGHT,
+    RECOMMENDATION_PROXIMITY_WEIGHT,
+    RECOMMENDATION_SAME_CITY_WEIGHT,
+    RECOMMENDATION_SHARED_INTEREST_WEIGHT,
+    RECOMMENDATIONS_LIMIT,
+)
+from users.models import (
+    Blacklist,
+    FriendLink,
+    FriendRecommendation,
+    FriendRequest,
+    User,
+    UserInterest,
+)
+
+from .geo import get_users_nearby
+from .services import FriendshipService
+from .tasks import TaskQueue
+
+recommendations_queue = TaskQueue("recommendations")
+
+# Пользователи, пересчёт рекомендаций которых уже поставлен в очередь
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def get_excluded_ids(user_id):
+    """Id пользователей, которых нельзя рекомендовать.
+
+    Исключаются сам пользователь, его друзья, пользователи с ожидающими
+    заявками в друзья и черный список в обоих направлениях.
+    """
+    excluded = {user_id} | FriendshipService.get_friend_ids(user_id)
+    for from_user_id, to_user_id in FriendRequest.objects.filter(
+        Q(from_user_id=user_id) | Q(to_user_id=user_id), status="Pending"
+    ).values_list("from_user_id", "to_user_id"):
+        excluded.update((from_user_id, to_user_id))
+    for blocker_id, blocked_id in Blacklist.objects.filter(
+        Q(user_id=user_id) | Q(blocked_user_id=user_id)
+    ).values_list("user_id", "blocked_user_id"):
+        excluded.update((blocker_id, blocked_id))
+    return excluded
+
+
+def get_mutual_friends(friend_ids, excluded):
+    """Количество общих друзей для друзей друзей пользователя."""
+    if not friend_ids:
+        return {}
+    rows = (
+        FriendLink.objects.filter(
+            user_id__in=friend_ids, friend__is_active=True
+        )
+        .exclude(friend_id__in=excluded)
+        .values("friend_id")
+        .annotate(count=Count("id"))
+        .order_by("-count")[:RECOMMENDATION_CANDIDATES_LIMIT]
+    )
+    return {row["friend_id"]: row["count"] for row in rows}
+
+
+def get_shared_interests(user_id, excluded):
+    """Количество общих интересов с другими пользователями."""
+    interest_ids = UserInterest.objects.filter(user_id=user_id).values(
+        "interest_id"
+    )
+    rows = (
+        UserInterest.objects.filter(
+            interest_id__in=interest_ids, user__is_active=True
+        )
+        .exclude(user_id__in=excluded)
+        .values("user_id")
+        .annotate(count=Count("id"))
+        .order_by("-count")[:RECOMMENDATION_CANDIDATES_LIMIT]
+    )
+    return {row["user_id"]: row["count"] for row in rows}
+
+
+def get_same_city(user, excluded):
+    """Id пользователей из того же города."""
+    if user.city_id is None:
+        return set()
+    return set(
+        User.objects.filter(city_id=user.city_id, is_active=True)
+        .exclude(id__in=excluded)
+        .values_list("id", flat=True)[:RECOMMENDATION_CANDIDATES_LIMIT]
+    )
+
+
+def get_nearby_distances(user, excluded):
+    """Расстояния до пользователей поблизости."""
+    return {
+        item["user"]: item["distance"]
+        for item in get_users_nearby(user, RECOMMENDATION_MAX_DISTANCE)
+        if item["user"] not in excluded
+    }
+
+
+def get_score(mutual_friends, shared_interests, same_city, distance):
+    """Оценка кандидата в друзья."""
+    score = (
+        RECOMMENDATION_MUTUAL_FRIEND_WEIGHT * mutual_friends
+        + RECOMMENDATION_SHARED_INTEREST_WEIGHT * shared_interests
+        + RECOMMENDATION_SAME_CITY_WEIGHT * same_city
+    )
+    if distance is not None:
+        score += RECOMMENDATION_PROXIMITY_WEIGHT * max(
+            0, 1 - distance / RECOMMENDATION_MAX_DISTANCE
+        )
+    return round(score, 3)
+
+
+def compute_recommendations(user_id):
+    """Пересчёт рекомендаций друзей пользователя.
+
+    Кандидаты отбираются среди друзей друзей, пользователей с общими
+    интересами, из того же города и поблизости. Сохраняются не более
+    RECOMMENDATIONS_LIMIT кандидатов с наибольшей оценкой.
+    """
+    user = User.objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+        FriendRecommendation.objects.filter(user_id=user_id).delete()
+        return
+    excluded = get_excluded_ids(user_id)
+    mutual_friends = get_mutual_friends(
+        FriendshipService.get_friend_ids(user_id), excluded
+    )
+    shared_interests = get_shared_interests(user_id, excluded)
+    same_city = get_same_city(user, excluded)
+    distances = get_nearby_distances(user, excluded)
+    candidate_ids = (
+        mutual_friends.keys()
+        | shared_interests.keys()
+        | same_city
+        | distances.keys()
+    )
+    recommendations = []
+    for candidate_id in candidate_ids:
+        recommendation = FriendRecommendation(
+            user_id=user_id,
+            candidate_id=candidate_id,
+            mutual_friends=mutual_friends.get(candidate_id, 0),
+            shared_interests=shared_interests.get(candidate_id, 0),
+            same_city=candidate_id in same_city,
+            distance=distances.get(candidate_id),
+        )
+        recommendation.score = get_score(
+            recommendation.mutual_friends,
+            recommendation.shared_interests,
+            recommendation.same_city,
+            recommendation.distance,
+        )
+        if recommendation.score > 0:
+            recommendations.append(recommendation)
+    recommendations.sort(key=lambda item: item.score, reverse=True)
+    with transaction.atomic():
+        FriendRecommendation.objects.filter(user_id=user_id).delete()
+        FriendRecommendation.objects.bulk_create(
+            recommendations[:RECOMMENDATIONS_LIMIT]
+        )
+
+
+def get_candidate_ids(user_id):
+    """Id пользователей из сохранённых рекомендаций пользователя."""
+    return set(
+        FriendRecommendation.objects.filter(user_id=user_id).values_list(
+            "candidate_id", flat=True
+        )
+    )
+
+
+def get_recommended_to_ids(user_id):
+    """Id пользователей, которым пользователь сейчас рекомендован."""
+    return set(
+        FriendRecommendation.objects.filter(candidate_id=user_id).values_list(
+            "user_id", flat=True
+        )
+    )
+
+
+def update_recommendations(user_id):
+    """Задача пересчёта рекомендаций пользователя."""
+    with _pending_lock:
+        _pending.discard((update_recommendations, user_id))
+    compute_recommendations(user_id)
+
+
+def update_profile_recommendations(user_id):
+    """Задача пересчёта рекомендаций после изменения профиля.
+
+    Интересы, город и место оценивают пару пользователей с обеих
+    сторон, поэтому после пересчёта списка самого пользователя
+    пересчитываются списки его друзей, пользователей, которым он
+    рекомендован, и кандидатов из его старого и нового списков.
+    """
+    with _pending_lock:
+        _pending.discard((update_profile_recommendations, user_id))
+    affected_ids = (
+        FriendshipService.get_friend_ids(user_id)
+        | get_recommended_to_ids(user_id)
+        | get_candidate_ids(user_id)
+    )
+    compute_recommendations(user_id)
+    affected_ids |= get_candidate_ids(user_id)
+    _submit(update_recommendations, affected_ids - {user_id})
+
+
+def _submit(task, user_ids):
+    """Постановка в очередь пользователей, ещё не ожидающих пересчёта."""
+    with _pending_lock:
+        keys = {(task, user_id) for user_id in user_ids} - _pending
+        _pending.update(keys)
+    for _, user_id in keys:
+        recommendations_queue.submit(task, user_id)
+
+
+def schedule_recommendations(*user_ids):
+    """Фоновый пересчёт рекомендаций после фиксации транзакции.
+
+    Повторные изменения до начала пересчёта не ставят новых задач.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        transaction.on_commit(
+            lambda: _submit(update_recommendations, user_ids)
+        )
+
+
+def schedule_profile_recommendations(user_id):
+    """Фоновый пересчёт рекомендаций, затронутых изменением профиля."""
+    transaction.on_commit(
+        lambda: _submit(update_profile_recommendations, {user_id})
+    )
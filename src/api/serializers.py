@@ -1,7 +1,7 @@
 from django.contrib.auth import authenticate
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.core.validators import validate_email as django_validate_email
-from django.db.models import Q
+from django.db import transaction
 from djoser.serializers import (
     TokenCreateSerializer,
     UserCreateSerializer,
@@ -13,13 +13,13 @@ from rest_framework.fields import SerializerMethodField
 from rest_framework.serializers import ModelSerializer, SlugRelatedField
 
 from config.constants import messages
-from events.models import Event, EventMember, ParticipationRequest
+from events.models import Event, ParticipationRequest
 from notifications.models import Notification, NotificationSettings
 from users.models import (
     Blacklist,
     City,
+    FriendRecommendation,
     FriendRequest,
-    Friendship,
     Interest,
     User,
     UserInterest,
@@ -27,6 +27,7 @@ from users.models import (
 from users.validators import validate_email, validate_password
 
 from .geo import save_event_location
+from .services import EventMemberService, FriendshipService
 
 
 class CustomTokenCreateSerializer(TokenCreateSerializer):
@@ -63,6 +64,18 @@ class CustomTokenCreateSerializer(TokenCreateSerializer):
         return None
 
 
+def get_friend_ids(user):
+    """Id друзей пользователя."""
+    return FriendshipService.get_friend_ids(user.id)
+
+
+def get_blocked_ids(user):
+    """Id пользователей, заблокированных пользователем."""
+    return Blacklist.objects.filter(user=user).values_list(
+        "blocked_user_id", flat=True
+    )
+
+
 class InterestSerializer(ModelSerializer):
     """Сериализатор интересов."""
 
@@ -72,10 +85,11 @@ class InterestSerializer(ModelSerializer):
 
 
 class GetFriendsField(serializers.RelatedField):
-    """Сериализатор списка друзей."""
+    """Сериализатор списка друзей по связям FriendLink."""
 
     def to_representation(self, value):
         """Представление списка друзей."""
+        value = value.friend
         return {
             "id": value.pk,
             "first_name": value.first_name,
@@ -124,7 +138,9 @@ class MyUserSerializer(UserSerializer, MyUserBaseSerializer):
         allow_null=True,
     )
     interests = InterestSerializer(many=True, required=False)
-    friends = GetFriendsField(read_only=True, many=True, required=False)
+    friends = GetFriendsField(
+        source="friend_links", read_only=True, many=True, required=False
+    )
     age = serializers.IntegerField(required=False)
     friends_count = serializers.IntegerField(required=False)
     network_nick = serializers.SerializerMethodField()
@@ -179,43 +195,41 @@ class MyUserSerializer(UserSerializer, MyUserBaseSerializer):
                 UserInterest.objects.create(
                     user=instance, interest=current_interest
                 )
-        current_friends = instance.friends
-        if current_friends.exists() and "friends" in self.initial_data:
+        if "friends" in self.initial_data:
             friends = self.initial_data.pop("friends")
-            friends_list = []
-            for friend in friends:
-                friends_list.append(friend["id"])
-            new_friends = []
-            current_friends = current_friends.values()
-            for current_friend in current_friends:
-                if current_friend["id"] in friends_list:
-                    new_friends.append(current_friend["id"])
-            instance.friends.clear()
-            instance.friends.set(new_friends)
+            kept_ids = {friend["id"] for friend in friends}
+            removed_ids = (
+                FriendshipService.get_friend_ids(instance.id) - kept_ids
+            )
+            if removed_ids:
+                FriendshipService.remove_friends(instance, removed_ids)
         return super().update(instance, validated_data)
 
+    def get_viewer_ids(self, key, get_ids):
+        """Множество id, связанных с текущим пользователем.
+
+        Вычисляется один раз на запрос и хранится в контексте сериализатора,
+        общем для всех объектов списка.
+        """
+        if key not in self.context:
+            user = self.context.get("request").user
+            self.context[key] = (
+                set() if user.is_anonymous else set(get_ids(user))
+            )
+        return self.context[key]
+
     def get_network_nick(self, obj):
         """Метод сериализатора для ограничения просмотра поля network_nick."""
         request = self.context.get("request")
-
-        if (
-            Friendship.objects.filter(
-                # Q(is_added=True),
-                Q(initiator=request.user, friend=obj)
-                | Q(initiator=obj, friend=request.user),
-            ).exists()
-        ) or obj == request.user:
+        friend_ids = self.get_viewer_ids("friend_ids", get_friend_ids)
+        if obj.id in friend_ids or obj == request.user:
             return obj.network_nick
         return None
 
     def get_is_blocked(self, blocked_user):
         """Метод сериализатора для просмотра блокировки пользователя."""
-        user = self.context.get("request").user
-        if user.is_anonymous:
-            return False
-        return Blacklist.objects.filter(
-            user=user, blocked_user=blocked_user
-        ).exists()
+        blocked_ids = self.get_viewer_ids("blocked_ids", get_blocked_ids)
+        return blocked_user.id in blocked_ids
 
 
 class MyUserCreateSerializer(UserCreateSerializer, MyUserBaseSerializer):
@@ -253,6 +267,34 @@ class MyUserGetSerializer(UserSerializer):
         )
 
 
+class FriendRecommendationSerializer(ModelSerializer):
+    """Сериализатор рекомендаций друзей."""
+
+    id = serializers.IntegerField(source="candidate.id")
+    first_name = serializers.CharField(source="candidate.first_name")
+    last_name = serializers.CharField(source="candidate.last_name")
+    age = serializers.IntegerField(source="candidate.age")
+    city = serializers.CharField(source="candidate.city.name", default=None)
+    avatar = serializers.ImageField(source="candidate.avatar")
+
+    class Meta:
+        model = FriendRecommendation
+        fields = (
+            "id",
+            "first_name",
+            "last_name",
+            "age",
+            "city",
+            "avatar",
+            "score",
+            "mutual_friends",
+            "shared_interests",
+            "same_city",
+            "distance",
+        )
+        read_only_fields = fields
+
+
 class FriendRequestSerializer(serializers.ModelSerializer):
     """Сериализатор для модели FriendRequest.
 
@@ -294,7 +336,8 @@ class EventSerializer(ModelSerializer):
     """Сериализатор мероприятия."""
 
     members = GetMembersField(read_only=True, many=True, required=False)
-    members_count = serializers.IntegerField(required=False)
+    members_count = serializers.IntegerField(read_only=True)
+    distance = SerializerMethodField()
 
     class Meta:
         model = Event
@@ -303,6 +346,7 @@ class EventSerializer(ModelSerializer):
             "name",
             "description",
             "members",
+            "organizer",
             "event_type",
             "start_date",
             "end_date",
@@ -315,60 +359,69 @@ class EventSerializer(ModelSerializer):
             "max_age",
             "min_count_members",
             "max_count_members",
+            "distance",
         )
 
+    def get_fields(self):
+        """Поле members исключается, если так указано в контексте."""
+        fields = super().get_fields()
+        if not self.context.get("include_members", True):
+            fields.pop("members")
+        return fields
+
+    def get_distance(self, obj):
+        """Расстояние в км до мероприятия при поиске по near."""
+        distance = getattr(obj, "distance", None)
+        return None if distance is None else round(distance, 3)
+
+    def validate(self, attrs):
+        """Проверка списка участников, если он передан."""
+        if "members" in self.initial_data:
+            attrs["member_ids"] = self.get_member_ids(
+                self.initial_data["members"]
+            )
+        return attrs
+
+    @staticmethod
+    def get_member_ids(members):
+        """Id участников из списка вида [{"id": 1}, ...]."""
+        try:
+            member_ids = [int(member["id"]) for member in members]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError({"members": messages.INVALID_EVENT_MEMBERS})
+        missing = EventMemberService.get_missing_user_ids(member_ids)
+        if missing:
+            raise ValidationError(
+                {
+                    "members": messages.EVENT_MEMBERS_NOT_FOUND
+                    % ", ".join(map(str, sorted(missing)))
+                }
+            )
+        return member_ids
+
+    @transaction.atomic
     def create(self, validated_data):
         """Создание мероприятия с указанными участниками."""
-        if "members" not in self.initial_data:
-            event = Event.objects.create(**validated_data)
-            if "city" in self.initial_data or "address" in self.initial_data:
-                save_event_location(event, validated_data)
-            return event
-        members = self.initial_data.pop("members")
+        member_ids = validated_data.pop("member_ids", None)
         event = Event.objects.create(**validated_data)
         if "city" in self.initial_data or "address" in self.initial_data:
             save_event_location(event, validated_data)
-        is_organizers = []
-        for member in members:
-            members_list = EventMember.objects.filter(
-                event=event, user=member["id"]
-            )
-            if members_list:
-                is_organizers.append(members_list[0].is_organizer)
-            else:
-                is_organizers.append(False)
-        for i, member in enumerate(members):
-            current_member = User.objects.get(**member)
-            EventMember.objects.create(
-                event=event, user=current_member, is_organizer=is_organizers[i]
-            )
+        if member_ids is not None:
+            EventMemberService.sync_members(event, member_ids)
         return event
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Обновление мероприятия с указанными участниками."""
+        member_ids = validated_data.pop("member_ids", None)
+        # Мероприятие обновляется первым: задача геокодирования держит
+        # блокировку его строки, а затем пишет геолокацию
+        event = super().update(instance, validated_data)
         if "city" in self.initial_data or "address" in self.initial_data:
-            save_event_location(instance, validated_data)
-        if "members" not in self.initial_data:
-            return super().update(instance, validated_data)
-        members = self.initial_data.pop("members")
-        is_organizers = []
-        for member in members:
-            members_list = EventMember.objects.filter(
-                event=instance, user=member["id"]
-            )
-            if members_list:
-                is_organizers.append(members_list[0].is_organizer)
-            else:
-                is_organizers.append(False)
-        instance.members.clear()
-        for i, member in enumerate(members):
-            current_member = User.objects.get(**member)
-            EventMember.objects.create(
-                event=instance,
-                user=current_member,
-                is_organizer=is_organizers[i],
-            )
-        return super().update(instance, validated_data)
+            save_event_location(event, validated_data)
+        if member_ids is not None:
+            EventMemberService.sync_members(event, member_ids)
+        return event
 
 
 class ParticipationSerializer(ModelSerializer):
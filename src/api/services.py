@@ -1,8 +1,11 @@
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Q
 from django.http import Http404
 
-from events.models import EventMember, ParticipationRequest
-from users.models import FriendRequest, Friendship
+from config.constants import FRIEND_IDS_CACHE_TTL
+from events.models import Event, EventMember, ParticipationRequest
+from users.models import FriendLink, FriendRequest, Friendship, User
 
 
 def handle_not_found(func):
@@ -56,6 +59,78 @@ class FriendRequestService:
         friend_request.save()
 
 
+class FriendshipService:
+    """Сервис симметричного графа друзей.
+
+    Для каждой дружбы Friendship поддерживаются связи FriendLink в обоих
+    направлениях и кэшируется множество id друзей пользователя.
+    """
+
+    @staticmethod
+    def get_cache_key(user_id):
+        """Ключ кэша множества id друзей пользователя."""
+        return f"friend_ids_{user_id}"
+
+    @staticmethod
+    def get_friend_ids(user_id):
+        """Множество id друзей пользователя."""
+        key = FriendshipService.get_cache_key(user_id)
+        friend_ids = cache.get(key)
+        if friend_ids is None:
+            friend_ids = set(
+                FriendLink.objects.filter(user_id=user_id).values_list(
+                    "friend_id", flat=True
+                )
+            )
+            cache.set(key, friend_ids, FRIEND_IDS_CACHE_TTL)
+        return friend_ids
+
+    @staticmethod
+    def are_friends(user_id, other_user_id):
+        """Проверка дружбы между пользователями."""
+        return other_user_id in FriendshipService.get_friend_ids(user_id)
+
+    @staticmethod
+    def invalidate(*user_ids):
+        """Сброс кэша друзей пользователей после фиксации транзакции."""
+        keys = [FriendshipService.get_cache_key(pk) for pk in user_ids]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+    @staticmethod
+    def link(friendship):
+        """Создание связей дружбы в обоих направлениях."""
+        FriendLink.objects.bulk_create(
+            [
+                FriendLink(
+                    user_id=friendship.initiator_id,
+                    friend_id=friendship.friend_id,
+                    friendship=friendship,
+                ),
+                FriendLink(
+                    user_id=friendship.friend_id,
+                    friend_id=friendship.initiator_id,
+                    friendship=friendship,
+                ),
+            ],
+            ignore_conflicts=True,
+        )
+        FriendshipService.invalidate(
+            friendship.initiator_id, friendship.friend_id
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def remove_friends(user, friend_ids):
+        """Удаление дружбы пользователя с указанными пользователями.
+
+        Связи FriendLink удаляются каскадно вместе с Friendship.
+        """
+        Friendship.objects.filter(
+            Q(initiator=user, friend_id__in=friend_ids)
+            | Q(initiator_id__in=friend_ids, friend=user)
+        ).delete()
+
+
 class ParticipationRequestService:
     """Сервис для обработки заявок на участие в мероприятии."""
 
@@ -97,3 +172,78 @@ class ParticipationRequestService:
         participation_request.status = "Declined"
         participation_request.processed_by = user
         participation_request.save()
+
+
+class EventMemberService:
+    """Сервис состава участников мероприятия."""
+
+    @staticmethod
+    def get_missing_user_ids(user_ids):
+        """Id из списка, для которых нет пользователей, одним запросом."""
+        user_ids = set(user_ids)
+        return user_ids - User.objects.only("id").in_bulk(user_ids).keys()
+
+    @staticmethod
+    @transaction.atomic
+    def sync_members(event, user_ids):
+        """Приведение участников мероприятия к списку user_ids.
+
+        Новые участники добавляются одним bulk_create, исключённые
+        удаляются одним запросом. Оставшиеся участники сохраняют флаг
+        is_organizer, организаторы не удаляются, даже если их нет в
+        списке.
+        """
+        user_ids = set(user_ids)
+        current = dict(
+            EventMember.objects.filter(event=event).values_list(
+                "user_id", "is_organizer"
+            )
+        )
+        removed = [
+            user_id
+            for user_id, is_organizer in current.items()
+            if user_id not in user_ids and not is_organizer
+        ]
+        if removed:
+            EventMember.objects.filter(
+                event=event, user_id__in=removed
+            ).delete()
+        EventMember.objects.bulk_create(
+            [
+                EventMember(event=event, user_id=user_id, is_organizer=False)
+                for user_id in user_ids - current.keys()
+            ]
+        )
+
+    @staticmethod
+    def get_organizer_name(user):
+        """Имя организатора для поиска по подстроке."""
+        if user is None:
+            return ""
+        return f"{user.first_name} {user.last_name}".lower()
+
+    @staticmethod
+    def update_organizer(event_id):
+        """Обновление организатора мероприятия по его участникам.
+
+        Организатором считается первый участник с флагом is_organizer.
+        """
+        member = (
+            EventMember.objects.filter(event_id=event_id, is_organizer=True)
+            .select_related("user")
+            .order_by("id")
+            .first()
+        )
+        user = member.user if member is not None else None
+        Event.objects.filter(pk=event_id).update(
+            organizer=user,
+            organizer_name=EventMemberService.get_organizer_name(user),
+        )
+
+    @staticmethod
+    def update_organizer_name(user):
+        """Обновление имени организатора в его мероприятиях."""
+        name = EventMemberService.get_organizer_name(user)
+        Event.objects.filter(organizer=user).exclude(
+            organizer_name=name
+        ).update(organizer_name=name)
@@ -1,9 +1,10 @@
 import logging
 
 from django.apps import apps
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from .geohash import encode_geohash
 from .utils import handle_friend_request, send_notification
 
 
@@ -46,3 +47,151 @@ def create_friendship(sender, instance, created, **kwargs):
         Friendship.objects.get_or_create(
             initiator=instance.from_user, friend=instance.to_user
         )
+
+
+@receiver(post_save, sender="users.Friendship")
+def create_friend_links(sender, instance, created, **kwargs):
+    """Создает связи FriendLink в обоих направлениях для новой дружбы."""
+    from .services import FriendshipService
+
+    if created:
+        FriendshipService.link(instance)
+
+
+@receiver(post_delete, sender="users.Friendship")
+def invalidate_friend_ids(sender, instance, **kwargs):
+    """Сбрасывает кэш друзей после удаления дружбы."""
+    from .services import FriendshipService
+
+    FriendshipService.invalidate(instance.initiator_id, instance.friend_id)
+
+
+@receiver(post_delete, sender="users.Friendship")
+def revoke_chat_on_unfriend(sender, instance, **kwargs):
+    """Закрывает открытые чаты бывших друзей."""
+    from chat.utils import revoke_chat_access
+
+    revoke_chat_access(instance.initiator_id, instance.friend_id)
+
+
+@receiver(post_save, sender="users.Blacklist")
+def revoke_chat_on_block(sender, instance, created, **kwargs):
+    """Закрывает открытые чаты с заблокированным пользователем."""
+    from chat.utils import revoke_chat_access
+
+    if created:
+        revoke_chat_access(instance.user_id, instance.blocked_user_id)
+
+
+@receiver(post_save, sender="users.Friendship")
+@receiver(post_delete, sender="users.Friendship")
+def friendship_recommendations(sender, instance, **kwargs):
+    """Пересчитывает рекомендации друзей и друзей друзей."""
+    from .recommendations import schedule_recommendations
+    from .services import FriendshipService
+
+    user_ids = {instance.initiator_id, instance.friend_id}
+    for user_id in tuple(user_ids):
+        user_ids |= FriendshipService.get_friend_ids(user_id)
+    schedule_recommendations(*user_ids)
+
+
+@receiver(post_save, sender="users.FriendRequest")
+def friend_request_recommendations(sender, instance, **kwargs):
+    """Пересчитывает рекомендации участников заявки в друзья."""
+    from .recommendations import schedule_recommendations
+
+    schedule_recommendations(instance.from_user_id, instance.to_user_id)
+
+
+@receiver(post_save, sender="users.Blacklist")
+@receiver(post_delete, sender="users.Blacklist")
+def blacklist_recommendations(sender, instance, **kwargs):
+    """Пересчитывает рекомендации после изменения черного списка."""
+    from .recommendations import schedule_recommendations
+
+    schedule_recommendations(instance.user_id, instance.blocked_user_id)
+
+
+@receiver(post_save, sender="users.UserInterest")
+@receiver(post_delete, sender="users.UserInterest")
+@receiver(post_save, sender="users.UserLocation")
+def profile_recommendations(sender, instance, **kwargs):
+    """Пересчитывает рекомендации после изменения интересов или места."""
+    from .recommendations import schedule_profile_recommendations
+
+    schedule_profile_recommendations(instance.user_id)
+
+
+@receiver(pre_save, sender="users.User")
+def track_recommendation_fields(sender, instance, update_fields, **kwargs):
+    """Запоминает, изменились ли город или активность пользователя."""
+    if update_fields is not None and not {"city", "is_active"} & set(
+        update_fields
+    ):
+        instance._recommendation_fields_changed = False
+        return
+    old_values = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list("city_id", "is_active")
+        .first()
+    )
+    instance._recommendation_fields_changed = old_values != (
+        instance.city_id,
+        instance.is_active,
+    )
+
+
+@receiver(post_save, sender="users.User")
+def user_recommendations(sender, instance, created, **kwargs):
+    """Пересчитывает рекомендации после смены города или активности."""
+    from .recommendations import schedule_profile_recommendations
+
+    if not created and instance._recommendation_fields_changed:
+        schedule_profile_recommendations(instance.id)
+
+
+@receiver(pre_save, sender="users.UserLocation")
+def update_user_location_geohash(sender, instance, **kwargs):
+    """Пересчитывает ячейку геохеша при сохранении геолокации."""
+    instance.geohash = encode_geohash(instance.lat, instance.lon)
+
+
+@receiver(post_save, sender="events.EventMember")
+def update_event_organizer(sender, instance, created, **kwargs):
+    """Обновляет организатора мероприятия при изменении участника."""
+    from .services import EventMemberService
+
+    if instance.is_organizer or not created:
+        EventMemberService.update_organizer(instance.event_id)
+
+
+@receiver(post_delete, sender="events.EventMember")
+def remove_event_organizer(sender, instance, **kwargs):
+    """Обновляет организатора мероприятия при удалении организатора."""
+    from .services import EventMemberService
+
+    if instance.is_organizer:
+        EventMemberService.update_organizer(instance.event_id)
+
+
+@receiver(post_save, sender="users.User")
+def update_organizer_name(sender, instance, created, update_fields, **kwargs):
+    """Обновляет имя организатора в мероприятиях при смене имени."""
+    from .services import EventMemberService
+
+    if created or (
+        update_fields is not None
+        and not {"first_name", "last_name"} & set(update_fields)
+    ):
+        return
+    EventMemberService.update_organizer_name(instance)
+
+
+@receiver(post_save, sender="chat.Message")
+def update_chat_last_message(sender, instance, created, **kwargs):
+    """Обновляет последнее сообщение и счётчики непрочитанного в чате."""
+    from chat.utils import update_chat_on_message
+
+    if created:
+        update_chat_on_message(instance)
@@ -0,0 +1,94 @@
+import atexit
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+
+from config.logging import logger
+
+
+class TaskQueue:
+    """Очередь фоновых задач с пулом потоков и повторными попытками.
+
+    Задачи выполняются вне HTTP-запроса в пуле потоков воркера. При
+    BACKGROUND_TASKS_EAGER = True задачи выполняются сразу в вызывающем
+    потоке (используется в тестах).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._executor = None
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        """Ленивое создание пула потоков."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.BACKGROUND_TASKS_WORKERS,
+                    thread_name_prefix=self.name,
+                )
+                atexit.register(self.shutdown)
+            return self._executor
+
+    def _run(self, func, args, kwargs):
+        """Выполнение задачи с повторными попытками."""
+        retries = settings.BACKGROUND_TASKS_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as error:
+                if attempt == retries:
+                    logger.exception(
+                        f"Задача {func.__name__} очереди {self.name} "
+                        f"завершилась ошибкой: {error}"
+                    )
+                    return None
+                logger.warning(
+                    f"Задача {func.__name__} очереди {self.name} "
+                    f"завершилась ошибкой, попытка {attempt + 1} "
+                    f"из {retries + 1}: {error}"
+                )
+                time.sleep(settings.BACKGROUND_TASKS_RETRY_DELAY * 2**attempt)
+        return None
+
+    def _run_in_worker(self, func, args, kwargs):
+        """Выполнение задачи в потоке пула."""
+        try:
+            return self._run(func, args, kwargs)
+        finally:
+            # Соединения с БД потоков пула не закрываются Django
+            connections.close_all()
+
+    def submit(self, func, *args, **kwargs):
+        """Постановка задачи в очередь."""
+        if settings.BACKGROUND_TASKS_EAGER:
+            self._run(func, args, kwargs)
+            return
+        future = self._get_executor().submit(
+            self._run_in_worker, func, args, kwargs
+        )
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+
+    def _discard(self, future):
+        """Удаление выполненной задачи из списка ожидающих."""
+        with self._lock:
+            self._futures.discard(future)
+
+    def join(self, timeout=None):
+        """Ожидание завершения поставленных задач."""
+        with self._lock:
+            futures = set(self._futures)
+        wait(futures, timeout=timeout)
+
+    def shutdown(self):
+        """Остановка пула с завершением поставленных задач."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
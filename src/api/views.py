@@ -1,4 +1,4 @@
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
@@ -7,32 +7,35 @@ from djoser.utils import ActionViewMixin
 from djoser.views import TokenCreateView, TokenDestroyView, UserViewSet
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import filters, status
+from rest_framework import filters, serializers, status
+from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from chat.middleware import invalidate_token_cache
 from config.constants import MAX_DISTANCE
-from events.models import Event, EventLocation, ParticipationRequest
+from events.models import Event, ParticipationRequest
 from notifications.models import Notification, NotificationSettings
 from users.models import (
     Blacklist,
     City,
+    FriendRecommendation,
     FriendRequest,
-    Friendship,
     Interest,
     User,
-    UserLocation,
 )
 
 from .filters import EventsFilter, UserFilter
 from .geo import (
     get_event_distance,
     get_event_location,
+    get_events_nearby,
     get_user_distance,
     get_user_location,
-    save_user_location,
+    get_users_nearby,
+    refresh_user_location,
 )
 from .pagination import EventPagination, MyPagination
 from .permissions import (
@@ -41,10 +44,12 @@ from .permissions import (
     IsEventOrganizer,
     IsRecipient,
 )
+from .recommendations import get_excluded_ids, schedule_recommendations
 from .serializers import (
     BlacklistSerializer,
     CitySerializer,
     EventSerializer,
+    FriendRecommendationSerializer,
     FriendRequestSerializer,
     InterestSerializer,
     MyEventSerializer,
@@ -60,7 +65,9 @@ from .services import FriendRequestService, ParticipationRequestService
 class MyUserViewSet(UserViewSet):
     """Вьюсет пользователя."""
 
-    queryset = User.objects.all()
+    queryset = User.objects.select_related("city").prefetch_related(
+        "friend_links__friend", "interests"
+    )
     serializer_class = MyUserSerializer
     pagination_class = MyPagination
     filter_backends = (filters.SearchFilter, DjangoFilterBackend)
@@ -76,10 +83,27 @@ class MyUserViewSet(UserViewSet):
         IsAdminOrAuthorOrReadOnlyAndNotBlocked,
     ]
 
+    def initial(self, request, *args, **kwargs):
+        """Обновление геолокации текущего пользователя."""
+        super().initial(request, *args, **kwargs)
+        refresh_user_location(request)
+
+    def get_queryset(self):
+        """Исключение из списка заблокировавших пользователя."""
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.action != "list" or not user.is_authenticated or user.is_staff:
+            return queryset
+        return queryset.exclude(
+            Exists(
+                Blacklist.objects.filter(
+                    user=OuterRef("pk"), blocked_user=user
+                )
+            )
+        )
+
     def get_serializer_class(self):
         """Выбор сериализатора."""
-        # Сохранение геолокации текущего пользователя
-        save_user_location(self.request.user)
         if self.request.method == "POST":
             return MyUserCreateSerializer
         return MyUserSerializer
@@ -117,18 +141,10 @@ class MyUserViewSet(UserViewSet):
         },
     )
     def list(self, request, *args, **kwargs):
-        """Получение списка пользователей."""
-        if not request.user.is_staff:
-            blocks = Blacklist.objects.filter(blocked_user=request.user)
-            if blocks.exists():
-                blockers = []
-                for obj in blocks:
-                    blockers.append(obj.user.id)
-                queryset = User.objects.all().exclude(id__in=blockers)
-                serializer = MyUserSerializer(
-                    queryset, many=True, context={"request": request}
-                )
-                return Response(serializer.data, status=status.HTTP_200_OK)
+        """Получение списка пользователей.
+
+        Пользователи, заблокировавшие текущего пользователя, исключаются.
+        """
         return super().list(request, *args, **kwargs)
 
     @action(
@@ -139,15 +155,9 @@ class MyUserViewSet(UserViewSet):
     )
     def my_friends(self, request):
         """Вывод друзей текущего пользователя."""
-        friendships = Friendship.objects.filter(
-            initiator=self.request.user
-        ) | Friendship.objects.filter(friend=self.request.user)
-        friends = []
-        for friendship in friendships:
-            if friendship.initiator == self.request.user:
-                friends.append(friendship.friend)
-            else:
-                friends.append(friendship.initiator)
+        friends = self.get_queryset().filter(
+            friend_links__friend=self.request.user
+        )
         serializer = MyUserSerializer(
             friends, many=True, context={"request": request}
         )
@@ -194,13 +204,36 @@ class MyUserViewSet(UserViewSet):
     def blacklist(self, request):
         """Получение черного списка."""
         user = request.user
-        queryset = User.objects.filter(blocked__user=user)
+        queryset = self.get_queryset().filter(blocked__user=user)
         pages = self.paginate_queryset(queryset)
         serializer = BlacklistSerializer(
             pages, many=True, context={"request": request}
         )
         return self.get_paginated_response(serializer.data)
 
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def recommendations(self, request):
+        """Получение рекомендаций друзей текущего пользователя.
+
+        Рекомендации читаются из предрассчитанной таблицы, отсортированной
+        по убыванию оценки. Если они ещё не рассчитаны, пересчёт ставится
+        в очередь.
+        """
+        user = request.user
+        if not FriendRecommendation.objects.filter(user=user).exists():
+            schedule_recommendations(user.id)
+        queryset = (
+            FriendRecommendation.objects.filter(user=user)
+            .exclude(candidate_id__in=get_excluded_ids(user.id))
+            .select_related("candidate__city")
+            .order_by("-score", "candidate_id")
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = FriendRecommendationSerializer(
+            page, many=True, context={"request": request}
+        )
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=["get"], permission_classes=[IsAuthenticated])
     def geolocation(self, request, **kwargs):
         """Получение геолокации пользователя."""
@@ -225,27 +258,16 @@ class MyUserViewSet(UserViewSet):
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def distances(self, request):
-        """Получение расстояния до пользователей от текущего пользователя."""
-        locations = UserLocation.objects.all().exclude(user=self.request.user)
-        data = []
-        if self.request.query_params and self.request.query_params["search"]:
-            max_distance = int(self.request.query_params["search"])
-        else:
-            max_distance = MAX_DISTANCE
-        for location in locations:
-            distance = get_user_distance(
-                self.request.user, location.user, (location.lat, location.lon)
-            )
-            if distance and distance["distance"] <= max_distance:
-                data.append(
-                    {
-                        "user": location.user.id,
-                        "first_name": location.user.first_name,
-                        "last_name": location.user.last_name,
-                        "distance": distance["distance"],
-                    }
-                )
-        return Response(data, status=status.HTTP_200_OK)
+        """Получение расстояния до пользователей от текущего пользователя.
+
+        Пользователи отсортированы по возрастанию расстояния.
+        """
+        max_distance = int(
+            self.request.query_params.get("search") or MAX_DISTANCE
+        )
+        data = get_users_nearby(self.request.user, max_distance)
+        page = self.paginate_queryset(data)
+        return self.get_paginated_response(page)
 
 
 class CustomActionViewMixin(ActionViewMixin):
@@ -289,9 +311,20 @@ class CustomTokenDestroyView(TokenDestroyView):
             ),
         },
     )
-    def post(self, *args, **kwargs):
-        """Метод post."""
-        return super().post(*args, **kwargs)
+    def post(self, request, *args, **kwargs):
+        """Метод post.
+
+        Вместе с токенами из кэша вебсокетов удаляются их пользователи.
+        """
+        token_keys = list(
+            Token.objects.filter(user=request.user).values_list(
+                "key", flat=True
+            )
+        )
+        try:
+            return super().post(request, *args, **kwargs)
+        finally:
+            invalidate_token_cache(*token_keys)
 
 
 class FriendRequestViewSet(ModelViewSet):
@@ -380,9 +413,15 @@ class FriendRequestViewSet(ModelViewSet):
 
 
 class EventViewSet(ModelViewSet):
-    """Отображение мероприятий."""
+    """Отображение мероприятий.
 
-    queryset = Event.objects.all()
+    Параметр include_members=false убирает из ответа список участников.
+    """
+
+    # Meta.ordering не применяется к запросам с GROUP BY (members_total)
+    queryset = Event.objects.select_related("city").order_by(
+        "-start_date", "-id"
+    )
     serializer_class = EventSerializer
     filter_backends = (
         filters.SearchFilter,
@@ -400,6 +439,26 @@ class EventViewSet(ModelViewSet):
         IsAdminOrAuthorOrReadOnly,
     ]
 
+    def include_members(self):
+        """Нужен ли в ответе список участников."""
+        value = self.request.query_params.get("include_members", "true")
+        return value not in serializers.BooleanField.FALSE_VALUES
+
+    def get_queryset(self):
+        """Число и список участников загружаются для всей страницы сразу."""
+        queryset = super().get_queryset()
+        if self.action not in ("list", "retrieve"):
+            return queryset
+        if self.include_members():
+            queryset = queryset.with_members()
+        return queryset.with_members_count()
+
+    def get_serializer_context(self):
+        """Передача в сериализатор признака вывода участников."""
+        context = super().get_serializer_context()
+        context["include_members"] = self.include_members()
+        return context
+
     @swagger_auto_schema(
         responses={
             401: openapi.Response(
@@ -456,25 +515,14 @@ class EventViewSet(ModelViewSet):
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def distances(self, request):
-        """Получение расстояния до мероприятий от текущего пользователя."""
-        locations = EventLocation.objects.all()
-        data = []
-        if self.request.query_params and self.request.query_params["search"]:
-            max_distance = int(self.request.query_params["search"])
-        else:
-            max_distance = MAX_DISTANCE
-        for location in locations:
-            distance = get_event_distance(
-                self.request.user, location.event, (location.lat, location.lon)
-            )
-            if distance and distance["distance"] <= max_distance:
-                data.append(
-                    {
-                        "event": location.event.id,
-                        "name": location.event.name,
-                        "distance": distance["distance"],
-                    }
-                )
+        """Получение расстояния до мероприятий от текущего пользователя.
+
+        Мероприятия отсортированы по возрастанию расстояния.
+        """
+        max_distance = int(
+            self.request.query_params.get("search") or MAX_DISTANCE
+        )
+        data = get_events_nearby(self.request.user, max_distance)
         return Response(data, status=status.HTTP_200_OK)
 
 
@@ -1,7 +1,8 @@
 from admin_auto_filters.filters import AutocompleteFilter
 from django.contrib import admin
 
-from .models import Chat, Message
+from .models import Chat, Message, MessageArchive
+from .search import annotate_search, get_search_words
 
 
 @admin.register(Chat)
@@ -53,5 +54,30 @@ class MessageAdmin(admin.ModelAdmin):
         "timestamp",
     )
     list_filter = ("timestamp", ChatFilter, SenderFilter)
+    search_fields = ("text",)
     ordering = ("-timestamp",)
     empty_value_display = "-пусто-"
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по тексту через полнотекстовый индекс."""
+        words = get_search_words(search_term)
+        if not words:
+            return queryset, False
+        return annotate_search(queryset, words), False
+
+
+@admin.register(MessageArchive)
+class MessageArchiveAdmin(admin.ModelAdmin):
+    """Админка архивов сообщений."""
+
+    list_display = (
+        "id",
+        "chat",
+        "month",
+        "count",
+        "path",
+        "created_at",
+    )
+    list_filter = ("month", ChatFilter)
+    ordering = ("-month",)
+    empty_value_display = "-пусто-"
@@ -0,0 +1,194 @@
+"""Архивация старых сообщений в файлы JSONL.gz.
+
+Сообщения за месяц сохраняются в MESSAGE_ARCHIVE_ROOT в файлы по одному
+на чат и месяц, после чего удаляются из таблицы сообщений (в PostgreSQL
+вместе с секцией месяца), поэтому размер таблицы и её индексов
+ограничен. История чата дочитывает архивы, когда сообщения в таблице
+заканчиваются.
+"""
+
+import gzip
+import json
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+from chat.models import Chat, Message, MessageArchive
+from chat.partitions import (
+    add_months,
+    drop_partition,
+    get_month,
+    get_month_bounds,
+)
+from config.logging import logger
+
+# Поля сообщения в архиве, совпадают с полями истории чата
+ARCHIVE_FIELDS = ("id", "uuid", "sender", "text", "timestamp")
+
+_timestamp_field = serializers.DateTimeField()
+
+
+def get_archive_path(chat_id, month):
+    """Путь к файлу архива относительно MESSAGE_ARCHIVE_ROOT."""
+    return os.path.join(f"{month:%Y-%m}", f"chat-{chat_id}.jsonl.gz")
+
+
+def write_archive(path, rows):
+    """Запись строк архива, файл заменяется целиком."""
+    full_path = os.path.join(settings.MESSAGE_ARCHIVE_ROOT, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    temp_path = f"{full_path}.tmp"
+    with gzip.open(temp_path, "wt", encoding="utf-8") as file:
+        for row in rows:
+            file.write(json.dumps(row, ensure_ascii=False) + "\n")
+    os.replace(temp_path, full_path)
+
+
+def read_archive(archive):
+    """Строки архива, от новых сообщений к старым.
+
+    Если файла архива нет (например, каталог архивов не подключён к
+    контейнеру), возвращается пустой список: более старой истории нет.
+    """
+    full_path = os.path.join(settings.MESSAGE_ARCHIVE_ROOT, archive.path)
+    try:
+        with gzip.open(full_path, "rt", encoding="utf-8") as file:
+            return [json.loads(line) for line in file]
+    except FileNotFoundError:
+        logger.error(f"Файл архива сообщений не найден: {full_path}")
+        return []
+
+
+def archive_chat_month(chat_id, month, messages):
+    """Архивация сообщений чата за месяц.
+
+    При повторной архивации месяца (например, после сбоя) строки
+    дописываются к существующему архиву. Возвращает число перенесённых
+    в архив сообщений.
+    """
+    rows = [
+        {
+            **row,
+            "uuid": str(row["uuid"]),
+            "timestamp": row["timestamp"].isoformat(),
+        }
+        for row in messages.order_by("-timestamp", "-id").values(
+            *ARCHIVE_FIELDS
+        )
+    ]
+    archive = MessageArchive.objects.filter(
+        chat_id=chat_id, month=month
+    ).first()
+    if archive is not None:
+        ids = {row["id"] for row in rows}
+        rows.extend(
+            row for row in read_archive(archive) if row["id"] not in ids
+        )
+        rows.sort(key=lambda row: (row["timestamp"], row["id"]), reverse=True)
+    path = get_archive_path(chat_id, month)
+    write_archive(path, rows)
+    ids = [row["id"] for row in rows]
+    MessageArchive.objects.update_or_create(
+        chat_id=chat_id,
+        month=month,
+        defaults={
+            "path": path,
+            "count": len(rows),
+            "min_message_id": min(ids),
+            "max_message_id": max(ids),
+        },
+    )
+    return len(rows) - (archive.count if archive is not None else 0)
+
+
+def archive_month(month):
+    """Архивация и удаление сообщений за месяц.
+
+    Возвращает число перенесённых в архив сообщений.
+    """
+    start, end = get_month_bounds(month)
+    messages = Message.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    chat_ids = list(
+        messages.order_by().values_list("chat_id", flat=True).distinct()
+    )
+    archived = 0
+    for chat_id in chat_ids:
+        archived += archive_chat_month(
+            chat_id, month, messages.filter(chat_id=chat_id)
+        )
+    with transaction.atomic():
+        Chat.objects.filter(
+            last_message__timestamp__gte=start,
+            last_message__timestamp__lt=end,
+        ).update(last_message=None)
+        drop_partition(month)
+        # Остаток: секция по умолчанию или СУБД без секционирования
+        messages.delete()
+    return archived
+
+
+def archive_messages(before_month):
+    """Архивация всех месяцев раньше before_month.
+
+    Возвращает список пар (месяц, число сообщений).
+    """
+    oldest = (
+        Message.objects.order_by("timestamp")
+        .values_list("timestamp", flat=True)
+        .first()
+    )
+    if oldest is None:
+        return []
+    results = []
+    month = get_month(oldest)
+    while month < before_month:
+        results.append((month, archive_month(month)))
+        month = add_months(month, 1)
+    return results
+
+
+def get_archived_history(chat_id, before, limit):
+    """Страница истории чата из архивов, от новых к старым.
+
+    При заданном before возвращаются сообщения старше архивного
+    сообщения с этим id. По диапазону id в MessageArchive пропускаются
+    архивы новее курсора, а наличие более старых сообщений определяется
+    по списку архивов, так что открываются только файлы, из которых
+    берутся строки страницы. Возвращает кортеж из списка сообщений и
+    признака наличия более старых сообщений.
+    """
+    archives = MessageArchive.objects.filter(chat_id=chat_id)
+    if before is not None:
+        archives = archives.filter(min_message_id__lt=before)
+    archives = list(archives.order_by("-month"))
+    rows = []
+    has_more = False
+    for archive in archives:
+        if len(rows) >= limit:
+            has_more = True
+            break
+        archived = read_archive(archive)
+        if before is not None and archive.max_message_id >= before:
+            archived = _get_rows_before(archived, before)
+        needed = limit - len(rows)
+        rows.extend(archived[:needed])
+        if len(archived) > needed:
+            has_more = True
+            break
+    for row in rows:
+        row["timestamp"] = _timestamp_field.to_representation(
+            parse_datetime(row["timestamp"])
+        )
+    return rows, has_more
+
+
+def _get_rows_before(rows, before):
+    """Строки архива после сообщения-курсора before."""
+    ids = [row["id"] for row in rows]
+    if before in ids:
+        position = ids.index(before) + 1
+        return rows[position:]
+    return [row for row in rows if row["id"] < before]
@@ -0,0 +1,162 @@
+import atexit
+import queue
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connections, transaction
+
+from chat.models import Message
+from chat.utils import get_chat_group_name, update_chat_on_messages
+from config.logging import logger
+
+
+class MessageBuffer:
+    """Буфер отложенной пакетной записи сообщений чата (write-behind).
+
+    Сообщения рассылаются участникам до записи в базу, а фоновый поток
+    сохраняет их пачками через bulk_create. Размер буфера ограничен:
+    при переполнении add возвращает False и сообщение нужно сохранить
+    синхронно. После записи участники чата получают через группу чата
+    подтверждение с id сообщения, а если пачку не удалось сохранить
+    после всех попыток, - событие об ошибке с uuid сообщений. При
+    завершении процесса буфер сбрасывается в базу. При
+    BACKGROUND_TASKS_EAGER = True сообщения сохраняются сразу в
+    вызывающем потоке (используется в тестах).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._queue = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """Ленивый запуск потока записи."""
+        with self._lock:
+            if self._thread is None:
+                self._queue = queue.Queue(
+                    maxsize=settings.CHAT_WRITE_BEHIND_MAX_PENDING
+                )
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._worker, name=self.name, daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.shutdown)
+            return self._queue
+
+    def add(self, message):
+        """Постановка сообщения в буфер.
+
+        Возвращает False, если буфер переполнен или остановлен.
+        """
+        if settings.BACKGROUND_TASKS_EAGER:
+            self.flush([message])
+            return True
+        if self._stopping.is_set():
+            return False
+        try:
+            self._start().put_nowait(message)
+        except queue.Full:
+            logger.warning(f"Буфер сообщений {self.name} переполнен")
+            return False
+        return True
+
+    def _get_batch(self, timeout):
+        """Пачка сообщений из очереди, не больше размера пачки."""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < settings.CHAT_WRITE_BEHIND_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        """Цикл записи пачек до остановки и опустошения очереди."""
+        interval = settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL
+        try:
+            while not (self._stopping.is_set() and self._queue.empty()):
+                batch = self._get_batch(interval)
+                if batch:
+                    self._flush_with_retries(batch)
+        finally:
+            # Соединения с БД потока записи не закрываются Django
+            connections.close_all()
+
+    def _flush_with_retries(self, batch):
+        """Запись пачки с повторными попытками.
+
+        Сообщения пачки уже разосланы участникам, поэтому после
+        последней неудачной попытки участники получают событие
+        chat.failed с uuid несохранённых сообщений.
+        """
+        retries = settings.BACKGROUND_TASKS_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                self.flush(batch)
+                return
+            except Exception as error:
+                if attempt == retries:
+                    logger.exception(
+                        f"Не удалось сохранить {len(batch)} сообщений "
+                        f"буфера {self.name}: {error}"
+                    )
+                    send_chat_events(batch, "chat.failed")
+                    return
+                logger.warning(
+                    f"Ошибка записи сообщений буфера {self.name}, попытка "
+                    f"{attempt + 1} из {retries + 1}: {error}"
+                )
+                connections.close_all()
+                time.sleep(settings.BACKGROUND_TASKS_RETRY_DELAY * 2**attempt)
+
+    def flush(self, messages):
+        """Сохранение пачки сообщений и подтверждение участникам."""
+        with transaction.atomic():
+            Message.objects.bulk_create(messages)
+            # Сигнал post_save при bulk_create не отправляется
+            update_chat_on_messages(messages)
+        send_chat_events(messages, "chat.ack")
+
+    def shutdown(self):
+        """Остановка потока с записью всех сообщений из буфера."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            thread.join()
+
+
+def send_chat_events(messages, event_type):
+    """Рассылка событий о сообщениях в группы их чатов.
+
+    Событие chat.ack содержит uuid и id сохранённого сообщения,
+    chat.failed - uuid сообщения, которое не удалось сохранить.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    for message in messages:
+        try:
+            async_to_sync(channel_layer.group_send)(
+                get_chat_group_name(message.chat_id),
+                {
+                    "type": event_type,
+                    "uuid": str(message.uuid),
+                    "id": message.id,
+                },
+            )
+        except Exception as error:
+            logger.warning(f"Слой каналов недоступен: {error}")
+            return
+
+
+message_buffer = MessageBuffer("chat-write-behind")
@@ -1,84 +1,300 @@
+import asyncio
 import json
+import time
 
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import WebsocketConsumer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 
-from chat.models import Chat, Message
+from chat.buffer import message_buffer
+from chat.middleware import TOKEN_SUBPROTOCOL
+from chat.models import Message
+from chat.presence import get_online_ids, mark_offline, mark_online
 from chat.serializers import MessageSerializer
-from chat.utils import check_friendshhip, get_chat_and_permissions
-from config.constants import MAX_MESSAGES_IN_CHAT
+from chat.utils import (
+    check_friendshhip,
+    check_not_blocked,
+    get_chat_and_permissions,
+    get_chat_group_name,
+    get_client_event,
+    get_message_history,
+    get_user_group_name,
+    mark_chat_read,
+    mark_chat_read_until,
+)
+from config.constants import (
+    CHAT_REVOKED_CLOSE_CODE,
+    MAX_MESSAGES_IN_CHAT,
+    READ_RECEIPTS_FLUSH_INTERVAL,
+    TYPING_EVENT_INTERVAL,
+)
 
 
-class ChatConsumer(WebsocketConsumer):
-    """Consumer для чатов."""
+class ChatConsumer(AsyncWebsocketConsumer):
+    """Асинхронный consumer для чатов.
 
+    Обращения к ORM выполняются через database_sync_to_async, остальная
+    работа не блокирует цикл событий. Права проверяются один раз при
+    подключении, чат и его участники хранятся в consumer. Об удалении
+    из друзей и блокировке consumer узнает из группы пользователя и
+    закрывает подключение.
+
+    Клиент отправляет JSON кадры с полем type: message, history, typing,
+    read и presence, обычный текст считается сообщением. Набор текста
+    и отметки о прочтении прореживаются на сервере, присутствие
+    хранится в кэше по каналам подключений пользователя. При
+    CHAT_WRITE_BEHIND = True сообщения рассылаются сразу без id, а в
+    базу записываются пачками через буфер. После записи оба участника
+    получают кадр ack с uuid и id сообщения, по которому можно
+    отправить отметку о прочтении, а при ошибке записи - кадр failed.
+    """
+
+    chat = None
+    participant_ids = frozenset()
+    last_typing = None
+    read_all = False
+    read_until = None
+    read_task = None
+
+    @database_sync_to_async
     def _validate_user(self, user):
         """Валидация пользователя."""
         chat = get_chat_and_permissions(user, self.room_name)
         other_user = chat.initiator if user == chat.receiver else chat.receiver
         check_friendshhip(user, other_user)
+        check_not_blocked(user, other_user)
+        return chat
 
-    def connect(self):
+    @database_sync_to_async
+    def _create_message(self, text):
+        """Сохранение сообщения."""
+        message_obj = Message.objects.create(
+            sender=self.scope["user"],
+            text=text,
+            chat=self.chat,
+        )
+        return MessageSerializer(instance=message_obj).data
+
+    @database_sync_to_async
+    def _buffer_message(self, message):
+        """Постановка сообщения в буфер записи.
+
+        При переполнении буфера сообщение сохраняется сразу, тогда
+        возвращается True и подтверждение отправляет сам consumer.
+        """
+        if message_buffer.add(message):
+            return False
+        message.save()
+        return True
+
+    async def connect(self):
         """Подключение к чату."""
         self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
-        self.room_group_name = f"chat_{self.room_name}"
+        self.room_group_name = get_chat_group_name(self.room_name)
 
         try:
-            self._validate_user(self.scope["user"])
+            self.chat = await self._validate_user(self.scope["user"])
         except Exception:
-            self.close()
+            await self.close()
+            return
+        self.participant_ids = frozenset(
+            (self.chat.initiator_id, self.chat.receiver_id)
+        )
+        self.user_group_name = get_user_group_name(self.scope["user"].id)
 
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             self.room_group_name, self.channel_name
         )
-        self.accept()
+        await self.channel_layer.group_add(
+            self.user_group_name, self.channel_name
+        )
+        if await mark_online(self.scope["user"].id, self.channel_name):
+            await self.send_to_room("chat.presence", online=True)
+        # Токен, переданный подпротоколом, требует его подтверждения
+        subprotocol = (
+            TOKEN_SUBPROTOCOL
+            if TOKEN_SUBPROTOCOL in self.scope.get("subprotocols", [])
+            else None
+        )
+        await self.accept(subprotocol=subprotocol)
 
-        # Подгрузка последних X сообщений
-        messages = Message.objects.filter(chat=int(self.room_name)).order_by(
-            "-timestamp"
-        )[:MAX_MESSAGES_IN_CHAT]
-        self.send_messages(messages)
+        # Подгрузка последних X сообщений одним кадром
+        await self.send_history()
+        await database_sync_to_async(mark_chat_read)(
+            self.chat, self.scope["user"]
+        )
 
-    def disconnect(self, close_code):
+    async def disconnect(self, close_code):
         """Отключение от чата."""
-        async_to_sync(self.channel_layer.group_discard)(
+        if self.chat is None:
+            return
+        if self.read_task is not None:
+            self.read_task.cancel()
+            await self.flush_read_receipts()
+        if await mark_offline(self.scope["user"].id, self.channel_name):
+            await self.send_to_room("chat.presence", online=False)
+        await self.channel_layer.group_discard(
             self.room_group_name, self.channel_name
         )
+        await self.channel_layer.group_discard(
+            self.user_group_name, self.channel_name
+        )
 
-    # Receive message from WebSocket
-    def receive(self, text_data=None, bytes_data=None):
-        """Получение сообщения от вебсокета."""
-        chat = Chat.objects.get(id=int(self.room_name))
-        sender = self.scope["user"]
-
-        message_obj = Message.objects.create(
-            sender=sender,
-            text=text_data,
-            chat=chat,
+    async def send_to_room(self, event_type, **data):
+        """Рассылка события текущего пользователя участникам чата."""
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {"type": event_type, "user": self.scope["user"].id, **data},
         )
 
-        serializer = MessageSerializer(instance=message_obj)
+    # Receive event from WebSocket
+    async def receive(self, text_data=None, bytes_data=None):
+        """Получение кадра от вебсокета и вызов обработчика по типу."""
+        event = get_client_event(text_data)
+        handler = getattr(self, f"receive_{event.pop('type')}")
+        await handler(**event)
+
+    async def receive_history(self, before=None, limit=MAX_MESSAGES_IN_CHAT):
+        """Запрос страницы истории сообщений."""
+        await self.send_history(before, limit)
 
-        # Send message to room group
-        chat_type = {"type": "chat_message"}
-        message = {"message": {**serializer.data}}
-        return_dict = {**chat_type, **message}
-        async_to_sync(self.channel_layer.group_send)(
+    async def receive_message(self, text):
+        """Новое сообщение."""
+        if not settings.CHAT_WRITE_BEHIND:
+            message = await self._create_message(text)
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {"type": "chat_message", "message": message},
+            )
+            return
+
+        # Write-behind: рассылка до записи, uuid и время задаёт сервер
+        message_obj = Message(
+            sender=self.scope["user"], text=text, chat=self.chat
+        )
+        await self.channel_layer.group_send(
             self.room_group_name,
-            return_dict,
+            {
+                "type": "chat_message",
+                "message": MessageSerializer(instance=message_obj).data,
+            },
         )
+        if await self._buffer_message(message_obj):
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    "type": "chat.ack",
+                    "uuid": str(message_obj.uuid),
+                    "id": message_obj.id,
+                },
+            )
+
+    async def receive_typing(self):
+        """Индикатор набора текста.
+
+        Кадры чаще раза в TYPING_EVENT_INTERVAL секунд отбрасываются,
+        в базу ничего не пишется.
+        """
+        now = time.monotonic()
+        if (
+            self.last_typing is not None
+            and now - self.last_typing < TYPING_EVENT_INTERVAL
+        ):
+            return
+        self.last_typing = now
+        await self.send_to_room("chat.typing")
+
+    async def receive_read(self, message_id=None):
+        """Отметка о прочтении сообщений до message_id включительно.
+
+        Отметки копятся READ_RECEIPTS_FLUSH_INTERVAL секунд и
+        записываются в счётчик непрочитанного одним запросом.
+        """
+        if message_id is None:
+            self.read_all = True
+        else:
+            self.read_until = max(message_id, self.read_until or 0)
+        if self.read_task is None:
+            self.read_task = asyncio.ensure_future(self._flush_read_later())
+
+    async def receive_presence(self):
+        """Пульс присутствия, в ответ приходит статус собеседника."""
+        user_id = self.scope["user"].id
+        if await mark_online(user_id, self.channel_name):
+            await self.send_to_room("chat.presence", online=True)
+        other_ids = self.participant_ids - {user_id, None}
+        online_ids = await get_online_ids(other_ids)
+        for participant_id in other_ids:
+            await self.send_event(
+                "presence",
+                user=participant_id,
+                online=participant_id in online_ids,
+            )
+
+    async def _flush_read_later(self):
+        """Отложенная запись накопленных отметок о прочтении."""
+        await asyncio.sleep(READ_RECEIPTS_FLUSH_INTERVAL)
+        await self.flush_read_receipts()
+
+    async def flush_read_receipts(self):
+        """Запись отметки о прочтении и уведомление собеседника."""
+        message_id = None if self.read_all else self.read_until
+        pending = self.read_all or self.read_until is not None
+        self.read_all, self.read_until, self.read_task = False, None, None
+        if not pending:
+            return
+        await database_sync_to_async(mark_chat_read_until)(
+            self.chat, self.scope["user"], message_id
+        )
+        await self.send_to_room("chat.read", message_id=message_id)
+
+    async def send_event(self, event_type, **data):
+        """Отправка клиенту кадра указанного типа."""
+        await self.send(text_data=json.dumps({"type": event_type, **data}))
 
     # Receive message from room group
-    def chat_message(self, event):
+    async def chat_message(self, event):
         """Получение сообщения от чата."""
-        text_data_json = event.copy()
-        text_data_json.pop("type")
-        message = text_data_json["message"]
+        await self.send(text_data=json.dumps(event["message"]))
+
+    # Receive persistence results from message buffer
+    async def chat_ack(self, event):
+        """Сообщение сохранено, участник получает его id."""
+        await self.send_event("ack", uuid=event["uuid"], id=event["id"])
+
+    async def chat_failed(self, event):
+        """Сообщение не удалось сохранить после всех попыток."""
+        await self.send_event("failed", uuid=event["uuid"])
 
-        self.send(text_data=json.dumps(message))
+    # Receive typing, read and presence events from room group
+    async def chat_typing(self, event):
+        """Собеседник набирает текст."""
+        if event["user"] != self.scope["user"].id:
+            await self.send_event("typing", user=event["user"])
 
-    def send_messages(self, messages):
-        """Отправка нескольких сообщений на вебсокет."""
-        for message in messages:
-            serializer = MessageSerializer(instance=message)
-            self.send(text_data=json.dumps(serializer.data))
+    async def chat_read(self, event):
+        """Собеседник прочитал сообщения."""
+        if event["user"] != self.scope["user"].id:
+            await self.send_event(
+                "read", user=event["user"], message_id=event["message_id"]
+            )
+
+    async def chat_presence(self, event):
+        """Собеседник подключился или отключился."""
+        if event["user"] != self.scope["user"].id:
+            await self.send_event(
+                "presence", user=event["user"], online=event["online"]
+            )
+
+    # Receive access revocation from user group
+    async def chat_revoked(self, event):
+        """Закрытие подключения после удаления из друзей или блокировки."""
+        if self.participant_ids <= set(event["user_ids"]):
+            await self.close(code=CHAT_REVOKED_CLOSE_CODE)
+
+    async def send_history(self, before=None, limit=MAX_MESSAGES_IN_CHAT):
+        """Отправка страницы истории сообщений одним кадром."""
+        messages, has_more = await database_sync_to_async(get_message_history)(
+            self.chat.id, before, limit
+        )
+        await self.send_event("history", messages=messages, has_more=has_more)
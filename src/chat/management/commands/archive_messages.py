@@ -0,0 +1,43 @@
+"""Архивация старых сообщений чатов и подготовка секций таблицы."""
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from chat.archive import archive_messages
+from chat.partitions import add_months, ensure_partitions, get_month
+from config.constants import MESSAGE_HOT_MONTHS, MESSAGE_PARTITIONS_AHEAD
+
+
+class Command(BaseCommand):
+    """Command."""
+
+    help = (
+        "Перенос сообщений старше заданного числа месяцев в архивы "
+        "JSONL.gz и создание секций таблицы сообщений на месяцы вперёд"
+    )
+
+    def add_arguments(self, parser):
+        """Добавление аргументов."""
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=MESSAGE_HOT_MONTHS,
+            help="Сколько последних месяцев оставить в таблице",
+        )
+
+    def handle(self, *args, **options):
+        """Архивация сообщений."""
+        current = get_month(timezone.now())
+        for name in ensure_partitions(
+            current, add_months(current, MESSAGE_PARTITIONS_AHEAD)
+        ):
+            self.stdout.write(f"Создана секция {name}")
+        results = archive_messages(add_months(current, -options["months"]))
+        for month, count in results:
+            self.stdout.write(f"{month:%Y-%m}: в архив перенесено {count}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Архивация завершена: "
+                f"{sum(count for _, count in results)} сообщений"
+            )
+        )
@@ -0,0 +1,270 @@
+"""Нагрузочное сравнение синхронного и асинхронного consumer чата.
+
+Команда создаёт двух временных пользователей-друзей и чат между ними,
+открывает заданное число одновременных WebSocket подключений к каждой
+реализации consumer и измеряет время подключения и задержку доставки
+сообщений всем участникам группы. Временные данные удаляются после
+замера. Используется слой каналов из настроек проекта.
+"""
+
+import asyncio
+import json
+import statistics
+from time import perf_counter
+from uuid import uuid4
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.generic.websocket import WebsocketConsumer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management import BaseCommand
+from django.urls import re_path
+from rest_framework.authtoken.models import Token
+
+from chat.consumers import ChatConsumer
+from chat.middleware import TokenAuthMiddleware
+from chat.models import Chat, Message
+from chat.serializers import MessageSerializer
+from chat.utils import check_friendshhip, get_chat_and_permissions
+from config.constants import MAX_MESSAGES_IN_CHAT
+from users.models import Friendship, User
+
+
+class SyncChatConsumer(WebsocketConsumer):
+    """Прежняя синхронная реализация consumer чата для сравнения."""
+
+    def _validate_user(self, user):
+        """Валидация пользователя."""
+        chat = get_chat_and_permissions(user, self.room_name)
+        other_user = chat.initiator if user == chat.receiver else chat.receiver
+        check_friendshhip(user, other_user)
+
+    def connect(self):
+        """Подключение к чату."""
+        self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
+        self.room_group_name = f"chat_{self.room_name}"
+        try:
+            self._validate_user(self.scope["user"])
+        except Exception:
+            self.close()
+            return
+        async_to_sync(self.channel_layer.group_add)(
+            self.room_group_name, self.channel_name
+        )
+        self.accept()
+        messages = Message.objects.filter(chat=int(self.room_name)).order_by(
+            "-timestamp"
+        )[:MAX_MESSAGES_IN_CHAT]
+        for message in messages:
+            serializer = MessageSerializer(instance=message)
+            self.send(text_data=json.dumps(serializer.data))
+
+    def disconnect(self, close_code):
+        """Отключение от чата."""
+        if hasattr(self, "room_group_name"):
+            async_to_sync(self.channel_layer.group_discard)(
+                self.room_group_name, self.channel_name
+            )
+
+    def receive(self, text_data=None, bytes_data=None):
+        """Получение сообщения от вебсокета."""
+        chat = Chat.objects.get(id=int(self.room_name))
+        message_obj = Message.objects.create(
+            sender=self.scope["user"], text=text_data, chat=chat
+        )
+        serializer = MessageSerializer(instance=message_obj)
+        async_to_sync(self.channel_layer.group_send)(
+            self.room_group_name,
+            {"type": "chat_message", "message": {**serializer.data}},
+        )
+
+    def chat_message(self, event):
+        """Получение сообщения от чата."""
+        self.send(text_data=json.dumps(event["message"]))
+
+
+CONSUMERS = {
+    "sync": SyncChatConsumer,
+    "async": ChatConsumer,
+}
+
+
+def get_application(consumer_class):
+    """ASGI приложение с маршрутом чата для указанного consumer."""
+    return TokenAuthMiddleware(
+        URLRouter(
+            [
+                re_path(
+                    r"ws/chat/(?P<room_name>\w+)/$", consumer_class.as_asgi()
+                )
+            ]
+        )
+    )
+
+
+async def drain(communicator, timeout=0.2):
+    """Пропуск кадров, отправленных при подключении (история, присутствие)."""
+    while not await communicator.receive_nothing(timeout):
+        await communicator.receive_from()
+
+
+async def receive_message(communicator, text, timeout):
+    """Ожидание кадра сообщения с текстом text.
+
+    Служебные кадры (history, presence, typing и другие) пропускаются.
+    Кадр сообщения в рассылке consumer не содержит type или имеет
+    type "message". По истечении timeout выбрасывается TimeoutError.
+    """
+    deadline = perf_counter() + timeout
+    while True:
+        remaining = deadline - perf_counter()
+        if remaining <= 0:
+            raise asyncio.TimeoutError(text)
+        data = json.loads(await communicator.receive_from(remaining))
+        if (
+            isinstance(data, dict)
+            and data.get("type", "message") == "message"
+            and data.get("text") == text
+        ):
+            return
+
+
+def get_percentile(values, percent):
+    """Перцентиль списка значений."""
+    if len(values) < 2:
+        return values[0] if values else 0
+    return statistics.quantiles(values, n=100)[percent - 1]
+
+
+class Command(BaseCommand):
+    """Command."""
+
+    help = "Сравнение синхронного и асинхронного consumer чата"
+
+    def add_arguments(self, parser):
+        """Добавление аргументов."""
+        parser.add_argument(
+            "--connections",
+            type=int,
+            default=100,
+            help="Количество одновременных подключений",
+        )
+        parser.add_argument(
+            "--messages",
+            type=int,
+            default=20,
+            help="Количество отправляемых сообщений",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=10,
+            help="Время ожидания подключения и сообщения, с",
+        )
+        parser.add_argument(
+            "--consumer",
+            choices=CONSUMERS.keys(),
+            nargs="+",
+            default=list(CONSUMERS.keys()),
+            help="Сравниваемые реализации",
+        )
+
+    def create_chat(self):
+        """Создание временных пользователей и чата."""
+        suffix = uuid4().hex[:12]
+        users = [
+            User.objects.create_user(
+                email=f"benchmark-{number}-{suffix}@benchmark.local",
+                password=uuid4().hex,
+                first_name="Нагрузка",
+                last_name="Тест",
+            )
+            for number in range(2)
+        ]
+        Friendship.objects.create(initiator=users[0], friend=users[1])
+        chat = Chat.objects.create(initiator=users[0], receiver=users[1])
+        tokens = [Token.objects.create(user=user).key for user in users]
+        return users, chat, tokens
+
+    async def run(self, consumer_class, chat, tokens, options):
+        """Замер одной реализации consumer."""
+        application = get_application(consumer_class)
+        timeout = options["timeout"]
+        communicators = [
+            WebsocketCommunicator(
+                application,
+                f"/ws/chat/{chat.id}/",
+                headers=[
+                    (
+                        b"authorization",
+                        f"Token {tokens[number % 2]}".encode(),
+                    )
+                ],
+            )
+            for number in range(options["connections"])
+        ]
+        start = perf_counter()
+        results = await asyncio.gather(
+            *(communicator.connect(timeout) for communicator in communicators),
+            return_exceptions=True,
+        )
+        connect_time = perf_counter() - start
+        connected = [
+            communicator
+            for communicator, result in zip(communicators, results)
+            if isinstance(result, tuple) and result[0]
+        ]
+        latencies = []
+        errors = 0
+        await asyncio.gather(
+            *(drain(communicator) for communicator in connected),
+            return_exceptions=True,
+        )
+        if connected:
+            for number in range(options["messages"]):
+                text = f"Сообщение {number}"
+                start = perf_counter()
+                await connected[0].send_to(text_data=text)
+                received = await asyncio.gather(
+                    *(
+                        receive_message(communicator, text, timeout)
+                        for communicator in connected
+                    ),
+                    return_exceptions=True,
+                )
+                latencies.append((perf_counter() - start) * 1000)
+                errors += sum(
+                    isinstance(item, BaseException) for item in received
+                )
+        await asyncio.gather(
+            *(communicator.disconnect() for communicator in communicators),
+            return_exceptions=True,
+        )
+        await sync_to_async(Message.objects.filter(chat=chat).delete)()
+        return {
+            "connected": len(connected),
+            "connect_time": connect_time,
+            "latency_p50": statistics.median(latencies) if latencies else 0,
+            "latency_p95": get_percentile(latencies, 95),
+            "errors": errors,
+        }
+
+    def handle(self, *args, **options):
+        """Запуск замеров."""
+        users, chat, tokens = self.create_chat()
+        try:
+            for name in options["consumer"]:
+                result = async_to_sync(self.run)(
+                    CONSUMERS[name], chat, tokens, options
+                )
+                self.stdout.write(
+                    f"{name}: подключено {result['connected']} из "
+                    f"{options['connections']} за "
+                    f"{result['connect_time']:.2f} с, задержка сообщений "
+                    f"p50 {result['latency_p50']:.1f} мс, "
+                    f"p95 {result['latency_p95']:.1f} мс, "
+                    f"не доставлено {result['errors']}"
+                )
+        finally:
+            Chat.objects.filter(id=chat.id).delete()
+            User.objects.filter(id__in=[user.id for user in users]).delete()
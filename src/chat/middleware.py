@@ -1,17 +1,63 @@
+from urllib.parse import parse_qs
+
 from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from rest_framework.authtoken.models import Token
 
+from config.constants import WS_TOKEN_CACHE_TTL
+
+# Подпротокол вебсокета для передачи токена: ["Token", "<ключ токена>"]
+TOKEN_SUBPROTOCOL = "Token"
+
+
+def get_token_cache_key(token_key):
+    """Ключ кэша пользователя по токену."""
+    return f"ws_token_{token_key}"
+
+
+def invalidate_token_cache(*token_keys):
+    """Удаление пользователей токенов из кэша (при логауте)."""
+    cache.delete_many([get_token_cache_key(key) for key in token_keys])
+
 
 @database_sync_to_async
 def get_user(token_key):
-    """Получение пользователя из токена аутентификации."""
-    try:
-        token = Token.objects.get(key=token_key)
-        return token.user
-    except Token.DoesNotExist:
+    """Получение пользователя из токена аутентификации.
+
+    Пользователь кэшируется на WS_TOKEN_CACHE_TTL секунд, при промахе
+    выполняется один запрос с select_related.
+    """
+    cache_key = get_token_cache_key(token_key)
+    user = cache.get(cache_key)
+    if user is not None:
+        return user
+    token = Token.objects.select_related("user").filter(key=token_key).first()
+    if token is None or not token.user.is_active:
         return AnonymousUser()
+    cache.set(cache_key, token.user, WS_TOKEN_CACHE_TTL)
+    return token.user
+
+
+def get_token_key(scope):
+    """Получение токена из заголовка, строки запроса или подпротокола."""
+    headers = dict(scope["headers"])
+    if b"authorization" in headers:
+        token_name, _, token_key = (
+            headers[b"authorization"].decode().partition(" ")
+        )
+        if token_name == "Token" and token_key:
+            return token_key
+    query = parse_qs(scope.get("query_string", b"").decode())
+    if query.get("token"):
+        return query["token"][0]
+    subprotocols = scope.get("subprotocols") or []
+    if TOKEN_SUBPROTOCOL in subprotocols:
+        index = subprotocols.index(TOKEN_SUBPROTOCOL)
+        if index + 1 < len(subprotocols):
+            return subprotocols[index + 1]
+    return None
 
 
 class TokenAuthMiddleware(BaseMiddleware):
@@ -22,9 +68,7 @@ class TokenAuthMiddleware(BaseMiddleware):
 
     async def __call__(self, scope, receive, send):
         """Вызов."""
-        headers = dict(scope["headers"])
-        if b"authorization" in headers:
-            token_name, token_key = headers[b"authorization"].decode().split()
-            if token_name == "Token":
-                scope["user"] = await get_user(token_key)
+        token_key = get_token_key(scope)
+        if token_key:
+            scope["user"] = await get_user(token_key)
         return await super().__call__(scope, receive, send)
@@ -0,0 +1,68 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_last_message(apps, schema_editor):
+    """Заполнение последнего сообщения и времени активности чатов."""
+    Chat = apps.get_model("chat", "Chat")
+    Message = apps.get_model("chat", "Message")
+    last_messages = Message.objects.filter(chat=OuterRef("pk")).order_by(
+        "-timestamp", "-id"
+    )
+    Chat.objects.update(
+        last_message=Subquery(last_messages.values("id")[:1]),
+        last_activity=Coalesce(
+            Subquery(last_messages.values("timestamp")[:1]), F("start_time")
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0002_message_chat_timestamp_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chat",
+            name="initiator_unread",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Непрочитано инициатором"
+            ),
+        ),
+        migrations.AddField(
+            model_name="chat",
+            name="last_activity",
+            field=models.DateTimeField(
+                db_index=True,
+                default=django.utils.timezone.now,
+                verbose_name="Время последней активности",
+            ),
+        ),
+        migrations.AddField(
+            model_name="chat",
+            name="last_message",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="chat.message",
+                verbose_name="Последнее сообщение",
+            ),
+        ),
+        migrations.AddField(
+            model_name="chat",
+            name="receiver_unread",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Непрочитано получателем"
+            ),
+        ),
+        migrations.RunPython(fill_last_message, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-18 21:40
+
+import uuid
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0003_chat_last_message"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="message",
+            name="timestamp",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                editable=False,
+                verbose_name="Время отправки",
+            ),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="uuid",
+            field=models.UUIDField(
+                default=uuid.uuid4,
+                editable=False,
+                null=True,
+                verbose_name="Идентификатор",
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.2 on 2026-10-18 21:40
+
+import uuid
+
+from django.db import migrations
+
+
+def fill_message_uuid(apps, schema_editor):
+    """Заполнение уникальных идентификаторов существующих сообщений."""
+    Message = apps.get_model("chat", "Message")
+    messages = list(Message.objects.filter(uuid__isnull=True).only("id"))
+    for message in messages:
+        message.uuid = uuid.uuid4()
+    Message.objects.bulk_update(messages, ["uuid"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0004_message_uuid"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_message_uuid, migrations.RunPython.noop),
+    ]
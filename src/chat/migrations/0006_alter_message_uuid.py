@@ -0,0 +1,25 @@
+# Generated by Django 5.0.2 on 2026-10-18 21:40
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0005_fill_message_uuid"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="message",
+            name="uuid",
+            field=models.UUIDField(
+                default=uuid.uuid4,
+                editable=False,
+                unique=True,
+                verbose_name="Идентификатор",
+            ),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.0.2 on 2026-10-18 22:10
+
+from django.db import migrations
+
+POSTGRESQL_FORWARD = [
+    """
+    ALTER TABLE chat_message ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('russian'::regconfig, coalesce(text, ''))
+    ) STORED
+    """,
+    """
+    CREATE INDEX message_search_vector_idx
+    ON chat_message USING GIN (search_vector)
+    """,
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS message_search_vector_idx",
+    "ALTER TABLE chat_message DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE chat_message_fts USING fts5(
+        text, content='chat_message', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_insert AFTER INSERT ON chat_message
+    BEGIN
+        INSERT INTO chat_message_fts(rowid, text)
+        VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_delete AFTER DELETE ON chat_message
+    BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_update AFTER UPDATE OF text
+    ON chat_message
+    BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO chat_message_fts(rowid, text)
+        VALUES (new.id, new.text);
+    END
+    """,
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_update",
+    "DROP TRIGGER IF EXISTS chat_message_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_message_fts_insert",
+    "DROP TABLE IF EXISTS chat_message_fts",
+]
+
+
+def run_vendor_sql(statements):
+    """Выполнение SQL для текущей СУБД, остальные СУБД пропускаются."""
+
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0006_alter_message_uuid"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_vendor_sql(
+                {"postgresql": POSTGRESQL_FORWARD, "sqlite": SQLITE_FORWARD}
+            ),
+            run_vendor_sql(
+                {"postgresql": POSTGRESQL_BACKWARD, "sqlite": SQLITE_BACKWARD}
+            ),
+        ),
+    ]
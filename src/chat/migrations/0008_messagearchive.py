@@ -0,0 +1,78 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0007_message_search"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="chat",
+            name="last_message",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="chat.message",
+                verbose_name="Последнее сообщение",
+            ),
+        ),
+        migrations.CreateModel(
+            name="MessageArchive",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField(verbose_name="Месяц")),
+                ("path", models.CharField(max_length=255, verbose_name="Файл архива")),
+                (
+                    "count",
+                    models.PositiveIntegerField(verbose_name="Количество сообщений"),
+                ),
+                (
+                    "min_message_id",
+                    models.BigIntegerField(verbose_name="Наименьший id сообщения"),
+                ),
+                (
+                    "max_message_id",
+                    models.BigIntegerField(verbose_name="Наибольший id сообщения"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Время архивации"),
+                ),
+                (
+                    "chat",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="message_archives",
+                        to="chat.chat",
+                        verbose_name="Чат",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Архив сообщений",
+                "verbose_name_plural": "Архивы сообщений",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="messagearchive",
+            constraint=models.UniqueConstraint(
+                fields=("chat", "month"), name="unique_chat_archive_month"
+            ),
+        ),
+    ]
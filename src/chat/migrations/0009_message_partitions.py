@@ -0,0 +1,166 @@
+# Generated by Django 5.0.2 on 2026-10-18 22:40
+
+import uuid
+from datetime import date
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Таблица сообщений пересоздаётся секционированной по месяцам. Первичный
+# ключ и уникальность uuid включают ключ секционирования timestamp.
+# PostgreSQL 16 не поддерживает identity в секционированных таблицах,
+# поэтому id получает значения из обычной последовательности.
+CREATE_PARTITIONED_TABLE = [
+    "ALTER TABLE chat_message RENAME TO chat_message_legacy",
+    "ALTER TABLE chat_message_legacy ALTER COLUMN id DROP IDENTITY IF EXISTS",
+    "CREATE SEQUENCE chat_message_id_seq AS bigint",
+    """
+    CREATE TABLE chat_message (
+        id bigint NOT NULL DEFAULT nextval('chat_message_id_seq'),
+        text varchar(1000) NOT NULL,
+        timestamp timestamp with time zone NOT NULL,
+        chat_id bigint NOT NULL,
+        sender_id bigint NULL,
+        uuid uuid NOT NULL,
+        search_vector tsvector GENERATED ALWAYS AS (
+            to_tsvector('russian'::regconfig, coalesce(text, ''))
+        ) STORED
+    ) PARTITION BY RANGE (timestamp)
+    """,
+    "ALTER SEQUENCE chat_message_id_seq OWNED BY chat_message.id",
+    "CREATE TABLE chat_message_default PARTITION OF chat_message DEFAULT",
+]
+
+COPY_DATA = [
+    """
+    INSERT INTO chat_message (id, text, timestamp, chat_id, sender_id, uuid)
+    SELECT id, text, timestamp, chat_id, sender_id, uuid
+    FROM chat_message_legacy
+    """,
+    """
+    SELECT setval(
+        'chat_message_id_seq',
+        COALESCE((SELECT max(id) FROM chat_message), 0) + 1,
+        false
+    )
+    """,
+    "DROP TABLE chat_message_legacy",
+]
+
+# Имена индексов совпадают с созданными Django для исходной таблицы
+CREATE_CONSTRAINTS = [
+    """
+    ALTER TABLE chat_message
+    ADD CONSTRAINT chat_message_pkey PRIMARY KEY (id, timestamp)
+    """,
+    """
+    ALTER TABLE chat_message
+    ADD CONSTRAINT chat_message_uuid_timestamp_key UNIQUE (uuid, timestamp)
+    """,
+    """
+    ALTER TABLE chat_message
+    ADD CONSTRAINT chat_message_chat_id_21483fa7_fk_chat_chat_id
+    FOREIGN KEY (chat_id) REFERENCES chat_chat (id)
+    DEFERRABLE INITIALLY DEFERRED
+    """,
+    """
+    ALTER TABLE chat_message
+    ADD CONSTRAINT chat_message_sender_id_991c686c_fk_users_user_id
+    FOREIGN KEY (sender_id) REFERENCES users_user (id)
+    DEFERRABLE INITIALLY DEFERRED
+    """,
+    "CREATE INDEX chat_message_chat_id_21483fa7 ON chat_message (chat_id)",
+    "CREATE INDEX chat_message_sender_id_991c686c ON chat_message (sender_id)",
+    """
+    CREATE INDEX message_chat_timestamp_id_idx
+    ON chat_message (chat_id, timestamp, id)
+    """,
+    """
+    CREATE INDEX message_search_vector_idx
+    ON chat_message USING GIN (search_vector)
+    """,
+]
+
+# В остальных СУБД таблица не секционируется, добавляется только
+# составная уникальность. Уникальность самой колонки uuid в SQLite
+# объявлена в CREATE TABLE и без пересоздания таблицы (и триггеров
+# полнотекстового поиска) не снимается, она остаётся строже модели.
+OTHER_VENDORS_FORWARD = [
+    """
+    CREATE UNIQUE INDEX chat_message_uuid_timestamp_key
+    ON chat_message (uuid, timestamp)
+    """,
+]
+
+# Секции, создаваемые заранее на месяцы вперёд
+PARTITIONS_AHEAD = 3
+
+
+def add_months(month, count):
+    """Первое число месяца, отстоящего на count месяцев."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_messages(apps, schema_editor):
+    """Перенос сообщений в таблицу, секционированную по месяцам."""
+    if schema_editor.connection.vendor != "postgresql":
+        for statement in OTHER_VENDORS_FORWARD:
+            schema_editor.execute(statement)
+        return
+    for statement in CREATE_PARTITIONED_TABLE:
+        schema_editor.execute(statement)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT min(timestamp) AT TIME ZONE 'UTC' FROM chat_message_legacy"
+        )
+        oldest = cursor.fetchone()[0]
+    current = timezone.now().date().replace(day=1)
+    month = oldest.date().replace(day=1) if oldest else current
+    while month <= add_months(current, PARTITIONS_AHEAD):
+        following = add_months(month, 1)
+        schema_editor.execute(
+            f"CREATE TABLE chat_message_p{month:%Y%m} "
+            "PARTITION OF chat_message "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') "
+            f"TO ('{following:%Y-%m-%d} 00:00:00+00')"
+        )
+        month = following
+    for statement in COPY_DATA + CREATE_CONSTRAINTS:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0008_messagearchive"),
+    ]
+
+    operations = [
+        # Состояние модели описывает схему, созданную SQL: uuid уникален
+        # только вместе с timestamp
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                # Откат оставляет секционированную таблицу
+                migrations.RunPython(partition_messages, migrations.RunPython.noop),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="message",
+                    name="uuid",
+                    field=models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        verbose_name="Идентификатор",
+                    ),
+                ),
+                migrations.AddConstraint(
+                    model_name="message",
+                    constraint=models.UniqueConstraint(
+                        fields=("uuid", "timestamp"),
+                        name="chat_message_uuid_timestamp_key",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -1,4 +1,7 @@
+from uuid import uuid4
+
 from django.db import models
+from django.utils import timezone
 
 from config.constants import MAX_CHAT_MESSAGE_LENGTH
 from users.models import User
@@ -25,6 +28,29 @@ class Chat(models.Model):
         auto_now_add=True,
         verbose_name="Время создания чата",
     )
+    # Без ограничения в БД: таблица сообщений в PostgreSQL секционирована
+    last_message = models.ForeignKey(
+        "Message",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name="+",
+        verbose_name="Последнее сообщение",
+    )
+    last_activity = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name="Время последней активности",
+    )
+    initiator_unread = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Непрочитано инициатором",
+    )
+    receiver_unread = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Непрочитано получателем",
+    )
 
     class Meta:
         constraints = [
@@ -42,6 +68,14 @@ class Chat(models.Model):
     def __str__(self):
         return f"{self.initiator} - {self.receiver}"
 
+    def get_unread_count(self, user):
+        """Количество непрочитанных пользователем сообщений."""
+        if user.id == self.initiator_id:
+            return self.initiator_unread
+        if user.id == self.receiver_id:
+            return self.receiver_unread
+        return 0
+
 
 class Message(models.Model):
     """Модель сообщений."""
@@ -65,14 +99,67 @@ class Message(models.Model):
         verbose_name="Чат",
     )
     timestamp = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         verbose_name="Время отправки",
     )
+    uuid = models.UUIDField(
+        default=uuid4,
+        editable=False,
+        verbose_name="Идентификатор",
+    )
 
     class Meta:
+        # В PostgreSQL таблица секционирована по timestamp (миграция
+        # 0009_message_partitions), и уникальность включает ключ
+        # секционирования. Первичный ключ в базе - (id, timestamp), в
+        # модели остаётся id: Django 5.0 не поддерживает составные
+        # первичные ключи, уникальность id обеспечивает последовательность.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["uuid", "timestamp"],
+                name="chat_message_uuid_timestamp_key",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["chat", "timestamp", "id"],
+                name="message_chat_timestamp_id_idx",
+            )
+        ]
         verbose_name = "Сообщение"
         verbose_name_plural = "Сообщения"
         ordering = ("-timestamp",)
 
     def __str__(self):
         return f"{self.sender} - {self.timestamp}"
+
+
+class MessageArchive(models.Model):
+    """Архив сообщений чата за месяц в файле JSONL.gz."""
+
+    chat = models.ForeignKey(
+        Chat,
+        on_delete=models.CASCADE,
+        related_name="message_archives",
+        verbose_name="Чат",
+    )
+    month = models.DateField("Месяц")
+    path = models.CharField("Файл архива", max_length=255)
+    count = models.PositiveIntegerField("Количество сообщений")
+    min_message_id = models.BigIntegerField("Наименьший id сообщения")
+    max_message_id = models.BigIntegerField("Наибольший id сообщения")
+    created_at = models.DateTimeField("Время архивации", auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["chat", "month"],
+                name="unique_chat_archive_month",
+            )
+        ]
+        verbose_name = "Архив сообщений"
+        verbose_name_plural = "Архивы сообщений"
+
+    def __str__(self):
+        return f"{self.chat_id} - {self.month:%Y-%m}"
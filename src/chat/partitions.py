@@ -0,0 +1,110 @@
+"""Помесячные секции таблицы сообщений в PostgreSQL.
+
+Таблица chat_message секционирована по timestamp миграцией
+0009_message_partitions. Секции создаются заранее на несколько месяцев
+вперёд, сообщения вне существующих секций попадают в секцию
+chat_message_default. В других СУБД функции ничего не делают.
+"""
+
+from datetime import date, datetime, timezone
+
+from django.db import DatabaseError, connection, transaction
+
+from chat.models import Message
+from config.logging import logger
+
+
+def add_months(month, count):
+    """Первое число месяца, отстоящего на count месяцев."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def get_month(moment):
+    """Первое число месяца момента времени в UTC."""
+    return moment.astimezone(timezone.utc).date().replace(day=1)
+
+
+def get_month_bounds(month):
+    """Границы месяца в UTC: начало включительно, конец не включительно."""
+    return (
+        datetime(month.year, month.month, 1, tzinfo=timezone.utc),
+        datetime(*add_months(month, 1).timetuple()[:3], tzinfo=timezone.utc),
+    )
+
+
+def get_partition_name(month):
+    """Имя секции сообщений за месяц."""
+    return f"{Message._meta.db_table}_p{month:%Y%m}"
+
+
+def is_partitioned():
+    """Секционирована ли таблица сообщений."""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = %s::regclass",
+            [Message._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def get_partitions():
+    """Имена существующих секций сообщений."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT inhrelid::regclass::text FROM pg_inherits "
+            "WHERE inhparent = %s::regclass",
+            [Message._meta.db_table],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def ensure_partitions(first_month, last_month):
+    """Создание недостающих секций за месяцы от first до last.
+
+    Возвращает имена созданных секций. Секция не создаётся, если в
+    секции по умолчанию уже есть сообщения за этот месяц.
+    """
+    if not is_partitioned():
+        return []
+    existing = get_partitions()
+    created = []
+    month = first_month
+    while month <= last_month:
+        name = get_partition_name(month)
+        if name not in existing:
+            start, end = get_month_bounds(month)
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(
+                        f"CREATE TABLE {name} PARTITION OF "
+                        f"{Message._meta.db_table} FOR VALUES "
+                        f"FROM ('{start.isoformat()}') "
+                        f"TO ('{end.isoformat()}')"
+                    )
+                created.append(name)
+            except DatabaseError as error:
+                logger.warning(f"Не удалось создать секцию {name}: {error}")
+        month = add_months(month, 1)
+    return created
+
+
+def drop_partition(month):
+    """Отсоединение и удаление секции за месяц, если она есть.
+
+    Возвращает True, если секция была удалена.
+    """
+    if not is_partitioned():
+        return False
+    name = get_partition_name(month)
+    if name not in get_partitions():
+        return False
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE {Message._meta.db_table} DETACH PARTITION {name}"
+        )
+        cursor.execute(f"DROP TABLE {name}")
+    return True
@@ -0,0 +1,87 @@
+"""Присутствие пользователей в чатах.
+
+В ключе присутствия пользователя хранится словарь его подключений к
+чатам: имя канала consumer и время последнего пульса. Подключение и
+кадр-пульс записывают свой канал, отключение удаляет его,
+пользователь считается онлайн, пока в словаре есть канал со свежим
+пульсом. Поэтому закрытие одной вкладки не снимает присутствие, пока
+открыты другие, а каналы, оборванные без disconnect, отбрасываются
+через PRESENCE_TTL секунд без пульса и не держат пользователя онлайн.
+
+Словарь обновляется чтением и записью, поэтому при одновременном
+изменении из двух подключений одно изменение может потеряться.
+Потерянный канал восстанавливается следующим пульсом своего
+подключения. Кэш в продакшене хранится в Redis, поэтому присутствие
+общее для всех воркеров.
+"""
+
+import time
+
+from django.core.cache import cache
+
+from config.constants import PRESENCE_TTL
+
+
+def get_presence_key(user_id):
+    """Ключ кэша присутствия пользователя."""
+    return f"presence_{user_id}"
+
+
+def get_live_channels(channels, now):
+    """Каналы, пульс которых был не раньше PRESENCE_TTL секунд назад."""
+    return {
+        channel_name: seen
+        for channel_name, seen in (channels or {}).items()
+        if now - seen < PRESENCE_TTL
+    }
+
+
+async def update_channels(user_id, channel_name, online):
+    """Запись или удаление канала пользователя.
+
+    Возвращает пару: был ли пользователь онлайн до изменения и
+    остался ли онлайн после него.
+    """
+    key = get_presence_key(user_id)
+    now = time.time()
+    channels = get_live_channels(await cache.aget(key), now)
+    was_online = bool(channels)
+    if online:
+        channels[channel_name] = now
+    else:
+        channels.pop(channel_name, None)
+    if channels:
+        await cache.aset(key, channels, PRESENCE_TTL)
+    else:
+        await cache.adelete(key)
+    return was_online, bool(channels)
+
+
+async def mark_online(user_id, channel_name):
+    """Отметка подключения или пульса пользователя.
+
+    Возвращает True, если пользователь до этого был офлайн.
+    """
+    was_online, _ = await update_channels(user_id, channel_name, True)
+    return not was_online
+
+
+async def mark_offline(user_id, channel_name):
+    """Снятие отметки закрытого подключения пользователя.
+
+    Возвращает True, если у пользователя не осталось подключений.
+    """
+    _, is_online = await update_channels(user_id, channel_name, False)
+    return not is_online
+
+
+async def get_online_ids(user_ids):
+    """Id пользователей из списка, которые сейчас онлайн."""
+    keys = {get_presence_key(user_id): user_id for user_id in user_ids}
+    found = await cache.aget_many(keys.keys())
+    now = time.time()
+    return {
+        keys[key]
+        for key, channels in found.items()
+        if get_live_channels(channels, now)
+    }
@@ -0,0 +1,135 @@
+"""Полнотекстовый поиск по сообщениям.
+
+В PostgreSQL поиск идёт по сгенерированной колонке search_vector
+(tsvector) с GIN индексом, в SQLite - по внешней таблице FTS5
+chat_message_fts, которую поддерживают триггеры. Обе структуры
+создаются миграцией 0007_message_search и не описаны в модели.
+"""
+
+import base64
+import json
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from chat.models import Message
+from chat.utils import MESSAGE_FIELDS, serialize_messages
+from config.constants import (
+    MAX_SEARCH_WORDS,
+    MESSAGE_SEARCH_CONFIG,
+    MESSAGE_SEARCH_PAGE_SIZE,
+)
+
+SEARCH_WORD_RE = re.compile(r"\w+")
+
+
+def get_search_words(query):
+    """Слова поискового запроса без операторов и знаков препинания."""
+    return SEARCH_WORD_RE.findall(str(query).lower())[:MAX_SEARCH_WORDS]
+
+
+def _postgresql_search(table, words):
+    """Условие совпадения и ранг для PostgreSQL."""
+    tsquery = "plainto_tsquery(%s::regconfig, %s)"
+    params = [MESSAGE_SEARCH_CONFIG, " ".join(words)]
+    match = RawSQL(
+        f"{table}.search_vector @@ {tsquery}",
+        params,
+        output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        f"ts_rank({table}.search_vector, {tsquery})::float8",
+        params,
+        output_field=FloatField(),
+    )
+    return match, rank
+
+
+def _sqlite_search(table, words):
+    """Условие совпадения и ранг для SQLite FTS5, слова ищутся по префиксу."""
+    expression = " ".join(f'"{word}"*' for word in words)
+    match = RawSQL(
+        f"{table}.id IN (SELECT rowid FROM {table}_fts "
+        f"WHERE {table}_fts MATCH %s)",
+        [expression],
+        output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        f"(SELECT -bm25({table}_fts) FROM {table}_fts "
+        f"WHERE {table}_fts MATCH %s AND rowid = {table}.id)",
+        [expression],
+        output_field=FloatField(),
+    )
+    return match, rank
+
+
+def annotate_search(queryset, words):
+    """Отбор сообщений, содержащих слова, с рангом search_rank.
+
+    Для СУБД без полнотекстового индекса используется icontains по
+    каждому слову с нулевым рангом.
+    """
+    table = Message._meta.db_table
+    if connection.vendor == "postgresql":
+        match, rank = _postgresql_search(table, words)
+    elif connection.vendor == "sqlite":
+        match, rank = _sqlite_search(table, words)
+    else:
+        condition = Q()
+        for word in words:
+            condition &= Q(text__icontains=word)
+        return queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+    return queryset.annotate(search_match=match, search_rank=rank).filter(
+        search_match=True
+    )
+
+
+def encode_search_cursor(row):
+    """Курсор следующей страницы по рангу и id последнего результата."""
+    data = json.dumps([row["rank"], row["id"]]).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_search_cursor(cursor):
+    """Разбор курсора, при ошибке выбрасывается ValueError."""
+    try:
+        rank, message_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return float(rank), int(message_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as error:
+        raise ValueError(cursor) from error
+
+
+def search_messages(user, query, cursor=None, limit=MESSAGE_SEARCH_PAGE_SIZE):
+    """Поиск сообщений в чатах пользователя, от наиболее релевантных.
+
+    Возвращает кортеж из страницы результатов и курсора следующей
+    страницы (None, если страниц больше нет).
+    """
+    words = get_search_words(query)
+    if not words:
+        return [], None
+    queryset = annotate_search(
+        Message.objects.filter(
+            Q(chat__initiator=user) | Q(chat__receiver=user)
+        ),
+        words,
+    )
+    if cursor is not None:
+        rank, message_id = decode_search_cursor(cursor)
+        queryset = queryset.filter(
+            Q(search_rank__lt=rank) | Q(search_rank=rank, id__lt=message_id)
+        )
+    rows = serialize_messages(
+        queryset.order_by("-search_rank", "-id")[: limit + 1],
+        MESSAGE_FIELDS + ("chat", "search_rank"),
+    )
+    for row in rows:
+        row["rank"] = row.pop("search_rank")
+    next_cursor = (
+        encode_search_cursor(rows[limit - 1]) if len(rows) > limit else None
+    )
+    return rows[:limit], next_cursor
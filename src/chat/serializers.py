@@ -6,6 +6,7 @@ from api.serializers import MyUserGetSerializer
 from config.constants import MAX_MESSAGES_IN_CHAT
 
 from .models import Chat, Message
+from .utils import get_message_history
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -15,6 +16,7 @@ class MessageSerializer(serializers.ModelSerializer):
         model = Message
         fields = (
             "id",
+            "uuid",
             "sender",
             "text",
             "timestamp",
@@ -26,7 +28,8 @@ class ChatListSerializer(serializers.ModelSerializer):
 
     initiator = MyUserGetSerializer()
     receiver = MyUserGetSerializer()
-    last_message = serializers.SerializerMethodField()
+    last_message = MessageSerializer(read_only=True)
+    unread_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Chat
@@ -36,18 +39,13 @@ class ChatListSerializer(serializers.ModelSerializer):
             "receiver",
             "start_time",
             "last_message",
+            "last_activity",
+            "unread_count",
         )
 
-    def get_last_message(self, instance):
-        """Получение последнего сообщения в чате."""
-        last_message = (
-            Message.objects.filter(chat=instance)
-            .order_by("-timestamp")
-            .first()
-        )
-        if last_message:
-            return MessageSerializer(instance=last_message).data
-        return None
+    def get_unread_count(self, instance):
+        """Количество непрочитанных текущим пользователем сообщений."""
+        return instance.get_unread_count(self.context["request"].user)
 
 
 class ChatSerializer(serializers.ModelSerializer):
@@ -72,5 +70,5 @@ class ChatSerializer(serializers.ModelSerializer):
 
     def get_limited_chat_messages(self, obj):
         """Получение ограниченного количества сообщений в чате."""
-        qs = obj.chat_messages.all()[:MAX_MESSAGES_IN_CHAT]
-        return MessageSerializer(instance=qs, many=True).data
+        messages, _ = get_message_history(obj.id, limit=MAX_MESSAGES_IN_CHAT)
+        return messages
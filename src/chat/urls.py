@@ -6,6 +6,12 @@ app_name = "chat"
 
 urlpatterns = [
     path("start/", views.start_chat, name="start_chat"),
+    path("search/", views.message_search, name="message_search"),
     path("<int:chat_id>/", views.get_chat, name="get_chat"),
+    path(
+        "<int:chat_id>/messages/",
+        views.chat_messages,
+        name="chat_messages",
+    ),
     path("", views.chats, name="chats"),
 ]
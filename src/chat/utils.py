@@ -1,15 +1,36 @@
-from django.db.models import Q
-from rest_framework import exceptions
+import json
+from collections import Counter, defaultdict
 
-from chat.models import Chat
-from config.constants import messages
-from users.models import Friendship
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from rest_framework import exceptions, serializers
+
+from api.services import FriendshipService
+from chat.archive import get_archived_history
+from chat.models import Chat, Message
+from config.constants import (
+    MAX_HISTORY_PAGE_SIZE,
+    MAX_MESSAGES_IN_CHAT,
+    messages,
+)
+from config.logging import logger
+from users.models import Blacklist
+
+# Поля сообщения, совпадающие с полями MessageSerializer
+MESSAGE_FIELDS = ("id", "uuid", "sender", "text", "timestamp")
+
+_timestamp_field = serializers.DateTimeField()
 
 
 def get_chat_and_permissions(user, chat_id):
     """Проверка прав доступа пользователя к чату."""
     try:
-        chat = Chat.objects.get(id=chat_id)
+        chat = Chat.objects.select_related("initiator", "receiver").get(
+            id=chat_id
+        )
     except Chat.DoesNotExist:
         raise exceptions.NotFound(detail=messages.CHAT_DOES_NOT_EXIST)
 
@@ -29,12 +50,261 @@ def get_chat_and_permissions(user, chat_id):
 
 def check_friendshhip(user, other_user):
     """Проверка дружбы между пользователями."""
-    qs = Friendship.objects.filter(
-        Q(initiator=user, friend=other_user)
-        | Q(initiator=other_user, friend=user),
-    )
-    if not qs.exists():
+    if not FriendshipService.are_friends(user.id, other_user.id):
         raise exceptions.PermissionDenied(
             detail=messages.USER_IS_NOT_FRIEND % str(other_user)
         )
-    return qs.first()
+
+
+def check_not_blocked(user, other_user):
+    """Проверка, что пользователи не в черном списке друг у друга."""
+    if Blacklist.objects.filter(
+        Q(user=user, blocked_user=other_user)
+        | Q(user=other_user, blocked_user=user)
+    ).exists():
+        raise exceptions.PermissionDenied(
+            detail=messages.USER_IS_BLOCKED % str(other_user)
+        )
+
+
+def get_user_group_name(user_id):
+    """Имя группы каналов с подключениями пользователя."""
+    return f"user_{user_id}"
+
+
+def get_chat_group_name(chat_id):
+    """Имя группы каналов с подключениями к чату."""
+    return f"chat_{chat_id}"
+
+
+def _send_chat_revoked(user_ids):
+    """Рассылка отзыва доступа к чатам в группы пользователей."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    event = {"type": "chat.revoked", "user_ids": list(user_ids)}
+    for user_id in user_ids:
+        try:
+            async_to_sync(channel_layer.group_send)(
+                get_user_group_name(user_id), event
+            )
+        except Exception as error:
+            logger.warning(f"Слой каналов недоступен: {error}")
+            return
+
+
+def revoke_chat_access(*user_ids):
+    """Отзыв доступа к чату между пользователями после фиксации транзакции.
+
+    Открытые подключения к общему чату получают событие и закрываются,
+    поэтому consumer не перепроверяет права на каждое сообщение.
+    """
+    transaction.on_commit(lambda: _send_chat_revoked(user_ids))
+
+
+def serialize_messages(queryset, fields=MESSAGE_FIELDS):
+    """Быстрая сериализация сообщений через values().
+
+    Формат совпадает с MessageSerializer, но объекты моделей не создаются.
+    """
+    rows = list(queryset.values(*fields))
+    for row in rows:
+        row["uuid"] = str(row["uuid"])
+        row["timestamp"] = _timestamp_field.to_representation(row["timestamp"])
+    return rows
+
+
+def get_message_history(chat_id, before=None, limit=MAX_MESSAGES_IN_CHAT):
+    """Страница истории сообщений чата, от новых к старым.
+
+    Выборка по ключу (timestamp, id): при заданном before возвращаются
+    сообщения старше сообщения с этим id. Когда сообщения в таблице
+    заканчиваются, страница дополняется из архивов. Возвращает кортеж
+    из списка сообщений и признака наличия более старых сообщений.
+    """
+    queryset = Message.objects.filter(chat_id=chat_id)
+    if before is not None:
+        cursor = Subquery(
+            Message.objects.filter(pk=before, chat_id=chat_id).values(
+                "timestamp"
+            )[:1]
+        )
+        queryset = queryset.filter(
+            Q(timestamp__lt=cursor) | Q(timestamp=cursor, id__lt=before)
+        )
+    rows = serialize_messages(
+        queryset.order_by("-timestamp", "-id")[: limit + 1]
+    )
+    if len(rows) > limit:
+        return rows[:limit], True
+    # Архивы старше всех сообщений таблицы, курсор может быть в архиве
+    archive_before = None
+    if (
+        before is not None
+        and not rows
+        and not Message.objects.filter(pk=before, chat_id=chat_id).exists()
+    ):
+        archive_before = before
+    archived, has_more = get_archived_history(
+        chat_id, archive_before, limit - len(rows)
+    )
+    return rows + archived, has_more
+
+
+def clean_history_params(before=None, limit=None):
+    """Приведение параметров страницы истории.
+
+    Возвращает словарь с id сообщения-курсора before и размером страницы
+    limit, ограниченным MAX_HISTORY_PAGE_SIZE. При некорректных значениях
+    выбрасывает ValueError или TypeError.
+    """
+    before = None if before in (None, "") else int(before)
+    limit = int(limit or MAX_MESSAGES_IN_CHAT)
+    return {
+        "before": before,
+        "limit": min(max(limit, 1), MAX_HISTORY_PAGE_SIZE),
+    }
+
+
+def _parse_history_event(data):
+    """Параметры запроса истории, при ошибке - значения по умолчанию."""
+    try:
+        return clean_history_params(data.get("before"), data.get("limit"))
+    except (TypeError, ValueError):
+        return clean_history_params()
+
+
+def _parse_message_event(data):
+    """Текст нового сообщения."""
+    return {"text": str(data.get("text", ""))}
+
+
+def _parse_read_event(data):
+    """Id последнего прочитанного сообщения, None - прочитано всё."""
+    try:
+        return {"message_id": int(data["message_id"])}
+    except (KeyError, TypeError, ValueError):
+        return {"message_id": None}
+
+
+# Разбор кадров клиента по типу, кадры без параметров разбора не требуют
+CLIENT_EVENT_PARSERS = {
+    "message": _parse_message_event,
+    "history": _parse_history_event,
+    "typing": None,
+    "read": _parse_read_event,
+    "presence": None,
+}
+
+
+def get_client_event(text_data):
+    """Разбор кадра, полученного от клиента через вебсокет.
+
+    Кадр - JSON с полем type из CLIENT_EVENT_PARSERS, например
+    {"type": "history", "before": id, "limit": n} или
+    {"type": "message", "text": "..."}. Любой другой текст считается
+    новым сообщением {"type": "message", "text": text_data}.
+    """
+    try:
+        data = json.loads(text_data)
+    except (TypeError, ValueError):
+        data = None
+    if not isinstance(data, dict) or data.get("type") not in (
+        CLIENT_EVENT_PARSERS
+    ):
+        return {"type": "message", "text": text_data}
+    parser = CLIENT_EVENT_PARSERS[data["type"]]
+    params = parser(data) if parser else {}
+    return {"type": data["type"], **params}
+
+
+def update_chat_on_message(message):
+    """Обновление последнего сообщения и счётчиков непрочитанного.
+
+    Выполняется одним запросом UPDATE. Счётчик отправителя не меняется,
+    у второго участника увеличивается на единицу.
+    """
+    update_chat_on_messages([message])
+
+
+def _get_unread_increment(participant_field, sender_counts, total):
+    """Прирост непрочитанного участника: сообщения других отправителей."""
+    return Value(total) - Case(
+        *(
+            When(**{participant_field: sender_id}, then=Value(count))
+            for sender_id, count in sender_counts.items()
+            if sender_id is not None
+        ),
+        default=Value(0),
+    )
+
+
+def update_chat_on_messages(messages):
+    """Обновление чатов по пакету новых сообщений.
+
+    Для каждого чата выполняется один запрос UPDATE: последним становится
+    самое позднее сообщение пакета, счётчики непрочитанного увеличиваются
+    на число сообщений от собеседника.
+    """
+    chat_messages = defaultdict(list)
+    for message in messages:
+        chat_messages[message.chat_id].append(message)
+    for chat_id, batch in chat_messages.items():
+        last = max(batch, key=lambda message: (message.timestamp, message.id))
+        sender_counts = Counter(message.sender_id for message in batch)
+        Chat.objects.filter(pk=chat_id).update(
+            last_message=Case(
+                When(
+                    last_activity__gt=last.timestamp,
+                    then=F("last_message"),
+                ),
+                default=Value(last.id),
+            ),
+            last_activity=Greatest(F("last_activity"), Value(last.timestamp)),
+            initiator_unread=F("initiator_unread")
+            + _get_unread_increment("initiator_id", sender_counts, len(batch)),
+            receiver_unread=F("receiver_unread")
+            + _get_unread_increment("receiver_id", sender_counts, len(batch)),
+        )
+
+
+def get_unread_field(chat, user):
+    """Поле счётчика непрочитанного участника чата."""
+    if user.id == chat.initiator_id:
+        return "initiator_unread"
+    if user.id == chat.receiver_id:
+        return "receiver_unread"
+    return None
+
+
+def mark_chat_read(chat, user):
+    """Сброс счётчика непрочитанных сообщений участника чата."""
+    field = get_unread_field(chat, user)
+    if field and getattr(chat, field):
+        Chat.objects.filter(pk=chat.pk).update(**{field: 0})
+        setattr(chat, field, 0)
+
+
+def mark_chat_read_until(chat, user, message_id=None):
+    """Обновление счётчика непрочитанного по отметке о прочтении.
+
+    Непрочитанными остаются сообщения собеседника новее message_id,
+    без message_id прочитанным считается весь чат. Выполняется одним
+    запросом UPDATE.
+    """
+    field = get_unread_field(chat, user)
+    if field is None:
+        return
+    unread = 0
+    if message_id is not None:
+        unread = Coalesce(
+            Subquery(
+                Message.objects.filter(chat=OuterRef("pk"), id__gt=message_id)
+                .exclude(sender=user)
+                .values("chat")
+                .annotate(count=Count("id"))
+                .values("count")
+            ),
+            0,
+        )
+    Chat.objects.filter(pk=chat.pk).update(**{field: unread})
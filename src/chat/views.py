@@ -4,10 +4,19 @@ from django.shortcuts import reverse
 from rest_framework import exceptions
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
+from api.pagination import ChatPagination
 from chat.models import Chat
+from chat.search import get_search_words, search_messages
 from chat.serializers import ChatListSerializer, ChatSerializer
-from chat.utils import check_friendshhip, get_chat_and_permissions
+from chat.utils import (
+    check_friendshhip,
+    clean_history_params,
+    get_chat_and_permissions,
+    get_message_history,
+    mark_chat_read,
+)
 from config.constants import messages
 from users.models import User
 
@@ -46,14 +55,75 @@ def start_chat(request):
 def get_chat(request, chat_id):
     """Просмотр чата."""
     chat = get_chat_and_permissions(request.user, chat_id)
+    mark_chat_read(chat, request.user)
     return Response(ChatSerializer(instance=chat).data)
 
 
 @api_view(["GET"])
 def chats(request):
-    """Список чатов."""
-    chat_list = Chat.objects.filter(
-        Q(initiator=request.user) | Q(receiver=request.user)
+    """Список чатов, отсортированный по времени последней активности."""
+    chat_list = (
+        Chat.objects.filter(
+            Q(initiator=request.user) | Q(receiver=request.user)
+        )
+        .select_related("initiator__city", "receiver__city", "last_message")
+        .order_by("-last_activity", "-id")
+    )
+    paginator = ChatPagination()
+    page = paginator.paginate_queryset(chat_list, request)
+    serializer = ChatListSerializer(
+        instance=page, many=True, context={"request": request}
     )
-    serializer = ChatListSerializer(instance=chat_list, many=True)
-    return Response(serializer.data)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(["GET"])
+def chat_messages(request, chat_id):
+    """История сообщений чата с постраничной выборкой по курсору.
+
+    Параметры: before - id самого старого из полученных сообщений,
+    limit - размер страницы. Сообщения отсортированы от новых к старым.
+    """
+    chat = get_chat_and_permissions(request.user, chat_id)
+    try:
+        params = clean_history_params(
+            request.query_params.get("before"),
+            request.query_params.get("limit"),
+        )
+    except (TypeError, ValueError):
+        raise exceptions.ValidationError(
+            detail=messages.INVALID_HISTORY_PARAMS
+        )
+    results, has_more = get_message_history(chat.id, **params)
+    if params["before"] is None:
+        mark_chat_read(chat, request.user)
+    next_url = None
+    if has_more:
+        next_url = replace_query_param(
+            request.build_absolute_uri(), "before", results[-1]["id"]
+        )
+    return Response({"next": next_url, "results": results})
+
+
+@api_view(["GET"])
+def message_search(request):
+    """Полнотекстовый поиск по сообщениям в чатах пользователя.
+
+    Параметры: q - строка поиска, cursor - курсор следующей страницы
+    из поля next. Результаты отсортированы по убыванию релевантности.
+    """
+    query = request.query_params.get("q", "")
+    if not get_search_words(query):
+        raise exceptions.ValidationError(detail=messages.INVALID_SEARCH_PARAMS)
+    try:
+        results, next_cursor = search_messages(
+            request.user, query, request.query_params.get("cursor")
+        )
+    except ValueError:
+        raise exceptions.ValidationError(detail=messages.INVALID_SEARCH_PARAMS)
+    next_url = None
+    if next_cursor is not None:
+        next_url = replace_query_param(
+            request.build_absolute_uri(), "cursor", next_cursor
+        )
+    return Response({"next": next_url, "results": results})
@@ -14,12 +14,42 @@ MAX_LENGTH_DESCRIBE = 500
 MAX_FILE_SIZE = 8 * 1024 * 1024  # 8388608
 MAX_FILE_SIZE_MB = 8
 MAX_MESSAGES_IN_CHAT = 30
+MAX_HISTORY_PAGE_SIZE = 100
+MESSAGE_SEARCH_PAGE_SIZE = 20
+MESSAGE_SEARCH_CONFIG = "russian"
+MAX_SEARCH_WORDS = 10
+MESSAGE_HOT_MONTHS = 12
+MESSAGE_PARTITIONS_AHEAD = 3
 MAX_CHAT_MESSAGE_LENGTH = 1000
 MIN_USER_AGE = 14
 MAX_USER_AGE = 120
 MAX_LENGTH_TEXT = 1000
 
 MAX_DISTANCE = 500
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 8
+MAX_GEOHASH_CELLS = 16
+GEOIP_CACHE_MAX_SIZE = 10000
+GEOIP_CACHE_TTL = 24 * 60 * 60
+LOCATION_REFRESH_THROTTLE = 5 * 60
+LOCATION_STALE_AFTER = 24 * 60 * 60
+LOCATION_MIN_DISTANCE = 1
+GEOCODE_CACHE_TTL = 30 * 24 * 60 * 60
+GEOCODE_CACHE_NEGATIVE_TTL = 24 * 60 * 60
+GEOCODE_CACHE_MAX_SIZE = 1024
+FRIEND_IDS_CACHE_TTL = 60 * 60
+WS_TOKEN_CACHE_TTL = 60
+CHAT_REVOKED_CLOSE_CODE = 4403
+PRESENCE_TTL = 60
+TYPING_EVENT_INTERVAL = 3
+READ_RECEIPTS_FLUSH_INTERVAL = 1
+RECOMMENDATIONS_LIMIT = 50
+RECOMMENDATION_CANDIDATES_LIMIT = 500
+RECOMMENDATION_MAX_DISTANCE = 50
+RECOMMENDATION_MUTUAL_FRIEND_WEIGHT = 3
+RECOMMENDATION_SHARED_INTEREST_WEIGHT = 2
+RECOMMENDATION_SAME_CITY_WEIGHT = 1
+RECOMMENDATION_PROXIMITY_WEIGHT = 2
 
 
 class Messages(object):
@@ -61,9 +91,28 @@ class Messages(object):
     )
     CHAT_DOES_NOT_EXIST = "Такого чата не существует."
     USER_NOT_ALLOWED_TO_VIEW_CHAT = "Вы не можете просматривать этот чат."
+    INVALID_HISTORY_PARAMS = (
+        "Параметры before и limit должны быть целыми числами."
+    )
+    INVALID_SEARCH_PARAMS = (
+        "Укажите строку поиска q, курсор cursor должен быть из ответа."
+    )
     USER_IS_NOT_FRIEND = (
         "Чтобы начать чат, вы должны быть в друзьях с пользователем %s."
     )
+    USER_IS_BLOCKED = "Переписка с пользователем %s недоступна."
+    INVALID_EVENT_MEMBERS = (
+        "Участники должны быть списком объектов с целым полем id."
+    )
+    EVENT_MEMBERS_NOT_FOUND = "Пользователи с id %s не найдены."
+    INVALID_EVENT_DATE = "Укажите дату в формате ГГГГ-ММ-ДД."
+    INVALID_NEAR_PARAM = (
+        "Укажите near в виде lat,lon: широта от -90 до 90, "
+        "долгота от -180 до 180."
+    )
+    DISTANCE_ORDERING_WITHOUT_NEAR = (
+        "Сортировка по расстоянию возможна только с параметром near."
+    )
 
     # Ниже получаем стандартные сообщения валидации Django и других пакетов
     FIELD_CANNOT_BE_BLANK_MSG = DjangoField.default_error_messages["blank"]
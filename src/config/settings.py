@@ -268,6 +268,39 @@ GEOIP_PATH = os.path.join(BASE_DIR, "data/geoip")
 GEOIP_COUNTRY = "GeoLite2-Country.mmdb"
 GEOIP_CITY = "GeoLite2-City.mmdb"
 
+# Фоновые задачи
+
+BACKGROUND_TASKS_EAGER = os.getenv("BACKGROUND_TASKS_EAGER", "False") == "True"
+BACKGROUND_TASKS_WORKERS = int(os.getenv("BACKGROUND_TASKS_WORKERS", 2))
+BACKGROUND_TASKS_RETRIES = int(os.getenv("BACKGROUND_TASKS_RETRIES", 3))
+BACKGROUND_TASKS_RETRY_DELAY = int(
+    os.getenv("BACKGROUND_TASKS_RETRY_DELAY", 5)
+)
+
+# Архив и отложенная запись сообщений чата (write-behind)
+
+MESSAGE_ARCHIVE_ROOT = os.getenv(
+    "MESSAGE_ARCHIVE_ROOT", os.path.join(BASE_DIR, "data/message_archive")
+)
+
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "False") == "True"
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(
+    os.getenv("CHAT_WRITE_BEHIND_BATCH_SIZE", 100)
+)
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = float(
+    os.getenv("CHAT_WRITE_BEHIND_FLUSH_INTERVAL", 0.2)
+)
+CHAT_WRITE_BEHIND_MAX_PENDING = int(
+    os.getenv("CHAT_WRITE_BEHIND_MAX_PENDING", 10000)
+)
+
+# Геокодирование адресов мероприятий
+
+GEOCODER_BACKEND = os.getenv(
+    "GEOCODER_BACKEND", "api.geocoding.YandexMapsGeocoder"
+)
+GEOCODER_LOCAL_ADDRESSES = {}
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
@@ -279,6 +312,23 @@ REST_FRAMEWORK = {
     ],
 }
 
+if DEBUG:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": (
+                f"redis://{os.getenv('REDIS_HOST', 'redis')}:"
+                f"{os.getenv('REDIS_PORT', 6379)}/1"
+            ),
+        }
+    }
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
@@ -4,7 +4,13 @@ from admin_auto_filters.filters import AutocompleteFilter
 from django.contrib import admin
 from django.utils.safestring import mark_safe
 
-from .models import Event, EventLocation, EventMember, ParticipationRequest
+from .models import (
+    Event,
+    EventLocation,
+    EventMember,
+    GeocodeCache,
+    ParticipationRequest,
+)
 
 
 class CityEventFilter(AutocompleteFilter):
@@ -37,6 +43,7 @@ class EventAdmin(admin.ModelAdmin):
         "address",
         "event_price",
         "members_count",
+        "organizer",
         "min_age",
         "max_age",
         "min_count_members",
@@ -51,7 +58,12 @@ class EventAdmin(admin.ModelAdmin):
         "city__name",
         "address",
     )
-    readonly_fields = ["preview"]
+    readonly_fields = ["preview", "organizer"]
+    list_select_related = ("city", "organizer")
+
+    def get_queryset(self, request):
+        """Число участников считается в запросе списка."""
+        return super().get_queryset(request).with_members_count()
 
     @admin.display(description="Интересы")
     def interest_names(self, object):
@@ -76,7 +88,7 @@ class EventAdmin(admin.ModelAdmin):
             )
         return None
 
-    @admin.display(description="Число участников")
+    @admin.display(description="Число участников", ordering="members_total")
     def members_count(self, object):
         """Отображение числа участников."""
         return object.members_count()
@@ -105,6 +117,21 @@ class EventLocationAdmin(admin.ModelAdmin):
     search_fields = ("event__name",)
 
 
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    """Админка для модели GeocodeCache."""
+
+    list_display = (
+        "query",
+        "lat",
+        "lon",
+        "is_found",
+        "updated_at",
+    )
+    list_filter = ("is_found",)
+    search_fields = ("query",)
+
+
 @admin.register(ParticipationRequest)
 class ParticipationRequestAdmin(admin.ModelAdmin):
     """Админка для модели ParticipationRequest."""
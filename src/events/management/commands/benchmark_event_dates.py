@@ -0,0 +1,137 @@
+"""Проверка планов запросов фильтрации мероприятий по датам.
+
+Команда создаёт временные города и мероприятия, выполняет запросы
+фильтров по датам и выводит для каждого план запроса, использованные
+индексы мероприятий и среднее время выполнения. Для сравнения
+выполняется прежний запрос с преобразованием __date, который индексы
+использовать не может. Временные данные удаляются после замера.
+"""
+
+import random
+from datetime import timedelta
+from statistics import mean
+from time import perf_counter
+from uuid import uuid4
+
+from django.core.management import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from api.filters import get_day_bounds, get_weekend_bounds
+from events.models import Event
+from users.models import City
+
+# Мероприятия распределяются по году до и после текущего момента
+MINUTES_IN_YEAR = 365 * 24 * 60
+
+
+class Command(BaseCommand):
+    """Command."""
+
+    help = "Планы и время запросов фильтрации мероприятий по датам"
+
+    def add_arguments(self, parser):
+        """Добавление аргументов."""
+        parser.add_argument(
+            "--events",
+            type=int,
+            default=20000,
+            help="Количество временных мероприятий",
+        )
+        parser.add_argument(
+            "--cities",
+            type=int,
+            default=20,
+            help="Количество временных городов",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Количество повторов каждого запроса",
+        )
+
+    def create_events(self, options):
+        """Создание временных городов и мероприятий."""
+        suffix = uuid4().hex[:12]
+        cities = City.objects.bulk_create(
+            City(name=f"benchmark-{number}-{suffix}")
+            for number in range(options["cities"])
+        )
+        now = timezone.now()
+        events = []
+        for number in range(options["events"]):
+            start_date = now + timedelta(
+                minutes=random.randint(-MINUTES_IN_YEAR, MINUTES_IN_YEAR)
+            )
+            events.append(
+                Event(
+                    name=f"benchmark-{number}-{suffix}",
+                    description="benchmark",
+                    event_type="benchmark",
+                    city=random.choice(cities),
+                    start_date=start_date,
+                    end_date=(
+                        start_date + timedelta(hours=random.randint(1, 72))
+                        if random.random() < 0.8
+                        else None
+                    ),
+                )
+            )
+        Event.objects.bulk_create(events, batch_size=1000)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Event._meta.db_table}")
+        return cities
+
+    def get_queries(self, city):
+        """Проверяемые запросы."""
+        now = timezone.now()
+        today = timezone.localdate()
+        start, end = get_day_bounds(today)
+        return {
+            "date (__date)": Event.objects.filter(
+                Q(start_date__date__lte=today)
+                & (Q(end_date__date__gte=today) | Q(end_date__isnull=True))
+            ),
+            "date": Event.objects.in_period(start, end),
+            "date_from + date_to": Event.objects.in_period(
+                now, now + timedelta(days=7)
+            ),
+            "period=weekend": Event.objects.in_period(*get_weekend_bounds()),
+            "city + date_to": Event.objects.filter(city=city).in_period(
+                end=now + timedelta(days=30)
+            ),
+        }
+
+    def run(self, name, queryset, repeat):
+        """Замер одного запроса."""
+        queryset = queryset.order_by().values_list("id", flat=True)
+        plan = queryset.explain()
+        timings = []
+        count = 0
+        for _ in range(repeat):
+            start = perf_counter()
+            count = len(list(queryset))
+            timings.append(perf_counter() - start)
+        indexes = [
+            index.name for index in Event._meta.indexes if index.name in plan
+        ]
+        self.stdout.write(
+            self.style.SUCCESS(name)
+            + f": {count} строк, {mean(timings) * 1000:.2f} мс, "
+            f"индексы: {', '.join(indexes) or 'не используются'}"
+        )
+        self.stdout.write(plan)
+        self.stdout.write("")
+
+    def handle(self, *args, **options):
+        """Замер запросов."""
+        cities = self.create_events(options)
+        try:
+            for name, queryset in self.get_queries(cities[0]).items():
+                self.run(name, queryset, options["repeat"])
+        finally:
+            Event.objects.filter(city__in=cities).delete()
+            City.objects.filter(id__in=[city.id for city in cities]).delete()
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0004_eventlocation_lat_lon_idx"),
+        ("users", "0005_friendrecommendation"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["city", "start_date"], name="event_city_start_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["start_date", "end_date"], name="event_dates_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0005_event_date_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="organizer",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                help_text="Заполняется по участнику с флагом организатора",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="organized_events",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Организатор",
+            ),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="organizer_name",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                help_text="Имя и фамилия организатора в нижнем регистре",
+                max_length=301,
+                verbose_name="Имя организатора для поиска",
+            ),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:57
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+POSTGRESQL_FORWARD = [
+    """
+    CREATE INDEX event_organizer_name_trgm_idx
+    ON events_event USING GIN (organizer_name gin_trgm_ops)
+    """,
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS event_organizer_name_trgm_idx",
+]
+
+
+def fill_organizers(apps, schema_editor):
+    """Заполнение организатора по участникам с флагом организатора."""
+    Event = apps.get_model("events", "Event")
+    EventMember = apps.get_model("events", "EventMember")
+    User = apps.get_model("users", "User")
+    Event.objects.update(
+        organizer_id=Subquery(
+            EventMember.objects.filter(event=OuterRef("pk"), is_organizer=True)
+            .order_by("id")
+            .values("user_id")[:1]
+        )
+    )
+    # Имена переводятся в нижний регистр в Python: LOWER в SQLite
+    # не обрабатывает кириллицу
+    for user in User.objects.filter(organized_events__isnull=False).distinct():
+        Event.objects.filter(organizer=user).update(
+            organizer_name=f"{user.first_name} {user.last_name}".lower()
+        )
+
+
+def run_postgresql(statements):
+    """Выполнение SQL только в PostgreSQL."""
+
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == "postgresql":
+            for statement in statements:
+                schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0006_event_organizer"),
+        ("users", "0005_friendrecommendation"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_organizers, migrations.RunPython.noop),
+        # Расширение создаётся только в PostgreSQL
+        TrigramExtension(),
+        migrations.RunPython(
+            run_postgresql(POSTGRESQL_FORWARD),
+            run_postgresql(POSTGRESQL_BACKWARD),
+        ),
+    ]
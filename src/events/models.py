@@ -1,12 +1,49 @@
 from decimal import Decimal
 
 from django.db import models
+from django.db.models import Count, Prefetch, Q
 from django.utils import timezone
 
-from config.constants import MAX_LENGTH_CHAR, MAX_LENGTH_EVENT
+from config.constants import (
+    GEOCODE_CACHE_NEGATIVE_TTL,
+    GEOCODE_CACHE_TTL,
+    MAX_LENGTH_CHAR,
+    MAX_LENGTH_EVENT,
+)
 from users.models import City, Interest, User
 
 
+class EventQuerySet(models.QuerySet):
+    """Выборки мероприятий."""
+
+    def with_members_count(self):
+        """Число участников в аннотации members_total."""
+        return self.annotate(members_total=Count("members", distinct=True))
+
+    def with_members(self):
+        """Предзагрузка id участников одним запросом."""
+        return self.prefetch_related(
+            Prefetch("members", queryset=User.objects.only("id"))
+        )
+
+    def in_period(self, start=None, end=None):
+        """Мероприятия, идущие в интервале [start, end).
+
+        Мероприятие без даты окончания считается проходящим в момент
+        начала. Этот же смысл используют все фильтры по датам: date,
+        date_from, date_to и period. Условия сравнивают сами поля дат
+        без преобразований, поэтому используют индексы по start_date.
+        """
+        condition = Q()
+        if end is not None:
+            condition &= Q(start_date__lt=end)
+        if start is not None:
+            condition &= Q(end_date__gte=start) | Q(
+                end_date__isnull=True, start_date__gte=start
+            )
+        return self.filter(condition)
+
+
 class Event(models.Model):
     """Модель мероприятия."""
 
@@ -20,6 +57,24 @@ class Event(models.Model):
         verbose_name="Участники",
         help_text="Участники мероприятия",
     )
+    organizer = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        editable=False,
+        related_name="organized_events",
+        verbose_name="Организатор",
+        help_text="Заполняется по участнику с флагом организатора",
+    )
+    organizer_name = models.CharField(
+        max_length=MAX_LENGTH_CHAR * 2 + 1,
+        blank=True,
+        default="",
+        editable=False,
+        verbose_name="Имя организатора для поиска",
+        help_text="Имя и фамилия организатора в нижнем регистре",
+    )
     event_type = models.CharField(
         max_length=MAX_LENGTH_EVENT, verbose_name="Тип мероприятия"
     )
@@ -79,6 +134,8 @@ class Event(models.Model):
         verbose_name="Максимальное количество участников",
     )
 
+    objects = EventQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.CheckConstraint(
@@ -87,6 +144,14 @@ class Event(models.Model):
                 name="date_event_constraint",
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=["city", "start_date"], name="event_city_start_date_idx"
+            ),
+            models.Index(
+                fields=["start_date", "end_date"], name="event_dates_idx"
+            ),
+        ]
         verbose_name = "Мероприятие"
         verbose_name_plural = "Мероприятия"
         ordering = ("-start_date",)
@@ -95,7 +160,12 @@ class Event(models.Model):
         return self.name
 
     def members_count(self):
-        """Получение числа участников мероприятия."""
+        """Получение числа участников мероприятия.
+
+        Используется аннотация members_total, если она есть в выборке.
+        """
+        if hasattr(self, "members_total"):
+            return self.members_total
         return self.members.count()
 
 
@@ -151,11 +221,71 @@ class EventLocation(models.Model):
     class Meta:
         verbose_name = "Геолокация мероприятия"
         verbose_name_plural = "Геолокация мероприятий"
+        indexes = [
+            models.Index(
+                fields=["lat", "lon"], name="event_location_lat_lon_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.event} {self.lat}:{self.lon}"
 
 
+class GeocodeCache(models.Model):
+    """Модель кэша результатов геокодирования адресов."""
+
+    query = models.CharField(
+        max_length=MAX_LENGTH_CHAR * 2,
+        unique=True,
+        verbose_name="Нормализованный адрес",
+    )
+    lon = models.DecimalField(
+        verbose_name="Долгота",
+        max_digits=9,
+        decimal_places=6,
+        blank=True,
+        null=True,
+    )
+    lat = models.DecimalField(
+        verbose_name="Широта",
+        max_digits=9,
+        decimal_places=6,
+        blank=True,
+        null=True,
+    )
+    is_found = models.BooleanField(default=True, verbose_name="Адрес найден")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        verbose_name = "Результат геокодирования"
+        verbose_name_plural = "Кэш геокодирования"
+
+    def __str__(self):
+        return self.query
+
+    @property
+    def ttl(self):
+        """Время жизни записи в секундах."""
+        if self.is_found:
+            return GEOCODE_CACHE_TTL
+        return GEOCODE_CACHE_NEGATIVE_TTL
+
+    def get_remaining_ttl(self):
+        """Оставшееся время жизни записи в секундах."""
+        age = (timezone.now() - self.updated_at).total_seconds()
+        return self.ttl - age
+
+    def is_expired(self):
+        """Проверка устаревания записи."""
+        return self.get_remaining_ttl() <= 0
+
+    def get_coordinates(self):
+        """Координаты [широта, долгота] или None для ненайденного адреса."""
+        if self.is_found:
+            return [float(self.lat), float(self.lon)]
+        return None
+
+
 class ParticipationRequest(models.Model):
     """Модель заявки на участие в мероприятии."""
 
@@ -9,6 +9,7 @@ from django.utils.safestring import mark_safe
 from .models import (
     Blacklist,
     City,
+    FriendRecommendation,
     FriendRequest,
     Friendship,
     Interest,
@@ -221,6 +222,24 @@ class FriendshipAdmin(admin.ModelAdmin):
     ordering = ("-created_at",)
 
 
+@admin.register(FriendRecommendation)
+class FriendRecommendationAdmin(admin.ModelAdmin):
+    """Админка для модели FriendRecommendation."""
+
+    list_display = (
+        "user",
+        "candidate",
+        "score",
+        "mutual_friends",
+        "shared_interests",
+        "same_city",
+        "distance",
+        "updated_at",
+    )
+    search_fields = ("user__email", "candidate__email")
+    raw_id_fields = ("user", "candidate")
+
+
 @admin.register(FriendRequest)
 class FriendRequestAdmin(admin.ModelAdmin):
     """Админка для модели FriendRequest."""
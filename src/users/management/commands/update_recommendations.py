@@ -0,0 +1,35 @@
+"""Полный пересчёт рекомендаций друзей."""
+
+from django.core.management import BaseCommand
+
+from api.recommendations import compute_recommendations
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Command."""
+
+    help = "Пересчёт рекомендаций друзей для всех активных пользователей"
+
+    def add_arguments(self, parser):
+        """Добавление аргументов."""
+        parser.add_argument(
+            "--user",
+            type=int,
+            nargs="+",
+            dest="user_ids",
+            help="Id пользователей для пересчёта",
+        )
+
+    def handle(self, *args, **options):
+        """Пересчёт рекомендаций."""
+        users = User.objects.filter(is_active=True)
+        if options["user_ids"]:
+            users = users.filter(id__in=options["user_ids"])
+        count = 0
+        for user_id in users.values_list("id", flat=True).iterator():
+            compute_recommendations(user_id)
+            count += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Рекомендации пересчитаны: {count}")
+        )
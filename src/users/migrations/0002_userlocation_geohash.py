@@ -0,0 +1,40 @@
+# Generated by Django 5.0.2 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+from api.geohash import encode_geohash
+
+
+def fill_geohash(apps, schema_editor):
+    """Заполнение геохеша для уже сохранённых геолокаций."""
+    UserLocation = apps.get_model("users", "UserLocation")
+    locations = list(UserLocation.objects.all())
+    for location in locations:
+        location.geohash = encode_geohash(location.lat, location.lon)
+    UserLocation.objects.bulk_update(locations, ["geohash"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userlocation",
+            name="geohash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text="Ячейка пространственного индекса",
+                max_length=8,
+                verbose_name="Геохеш",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userlocation",
+            index=models.Index(fields=["lat", "lon"], name="user_location_lat_lon_idx"),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
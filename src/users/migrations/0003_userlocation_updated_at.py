@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_userlocation_geohash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userlocation",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Обновлено"),
+        ),
+    ]
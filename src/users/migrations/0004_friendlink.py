@@ -0,0 +1,95 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_friend_links(apps, schema_editor):
+    """Создание связей в обоих направлениях для существующих дружб."""
+    Friendship = apps.get_model("users", "Friendship")
+    FriendLink = apps.get_model("users", "FriendLink")
+    links = []
+    for friendship in Friendship.objects.all().iterator():
+        links.append(
+            FriendLink(
+                user_id=friendship.initiator_id,
+                friend_id=friendship.friend_id,
+                friendship=friendship,
+            )
+        )
+        links.append(
+            FriendLink(
+                user_id=friendship.friend_id,
+                friend_id=friendship.initiator_id,
+                friendship=friendship,
+            )
+        )
+    FriendLink.objects.bulk_create(links, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_userlocation_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FriendLink",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "friend",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Друг",
+                    ),
+                ),
+                (
+                    "friendship",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="links",
+                        to="users.friendship",
+                        verbose_name="Дружба",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="friend_links",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Связь друзей",
+                "verbose_name_plural": "Связи друзей",
+                "indexes": [
+                    models.Index(
+                        fields=["friend", "user"], name="friend_link_friend_user_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="friendlink",
+            constraint=models.UniqueConstraint(
+                fields=("user", "friend"), name="unique_friend_link"
+            ),
+        ),
+        migrations.RunPython(fill_friend_links, migrations.RunPython.noop),
+    ]
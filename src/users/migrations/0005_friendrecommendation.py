@@ -0,0 +1,88 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_friendlink"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FriendRecommendation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField(verbose_name="Оценка")),
+                (
+                    "mutual_friends",
+                    models.PositiveIntegerField(default=0, verbose_name="Общие друзья"),
+                ),
+                (
+                    "shared_interests",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Общие интересы"
+                    ),
+                ),
+                (
+                    "same_city",
+                    models.BooleanField(default=False, verbose_name="Тот же город"),
+                ),
+                (
+                    "distance",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Расстояние, км"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Обновлено"),
+                ),
+                (
+                    "candidate",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Кандидат",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="friend_recommendations",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Рекомендация друга",
+                "verbose_name_plural": "Рекомендации друзей",
+                "ordering": ["-score"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-score"], name="friend_rec_user_score_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="friendrecommendation",
+            constraint=models.UniqueConstraint(
+                fields=("user", "candidate"), name="unique_friend_recommendation"
+            ),
+        ),
+    ]
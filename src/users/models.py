@@ -16,6 +16,7 @@ from django_rest_passwordreset.signals import reset_password_token_created
 from PIL import Image
 
 from config.constants import (
+    GEOHASH_PRECISION,
     MAX_FILE_SIZE,
     MAX_FILE_SIZE_MB,
     MAX_LENGTH_CHAR,
@@ -283,7 +284,7 @@ class User(AbstractUser):
 
     def friends_count(self):
         """Получение количества друзей пользователя."""
-        return self.friends.count()
+        return self.friend_links.count()
 
     def is_blocked(self, user):
         """Проверка нахождения пользователя в черном списке."""
@@ -428,6 +429,103 @@ class Friendship(models.Model):
         verbose_name_plural = "Друзья"
 
 
+class FriendLink(models.Model):
+    """Симметричное представление дружбы.
+
+    Для каждой дружбы хранятся обе связи: пользователь -> друг и
+    друг -> пользователь, поэтому список друзей и проверка дружбы
+    выполняются одним запросом по индексу.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="friend_links",
+        verbose_name="Пользователь",
+    )
+    friend = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Друг",
+    )
+    friendship = models.ForeignKey(
+        Friendship,
+        on_delete=models.CASCADE,
+        related_name="links",
+        verbose_name="Дружба",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "friend"], name="unique_friend_link"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["friend", "user"], name="friend_link_friend_user_idx"
+            )
+        ]
+        verbose_name = "Связь друзей"
+        verbose_name_plural = "Связи друзей"
+
+    def __str__(self):
+        return f"{self.user} - {self.friend}"
+
+
+class FriendRecommendation(models.Model):
+    """Предрассчитанная рекомендация друга.
+
+    Таблица заполняется в фоне сервисом рекомендаций, эндпоинт
+    рекомендаций только читает отсортированные по оценке строки.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="friend_recommendations",
+        verbose_name="Пользователь",
+    )
+    candidate = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Кандидат",
+    )
+    score = models.FloatField(verbose_name="Оценка")
+    mutual_friends = models.PositiveIntegerField(
+        default=0, verbose_name="Общие друзья"
+    )
+    shared_interests = models.PositiveIntegerField(
+        default=0, verbose_name="Общие интересы"
+    )
+    same_city = models.BooleanField(default=False, verbose_name="Тот же город")
+    distance = models.FloatField(
+        blank=True, null=True, verbose_name="Расстояние, км"
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "candidate"],
+                name="unique_friend_recommendation",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-score"], name="friend_rec_user_score_idx"
+            )
+        ]
+        ordering = ["-score"]
+        verbose_name = "Рекомендация друга"
+        verbose_name_plural = "Рекомендации друзей"
+
+    def __str__(self):
+        return f"{self.user} - {self.candidate}: {self.score}"
+
+
 @receiver(reset_password_token_created)
 def password_reset_token_created(
     sender, instance, reset_password_token, *args, **kwargs
@@ -511,8 +609,21 @@ class UserLocation(models.Model):
     lat = models.DecimalField(
         verbose_name="Широта", max_digits=9, decimal_places=6
     )
+    geohash = models.CharField(
+        verbose_name="Геохеш",
+        max_length=GEOHASH_PRECISION,
+        blank=True,
+        db_index=True,
+        help_text="Ячейка пространственного индекса",
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
 
     class Meta:
+        indexes = [
+            models.Index(
+                fields=["lat", "lon"], name="user_location_lat_lon_idx"
+            )
+        ]
         verbose_name = "Геолокация пользователя"
         verbose_name_plural = "Геолокация пользователя"
 
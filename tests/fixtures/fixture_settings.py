@@ -1,14 +1,44 @@
 import pytest
+from channels.layers import channel_layers
+from django.core.cache import cache
 
+from api.geo import geoip_cache
+from api.geocoding import geocode_memory_cache
 
-@pytest.fixture
+
+@pytest.fixture(autouse=True)
 def memory_channel_layers(settings):
-    """Переопределяет конфигурацию слоёв каналов."""
+    """Переопределяет конфигурацию слоёв каналов.
+
+    Сигналы рассылают события в слой каналов, поэтому слой в памяти
+    используется во всех тестах и создаётся заново для каждого теста.
+    """
     settings.CHANNEL_LAYERS = {
         "default": {
             "BACKEND": "channels.layers.InMemoryChannelLayer",
         },
     }
+    channel_layers.backends.clear()
+    yield
+    channel_layers.backends.clear()
+
+
+@pytest.fixture(autouse=True)
+def local_geocoder(settings):
+    """Переопределяет геокодер и выполняет фоновые задачи синхронно."""
+    settings.BACKGROUND_TASKS_EAGER = True
+    settings.GEOCODER_BACKEND = "api.geocoding.LocalGeocoder"
+    settings.GEOCODER_LOCAL_ADDRESSES = {
+        "Тула, проспект Ленина, 16": [54.193122, 37.617348],
+    }
+    geocode_memory_cache.clear()
+    geoip_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Очищает кэш между тестами."""
+    cache.clear()
 
 
 @pytest.fixture(autouse=True)
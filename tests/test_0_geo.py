@@ -1,9 +1,19 @@
+from datetime import timedelta
 from http import HTTPStatus
 from time import sleep
 
 import pytest
+from django.utils import timezone
 
-from events.models import EventLocation
+from api.cache import MISSING
+from api.geocoding import (
+    geocode_event_location,
+    geocode_memory_cache,
+    geocoding_queue,
+    get_cached_coordinates,
+)
+from config.constants import GEOCODE_CACHE_NEGATIVE_TTL
+from events.models import EventLocation, GeocodeCache
 
 API_URL = "/api/v1"
 
@@ -38,3 +48,87 @@ class TestEventGeolocatioAPI:
         assert location[0].event == event_g2, (
             f"Проверьте, что " f"сохранена геолокация мероприятия:`{event_g2}`"
         )
+
+    def test_event_location_saved_in_background(
+        self, settings, user_client, event_g2
+    ):
+        """Проверка фонового сохранения геолокации мероприятия."""
+        settings.BACKGROUND_TASKS_EAGER = False
+        url = f"{API_URL}/events/{event_g2.id}/"
+        data = {"address": "проспект Ленина, 16"}
+        response = user_client.patch(url, data=data)
+        assert response.status_code == HTTPStatus.OK, (
+            "Проверьте, что авторизованному пользователю при попытке "
+            "сохранить геолокацию мероприятия возвращается статус 200."
+        )
+        geocoding_queue.join(timeout=10)
+        location = EventLocation.objects.get(event=event_g2)
+        assert (float(location.lat), float(location.lon)) == (
+            54.193122,
+            37.617348,
+        ), (
+            "Проверьте, что геолокация мероприятия сохраняется "
+            "фоновой задачей геокодирования."
+        )
+
+    def test_event_location_from_geocode_cache(
+        self, settings, user_client, event_g2
+    ):
+        """Проверка повторного геокодирования адреса через кэш."""
+        url = f"{API_URL}/events/{event_g2.id}/"
+        user_client.patch(url, data={"address": "проспект Ленина, 16"})
+        EventLocation.objects.filter(event=event_g2).delete()
+        settings.GEOCODER_LOCAL_ADDRESSES = {}
+        response = user_client.patch(
+            url, data={"address": "пр-т Ленина, д.16"}
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert GeocodeCache.objects.count() == 1, (
+            "Проверьте, что адреса, отличающиеся записью, нормализуются "
+            "к одному ключу кэша геокодирования."
+        )
+        assert EventLocation.objects.filter(
+            event=event_g2
+        ).exists(), "Проверьте, что повторный адрес геокодируется из кэша."
+
+    def test_memory_cache_uses_remaining_ttl(self, monkeypatch):
+        """Проверка времени жизни записи из БД в кэше в памяти."""
+        ttls = {}
+        monkeypatch.setattr(
+            geocode_memory_cache,
+            "set",
+            lambda query, coordinates, ttl: ttls.update({query: ttl}),
+        )
+        now = timezone.now()
+        for query, age in (
+            ("почти истекла", GEOCODE_CACHE_NEGATIVE_TTL - 60),
+            ("истекла", GEOCODE_CACHE_NEGATIVE_TTL + 60),
+        ):
+            GeocodeCache.objects.create(query=query, is_found=False)
+            GeocodeCache.objects.filter(query=query).update(
+                updated_at=now - timedelta(seconds=age)
+            )
+
+        assert get_cached_coordinates("почти истекла") is None
+        assert 0 < ttls["почти истекла"] <= 60, (
+            "Проверьте, что запись из БД попадает в кэш в памяти на "
+            "оставшееся ей время жизни."
+        )
+        assert get_cached_coordinates("истекла") is MISSING
+        assert "истекла" not in ttls
+
+    def test_stale_geocoding_result_skipped(self, event_g2):
+        """Проверка, что задача для устаревшего адреса не пишет геолокацию."""
+        geocode_event_location(event_g2.id, "Тула", "проспект Ленина, 16")
+        assert not EventLocation.objects.filter(event=event_g2).exists(), (
+            "Проверьте, что координаты не сохраняются, если адрес "
+            "мероприятия изменился после постановки задачи."
+        )
+
+        event_g2.address = "проспект Ленина, 16"
+        event_g2.save()
+        geocode_event_location(event_g2.id, "Тула", "проспект Ленина, 16")
+        assert EventLocation.objects.filter(event=event_g2).exists(), (
+            "Проверьте, что координаты сохраняются для текущего адреса "
+            "мероприятия."
+        )
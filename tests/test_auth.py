@@ -3,7 +3,11 @@ import string
 from http import HTTPStatus
 
 import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
 
+from chat.middleware import get_token_cache_key, get_user
 from config import constants as cnst
 from config.constants import messages as msg
 
@@ -200,3 +204,13 @@ class TestAuthAPI:
             f"{HTTPStatus.UNAUTHORIZED}, а вернулся "
             f"{users_me_response.status_code}."
         )
+
+    def test_auth_logout_clears_websocket_token_cache(self, user_client, user):
+        """При выходе из аккаунта токен удаляется из кэша вебсокетов."""
+        token_key = Token.objects.get(user=user).key
+        async_to_sync(get_user)(token_key)
+        assert cache.get(get_token_cache_key(token_key)) == user
+
+        user_client.post(self.logout_url)
+        assert cache.get(get_token_cache_key(token_key)) is None
+        assert async_to_sync(get_user)(token_key).is_anonymous
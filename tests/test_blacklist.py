@@ -1,8 +1,10 @@
 from http import HTTPStatus
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from users.models import Blacklist
+from users.models import Blacklist, Friendship, User
 
 
 @pytest.mark.django_db(transaction=True)
@@ -99,3 +101,57 @@ class TestBlacklistAPI:
             "Проверьте, что авторизованному пользователю при попытке "
             "удалить список возвращается статус 204."
         )
+
+    def test_users_list_queries_do_not_grow(
+        self, user_client, user, another_user, list_1, friends
+    ):
+        """Проверка постоянного числа запросов при получении списка."""
+        url = "/api/v1/users/"
+        # Без друзей на странице Django пропускает запрос вложенной
+        # предзагрузки друзей, поэтому первый запрос идёт с другом,
+        # а затем дружба удаляется
+        with CaptureQueriesContext(connection) as queries:
+            user_client.get(url)
+        friends.delete()
+        for number in range(4):
+            new_user = User.objects.create_user(
+                first_name="Новый",
+                last_name="Юзер",
+                password="alskdj04",
+                email=f"new{number}@test.ru",
+            )
+            Blacklist.objects.create(user=user, blocked_user=new_user)
+            Friendship.objects.create(initiator=new_user, friend=user)
+        with CaptureQueriesContext(connection) as more_queries:
+            response = user_client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        assert len(more_queries) == len(queries), (
+            f"Проверьте, что число запросов к БД при GET-запросе к `{url}` "
+            "не зависит от количества пользователей на странице."
+        )
+        info = {item["id"]: item for item in response.json()["results"]}
+        assert info[another_user.id]["is_blocked"] is True
+        assert info[user.id]["is_blocked"] is False
+        assert info[new_user.id]["network_nick"] == ""
+        assert info[another_user.id]["network_nick"] is None
+
+    def test_users_list_excludes_blockers(
+        self, user_client, user, another_user, third_user, list_2
+    ):
+        """Проверка исключения заблокировавших из списка пользователей."""
+        url = "/api/v1/users/?limit=1"
+        response = user_client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        info = response.json()
+        assert info["count"] == 2, (
+            f"Проверьте, что ответ на GET-запрос к `{url}` не содержит "
+            "пользователей, заблокировавших текущего пользователя."
+        )
+        assert len(info["results"]) == 1, (
+            f"Проверьте, что ответ на GET-запрос к `{url}` разбит на "
+            "страницы и для заблокированного пользователя."
+        )
+        response = user_client.get(f"/api/v1/users/?search={third_user.email}")
+        assert [item["id"] for item in response.json()["results"]] == [
+            third_user.id
+        ]
@@ -1,13 +1,45 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
 from http import HTTPStatus
+from io import StringIO
 
 import pytest
-from asgiref.sync import sync_to_async
-
-from chat.models import Chat, Message
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from chat import archive as archive_module
+from chat.buffer import MessageBuffer
+from chat.management.commands.benchmark_chat import drain, receive_message
+from chat.middleware import TOKEN_SUBPROTOCOL, get_user, invalidate_token_cache
+from chat.models import Chat, Message, MessageArchive
+from chat.presence import (
+    get_online_ids,
+    get_presence_key,
+    mark_offline,
+    mark_online,
+)
 from chat.serializers import MessageSerializer
+from chat.utils import get_chat_group_name, get_client_event
 from config import constants as cnst
+from config.asgi import application
 from config.constants import messages as msg
-from users.models import User
+from users.models import Blacklist, Friendship, User
+
+
+async def receive_event(communicator, skip=("presence",)):
+    """Получение следующего кадра, пропуская кадры указанных типов."""
+    while True:
+        event = await communicator.receive_json_from()
+        if event.get("type") not in skip:
+            return event
 
 
 @pytest.mark.django_db(transaction=True)
@@ -17,6 +49,8 @@ class TestChatHTTP:
     start_chat_url = "/api/v1/chats/start/"
     view_chat_url = "/api/v1/chats/%d/"
     list_chats_url = "/api/v1/chats/"
+    chat_messages_url = "/api/v1/chats/%d/messages/"
+    search_url = "/api/v1/chats/search/"
 
     def test_friends_can_start_chat(self, user_client, friends):
         """Друзья могут создать чат."""
@@ -138,16 +172,51 @@ class TestChatHTTP:
 
         assert chat
 
-        if response.json():
+        results = response.json()["results"]
+        if results:
             assert any(
                 (
-                    response.json()[0]["initiator"]["email"]
-                    == third_user.email,
-                    response.json()[0]["receiver"]["email"]
-                    == third_user.email,
+                    results[0]["initiator"]["email"] == third_user.email,
+                    results[0]["receiver"]["email"] == third_user.email,
                 )
             )
 
+    def test_chat_list_last_message_and_unread(
+        self, user, another_user, third_user, chat, user_client
+    ):
+        """Список чатов содержит последнее сообщение и непрочитанные."""
+        Friendship.objects.create(initiator=user, friend=third_user)
+        other_chat = Chat.objects.create(initiator=user, receiver=third_user)
+        Message.objects.create(sender=user, chat=other_chat, text="Первое")
+        Message.objects.create(sender=another_user, chat=chat, text="Привет")
+        last = Message.objects.create(
+            sender=another_user, chat=chat, text="Как дела?"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = user_client.get(self.list_chats_url)
+        assert response.status_code == HTTPStatus.OK
+        results = response.json()["results"]
+        assert [item["id"] for item in results] == [chat.id, other_chat.id], (
+            "Проверьте, что чаты отсортированы по времени последней "
+            "активности."
+        )
+        assert results[0]["last_message"]["id"] == last.id
+        assert results[0]["unread_count"] == 2
+        assert results[1]["unread_count"] == 0
+        chat_queries = [
+            query
+            for query in queries.captured_queries
+            if "chat_chat" in query["sql"]
+        ]
+        assert len(chat_queries) == 2, (
+            "Проверьте, что список чатов получается одним запросом "
+            "(и одним запросом количества для пагинации)."
+        )
+        user_client.get(self.view_chat_url % chat.id)
+        chat.refresh_from_db()
+        assert chat.initiator_unread == 0
+        assert chat.receiver_unread == 0
+
     def test_chat_view_contains_limited_amount_of_messages(
         self, user_client, chat, many_messages
     ):
@@ -158,6 +227,90 @@ class TestChatHTTP:
         assert qty_messages_at_connect < len(many_messages)
         assert qty_messages_at_connect == cnst.MAX_MESSAGES_IN_CHAT
 
+    def test_chat_messages_keyset_pagination(
+        self, user_client, chat, many_messages
+    ):
+        """История сообщений чата листается по курсору."""
+        url = self.chat_messages_url % chat.id
+        ids = []
+        next_url = f"{url}?limit=10"
+        while next_url:
+            response = user_client.get(next_url)
+            assert response.status_code == HTTPStatus.OK, (
+                f"Проверьте, что при GET запросе на `{url}` участнику чата "
+                f"возвращается статус {HTTPStatus.OK}."
+            )
+            data = response.json()
+            assert len(data["results"]) <= 10
+            ids += [message["id"] for message in data["results"]]
+            next_url = data["next"]
+        assert len(ids) == len(set(ids)) == len(many_messages), (
+            f"Проверьте, что постраничная выдача `{url}` возвращает каждое "
+            "сообщение чата ровно один раз."
+        )
+        assert ids == sorted(ids, reverse=True)
+
+    def test_chat_messages_invalid_params(self, user_client, chat):
+        """Некорректные параметры истории сообщений."""
+        url = self.chat_messages_url % chat.id
+        response = user_client.get(f"{url}?before=abc")
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_non_members_cannot_view_chat_messages(
+        self, chat, third_user_client
+    ):
+        """Пользователи не из чата не могут просматривать сообщения."""
+        response = third_user_client.get(self.chat_messages_url % chat.id)
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+    def test_search_messages(
+        self, user_client, chat, user, another_user, third_user
+    ):
+        """Поиск идёт только по чатам пользователя, по релевантности."""
+        other_chat = Chat.objects.create(
+            initiator=another_user, receiver=third_user
+        )
+        best = Message.objects.create(
+            sender=user, chat=chat, text="Кино было отличным, кино!"
+        )
+        match = Message.objects.create(
+            sender=another_user, chat=chat, text="Пойдём в кино завтра"
+        )
+        Message.objects.create(sender=user, chat=chat, text="Привет")
+        Message.objects.create(
+            sender=another_user, chat=other_chat, text="Кино"
+        )
+
+        response = user_client.get(self.search_url, {"q": "КИНО"})
+        assert response.status_code == HTTPStatus.OK
+        data = response.json()
+        assert [row["id"] for row in data["results"]] == [best.id, match.id]
+        assert data["results"][0]["chat"] == chat.id
+        assert data["next"] is None
+
+    def test_search_messages_cursor_pagination(self, user_client, chat, user):
+        """Результаты поиска постранично выдаются по курсору."""
+        messages = Message.objects.bulk_create(
+            Message(sender=user, chat=chat, text=f"встреча {number}")
+            for number in range(cnst.MESSAGE_SEARCH_PAGE_SIZE + 5)
+        )
+        response = user_client.get(self.search_url, {"q": "встреча"})
+        data = response.json()
+        assert len(data["results"]) == cnst.MESSAGE_SEARCH_PAGE_SIZE
+        next_page = user_client.get(data["next"]).json()
+        assert next_page["next"] is None
+        ids = [row["id"] for row in data["results"] + next_page["results"]]
+        assert sorted(ids) == sorted(message.id for message in messages)
+
+    @pytest.mark.parametrize(
+        "params", [{}, {"q": "!!!"}, {"q": "кино", "cursor": "broken"}]
+    )
+    def test_search_messages_invalid_params(self, user_client, params):
+        """Пустой запрос или неверный курсор - ошибка 400."""
+        response = user_client.get(self.search_url, params)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert response.json() == [msg.INVALID_SEARCH_PARAMS]
+
     def test_chat_remains_after_user_deleted(self, user, another_user, chat):
         """Чат остается после удаления пользователя."""
         User.objects.filter(id=user.id).delete()
@@ -237,11 +390,20 @@ class TestChatWebSocket:
         self, ws_connection, another_ws_connection, memory_channel_layers
     ):
         """Обмен сообщениями между пользователями в чате."""
+        # При подключении оба пользователя получают кадр с историей
+        for communicator in (ws_connection, another_ws_connection):
+            history = await receive_event(communicator)
+            assert history == {
+                "type": "history",
+                "messages": [],
+                "has_more": False,
+            }
+
         # Пользователь 1 отправляет сообщение простым текстом
         await ws_connection.send_to("Test message from User 1")
 
         # Пользователь 2 получает сообщение в виде JSON (объект сообщения)
-        response = await another_ws_connection.receive_json_from()
+        response = await receive_event(another_ws_connection)
         # Поля в JSON соответствуют полям в сериализаторе
         for field in list(MessageSerializer().get_fields().keys()):
             assert field in response
@@ -251,3 +413,553 @@ class TestChatWebSocket:
         # Сообщение должно сохраниться в базе
         messages_in_db = await sync_to_async(list)(Message.objects.all())
         assert len(messages_in_db) == 1
+
+    async def test_history_sent_in_one_frame(
+        self,
+        create_ws_communicator,
+        chat,
+        many_messages,
+        create_token,
+        user,
+        memory_channel_layers,
+    ):
+        """История чата при подключении отправляется одним кадром."""
+        token = await sync_to_async(create_token)(user)
+        ws_communicator = create_ws_communicator(chat, token)
+        await ws_communicator.connect()
+        history = await ws_communicator.receive_json_from()
+        assert history["type"] == "history"
+        assert history["has_more"] is True
+        assert len(history["messages"]) == cnst.MAX_MESSAGES_IN_CHAT
+        for field in list(MessageSerializer().get_fields().keys()):
+            assert field in history["messages"][0]
+        ids = [message["id"] for message in history["messages"]]
+        assert ids == sorted(
+            ids, reverse=True
+        ), "Проверьте, что история отсортирована от новых сообщений к старым."
+
+        # Запрос более старых сообщений через вебсокет
+        await ws_communicator.send_json_to(
+            {"type": "history", "before": ids[-1], "limit": 10}
+        )
+        older = await ws_communicator.receive_json_from()
+        assert [message["id"] for message in older["messages"]] == [
+            min(ids) - 1
+        ]
+        assert older["has_more"] is False
+        assert await ws_communicator.receive_nothing()
+        assert await sync_to_async(Message.objects.count)() == len(
+            many_messages
+        ), "Проверьте, что запрос истории не сохраняется как сообщение."
+        await ws_communicator.disconnect()
+
+    async def test_connect_with_token_in_query_string(
+        self, chat, create_token, user, memory_channel_layers
+    ):
+        """Токен можно передать в строке запроса."""
+        token = await sync_to_async(create_token)(user)
+        communicator = WebsocketCommunicator(
+            application, f"/ws/chat/{chat.id}/?token={token}"
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+        await communicator.disconnect()
+
+    async def test_connect_with_token_in_subprotocol(
+        self, chat, create_token, user, memory_channel_layers
+    ):
+        """Токен можно передать подпротоколом, он подтверждается."""
+        token = await sync_to_async(create_token)(user)
+        communicator = WebsocketCommunicator(
+            application,
+            f"/ws/chat/{chat.id}/",
+            subprotocols=[TOKEN_SUBPROTOCOL, token],
+        )
+        connected, subprotocol = await communicator.connect()
+        assert connected
+        assert subprotocol == TOKEN_SUBPROTOCOL
+        await communicator.disconnect()
+
+    async def test_token_user_cached(self, create_token, user):
+        """Пользователь по токену кэшируется до логаута."""
+        token = await sync_to_async(create_token)(user)
+        assert (await get_user(token)) == user
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                async_to_sync(get_user)(token)
+            return len(context)
+
+        assert await sync_to_async(count_queries)() == 0
+        await sync_to_async(invalidate_token_cache)(token)
+        assert await sync_to_async(count_queries)() == 1
+
+    async def test_socket_closed_after_unfriend(
+        self, ws_connection, friends, memory_channel_layers
+    ):
+        """После удаления из друзей открытое подключение закрывается."""
+        await ws_connection.receive_json_from()
+        await sync_to_async(friends.delete)()
+        output = await ws_connection.receive_output()
+        assert output == {
+            "type": "websocket.close",
+            "code": cnst.CHAT_REVOKED_CLOSE_CODE,
+        }
+
+    async def test_socket_closed_after_block(
+        self, ws_connection, user, another_user, memory_channel_layers
+    ):
+        """После блокировки собеседника открытое подключение закрывается."""
+        await ws_connection.receive_json_from()
+        await sync_to_async(Blacklist.objects.create)(
+            user=another_user, blocked_user=user
+        )
+        output = await ws_connection.receive_output()
+        assert output["code"] == cnst.CHAT_REVOKED_CLOSE_CODE
+
+    async def test_cannot_connect_to_chat_if_blocked(
+        self,
+        create_ws_communicator,
+        chat,
+        create_token,
+        user,
+        another_user,
+        memory_channel_layers,
+    ):
+        """Заблокированный собеседником пользователь не подключается."""
+        await sync_to_async(Blacklist.objects.create)(
+            user=another_user, blocked_user=user
+        )
+        token = await sync_to_async(create_token)(user)
+        ws_communicator = create_ws_communicator(chat, token)
+        connected, _ = await ws_communicator.connect()
+        assert not connected
+        await ws_communicator.disconnect()
+
+    async def test_write_behind_message_acknowledged(
+        self,
+        ws_connection,
+        another_ws_connection,
+        chat,
+        settings,
+        memory_channel_layers,
+    ):
+        """В режиме write-behind сообщение рассылается до записи в базу."""
+        settings.CHAT_WRITE_BEHIND = True
+        for communicator in (ws_connection, another_ws_connection):
+            await receive_event(communicator)
+
+        await ws_connection.send_to("Test write-behind message")
+        response = await receive_event(another_ws_connection)
+        assert response["id"] is None
+        assert response["text"] == "Test write-behind message"
+
+        # Оба участника получают сообщение, затем подтверждение записи
+        own = await receive_event(ws_connection)
+        ack = await receive_event(ws_connection)
+        assert ack["type"] == "ack"
+        assert ack["uuid"] == own["uuid"] == response["uuid"]
+        assert await receive_event(another_ws_connection) == ack
+
+        message = await sync_to_async(Message.objects.get)(uuid=ack["uuid"])
+        assert message.id == ack["id"]
+        await sync_to_async(chat.refresh_from_db)()
+        assert chat.last_message_id == message.id
+        assert chat.receiver_unread == 1
+
+    async def test_typing_events_coalesced(
+        self, ws_connection, another_ws_connection, user, memory_channel_layers
+    ):
+        """Частые кадры набора текста пересылаются один раз."""
+        for communicator in (ws_connection, another_ws_connection):
+            await receive_event(communicator)
+        for _ in range(3):
+            await ws_connection.send_json_to({"type": "typing"})
+        await ws_connection.send_json_to({"type": "message", "text": "Hi"})
+
+        assert await receive_event(another_ws_connection) == {
+            "type": "typing",
+            "user": user.id,
+        }
+        response = await receive_event(another_ws_connection)
+        assert response["text"] == "Hi"
+
+    async def test_read_receipts_batched(
+        self,
+        ws_connection,
+        another_ws_connection,
+        chat,
+        user,
+        another_user,
+        monkeypatch,
+        memory_channel_layers,
+    ):
+        """Отметки о прочтении записываются в счётчик одним запросом."""
+        monkeypatch.setattr(
+            "chat.consumers.READ_RECEIPTS_FLUSH_INTERVAL", 0.05
+        )
+        for communicator in (ws_connection, another_ws_connection):
+            await receive_event(communicator)
+        messages = [
+            await sync_to_async(Message.objects.create)(
+                sender=another_user, chat=chat, text=str(number)
+            )
+            for number in range(3)
+        ]
+        await ws_connection.send_json_to(
+            {"type": "read", "message_id": messages[1].id}
+        )
+        await ws_connection.send_json_to(
+            {"type": "read", "message_id": messages[0].id}
+        )
+
+        assert await receive_event(another_ws_connection) == {
+            "type": "read",
+            "user": user.id,
+            "message_id": messages[1].id,
+        }
+        await sync_to_async(chat.refresh_from_db)()
+        assert chat.get_unread_count(user) == 1
+
+    async def test_presence_heartbeat(
+        self,
+        ws_connection,
+        another_ws_connection,
+        another_user,
+        memory_channel_layers,
+    ):
+        """Пульс присутствия возвращает статус собеседника."""
+        await receive_event(ws_connection)
+        await ws_connection.send_json_to({"type": "presence"})
+        presence = await receive_event(ws_connection, skip=())
+        assert presence == {
+            "type": "presence",
+            "user": another_user.id,
+            "online": True,
+        }
+
+        await another_ws_connection.disconnect()
+        while presence["online"]:
+            presence = await receive_event(ws_connection, skip=())
+        assert presence["user"] == another_user.id
+
+    async def test_presence_multiple_connections(
+        self,
+        ws_connection,
+        another_ws_connection,
+        create_ws_communicator,
+        create_token,
+        chat,
+        another_user,
+        memory_channel_layers,
+    ):
+        """Пользователь офлайн только после закрытия всех подключений."""
+        token = await sync_to_async(create_token)(another_user)
+        second_connection = create_ws_communicator(chat, token)
+        await second_connection.connect()
+        await drain(ws_connection)
+
+        await second_connection.disconnect()
+        assert await ws_connection.receive_nothing()
+
+        await another_ws_connection.disconnect()
+        assert await receive_event(ws_connection, skip=()) == {
+            "type": "presence",
+            "user": another_user.id,
+            "online": False,
+        }
+
+
+@pytest.mark.parametrize(
+    "text_data, event",
+    [
+        ("Привет", {"type": "message", "text": "Привет"}),
+        (
+            '{"type": "message", "text": "Hi"}',
+            {"type": "message", "text": "Hi"},
+        ),
+        ('{"text": "Hi"}', {"type": "message", "text": '{"text": "Hi"}'}),
+        ('{"type": "typing"}', {"type": "typing"}),
+        (
+            '{"type": "read", "message_id": "7"}',
+            {"type": "read", "message_id": 7},
+        ),
+        ('{"type": "read"}', {"type": "read", "message_id": None}),
+        (
+            '{"type": "history", "before": "x"}',
+            {
+                "type": "history",
+                "before": None,
+                "limit": cnst.MAX_MESSAGES_IN_CHAT,
+            },
+        ),
+    ],
+)
+def test_get_client_event(text_data, event):
+    """Разбор кадров клиента по типу."""
+    assert get_client_event(text_data) == event
+
+
+@pytest.mark.django_db(transaction=True)
+class TestMessageBuffer:
+    """Тесты буфера отложенной записи сообщений."""
+
+    def test_buffer_flushes_batches_on_shutdown(
+        self, chat, user, another_user, settings
+    ):
+        """Все сообщения буфера записываются пачками до остановки."""
+        settings.BACKGROUND_TASKS_EAGER = False
+        settings.CHAT_WRITE_BEHIND_BATCH_SIZE = 3
+        buffer = MessageBuffer("test-write-behind")
+        messages = [
+            Message(sender=user if number % 2 else another_user, chat=chat)
+            for number in range(10)
+        ]
+        for message in messages:
+            assert buffer.add(message)
+        buffer.shutdown()
+
+        assert Message.objects.filter(chat=chat).count() == len(messages)
+        chat.refresh_from_db()
+        assert chat.last_message.uuid == messages[-1].uuid
+        assert chat.initiator_unread == 5
+        assert chat.receiver_unread == 5
+        # Остановленный буфер не принимает сообщения
+        assert not buffer.add(Message(sender=user, chat=chat))
+
+    def test_failed_batch_reported_to_chat(
+        self, chat, user, settings, monkeypatch
+    ):
+        """Участники чата узнают о сообщениях, которые не сохранились."""
+        settings.BACKGROUND_TASKS_RETRIES = 0
+        buffer = MessageBuffer("test-write-behind")
+
+        def failing_flush(messages):
+            raise DatabaseError("database is unavailable")
+
+        monkeypatch.setattr(buffer, "flush", failing_flush)
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(
+            get_chat_group_name(chat.id), channel_name
+        )
+        message = Message(sender=user, chat=chat, text="Потеряно")
+        buffer._flush_with_retries([message])
+
+        event = async_to_sync(channel_layer.receive)(channel_name)
+        assert event["type"] == "chat.failed"
+        assert event["uuid"] == str(message.uuid)
+        assert not Message.objects.filter(uuid=message.uuid).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestMessageArchive:
+    """Тесты архивации сообщений."""
+
+    chat_messages_url = "/api/v1/chats/%d/messages/"
+
+    def test_archive_messages_and_read_history(
+        self, user_client, chat, user, another_user, settings, tmp_path
+    ):
+        """Старые сообщения уходят в архив и остаются в истории чата."""
+        settings.MESSAGE_ARCHIVE_ROOT = str(tmp_path)
+        now = timezone.now()
+        messages = [
+            Message.objects.create(
+                sender=user if number % 2 else another_user,
+                chat=chat,
+                text=f"Сообщение {number}",
+                timestamp=now - timedelta(days=days),
+            )
+            for number, days in enumerate((400, 399, 370, 100, 1))
+        ]
+
+        call_command("archive_messages", months=6, stdout=StringIO())
+
+        assert list(Message.objects.values_list("id", flat=True)) == [
+            messages[4].id,
+            messages[3].id,
+        ]
+        archives = MessageArchive.objects.filter(chat=chat)
+        assert sum(archive.count for archive in archives) == 3
+        for archive in archives:
+            assert (tmp_path / archive.path).exists()
+
+        ids = []
+        url = self.chat_messages_url % chat.id + "?limit=2"
+        while url:
+            data = user_client.get(url).json()
+            ids += [row["id"] for row in data["results"]]
+            url = data["next"]
+        assert ids == [message.id for message in reversed(messages)]
+        archived = user_client.get(
+            self.chat_messages_url % chat.id,
+            {"before": messages[2].id},
+        ).json()["results"]
+        assert archived[0]["text"] == "Сообщение 1"
+        assert archived[0]["uuid"] == str(messages[1].uuid)
+
+    def test_archive_clears_archived_last_message(
+        self, chat, user, settings, tmp_path
+    ):
+        """Последнее сообщение чата, ушедшее в архив, сбрасывается."""
+        settings.MESSAGE_ARCHIVE_ROOT = str(tmp_path)
+        Message.objects.create(
+            sender=user,
+            chat=chat,
+            text="Давно",
+            timestamp=timezone.now() - timedelta(days=400),
+        )
+        call_command("archive_messages", months=6, stdout=StringIO())
+        chat.refresh_from_db()
+        assert chat.last_message is None
+        assert not Message.objects.exists()
+
+    def test_missing_archive_file(
+        self, user_client, chat, user, settings, tmp_path
+    ):
+        """Без файла архива история заканчивается на сообщениях таблицы."""
+        settings.MESSAGE_ARCHIVE_ROOT = str(tmp_path)
+        now = timezone.now()
+        Message.objects.create(
+            sender=user,
+            chat=chat,
+            text="Давно",
+            timestamp=now - timedelta(days=400),
+        )
+        recent = Message.objects.create(
+            sender=user, chat=chat, text="Недавно", timestamp=now
+        )
+        call_command("archive_messages", months=6, stdout=StringIO())
+        settings.MESSAGE_ARCHIVE_ROOT = str(tmp_path / "missing")
+
+        response = user_client.get(self.chat_messages_url % chat.id)
+        assert response.status_code == HTTPStatus.OK
+        assert [row["id"] for row in response.json()["results"]] == [recent.id]
+
+    def test_archived_history_reads_only_needed_files(
+        self, user_client, chat, user, settings, tmp_path, monkeypatch
+    ):
+        """Страница истории открывает только нужные файлы архива."""
+        settings.MESSAGE_ARCHIVE_ROOT = str(tmp_path)
+        now = timezone.now()
+        messages = [
+            Message.objects.create(
+                sender=user,
+                chat=chat,
+                text=f"Сообщение {days}",
+                timestamp=now - timedelta(days=days),
+            )
+            for days in (500, 499, 430, 429, 370, 369)
+        ]
+        call_command("archive_messages", months=6, stdout=StringIO())
+        archives = MessageArchive.objects.filter(chat=chat).order_by("month")
+        assert [
+            (archive.min_message_id, archive.max_message_id)
+            for archive in archives
+        ] == [
+            (messages[0].id, messages[1].id),
+            (messages[2].id, messages[3].id),
+            (messages[4].id, messages[5].id),
+        ]
+
+        read_paths = []
+        read_archive = archive_module.read_archive
+
+        def tracked_read_archive(archive):
+            read_paths.append(archive.path)
+            return read_archive(archive)
+
+        monkeypatch.setattr(
+            archive_module, "read_archive", tracked_read_archive
+        )
+        response = user_client.get(
+            self.chat_messages_url % chat.id,
+            {"before": messages[3].id, "limit": 1},
+        )
+        assert [row["id"] for row in response.json()["results"]] == [
+            messages[2].id
+        ]
+        assert read_paths == [archives[1].path]
+
+
+@pytest.mark.asyncio
+class TestPresence:
+    """Тесты присутствия пользователей."""
+
+    async def test_offline_after_last_connection(self):
+        """Пользователь офлайн только после закрытия всех подключений."""
+        assert await mark_online(1, "first") is True
+        assert await mark_online(1, "second") is False
+        assert await mark_online(1, "second") is False
+        assert await mark_offline(1, "first") is False
+        assert await get_online_ids([1, 2]) == {1}
+        assert await mark_offline(1, "second") is True
+        assert await get_online_ids([1]) == set()
+        assert await mark_online(1, "third") is True
+
+    async def test_stale_channels_dropped(self):
+        """Каналы без пульса дольше PRESENCE_TTL не держат присутствие."""
+        await cache.aset(
+            get_presence_key(1), {"lost": time.time() - cnst.PRESENCE_TTL}
+        )
+        assert await get_online_ids([1]) == set()
+        assert await mark_online(1, "first") is True
+        assert await mark_offline(1, "first") is True
+        assert await mark_offline(1, "first") is True
+        assert await mark_online(1, "second") is True
+        assert await get_online_ids([1]) == {1}
+
+
+class FakeCommunicator:
+    """Коммуникатор с заранее заданными кадрами."""
+
+    def __init__(self, frames):
+        self.frames = [json.dumps(frame) for frame in frames]
+
+    async def receive_from(self, timeout=1):
+        """Следующий кадр."""
+        if not self.frames:
+            raise asyncio.TimeoutError
+        return self.frames.pop(0)
+
+    async def receive_nothing(self, timeout=0.1):
+        """Нет ли кадров."""
+        return not self.frames
+
+
+@pytest.mark.asyncio
+class TestBenchmarkChat:
+    """Тесты замера задержки сообщений чата."""
+
+    async def test_receive_message_skips_service_frames(self):
+        """Замеряется только кадр отправленного сообщения."""
+        communicator = FakeCommunicator(
+            [
+                {"type": "presence", "user": 1, "online": True},
+                {"id": 1, "text": "Другое"},
+                {"type": "typing", "user": 1},
+                {"id": 2, "text": "Сообщение 0"},
+            ]
+        )
+        await receive_message(communicator, "Сообщение 0", timeout=1)
+        assert communicator.frames == []
+
+    async def test_receive_message_timeout(self):
+        """Без кадра сообщения замер считается недоставленным."""
+        communicator = FakeCommunicator(
+            [{"type": "history", "messages": [], "has_more": False}]
+        )
+        with pytest.raises(asyncio.TimeoutError):
+            await receive_message(communicator, "Сообщение 0", timeout=1)
+
+    async def test_drain(self):
+        """Кадры подключения пропускаются."""
+        communicator = FakeCommunicator(
+            [
+                {"type": "history", "messages": [], "has_more": False},
+                {"type": "presence", "user": 2, "online": True},
+            ]
+        )
+        await drain(communicator)
+        assert communicator.frames == []
@@ -1,8 +1,21 @@
+from datetime import timedelta
 from http import HTTPStatus
+from io import StringIO
 
 import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-from events.models import Event
+from api.filters import get_day_bounds, get_weekend_bounds
+from events.models import (
+    Event,
+    EventLocation,
+    EventMember,
+    ParticipationRequest,
+)
 
 # from django.db.utils import IntegrityError
 
@@ -67,3 +80,434 @@ class TestEventsAPI:
             response.status_code == HTTPStatus.UNAUTHORIZED
         ), """Проверьте, что неавторизованному пользователю при попытке
             создать мероприятие возвращается статус 401."""
+
+
+@pytest.mark.django_db(transaction=True)
+class TestEventMembers:
+    """Тесты состава участников мероприятия."""
+
+    event_url = "/api/v1/events/"
+    event_detail_url = "/api/v1/events/{event_id}/"
+
+    def get_members(self, event):
+        """Участники мероприятия и их флаги организатора."""
+        return dict(
+            EventMember.objects.filter(event=event).values_list(
+                "user_id", "is_organizer"
+            )
+        )
+
+    def test_create_event_with_members(
+        self, user_client, user, another_user, third_user
+    ):
+        """Участники создаются без запроса на каждого пользователя."""
+        data = {
+            "name": "Встреча",
+            "description": "Описание",
+            "event_type": "Прогулка",
+            "members": [{"id": user.id}],
+        }
+        with CaptureQueriesContext(connection) as single:
+            response = user_client.post(self.event_url, data, format="json")
+        assert response.status_code == HTTPStatus.CREATED
+        data["members"] = [
+            {"id": member.id} for member in (user, another_user, third_user)
+        ]
+        with CaptureQueriesContext(connection) as many:
+            response = user_client.post(self.event_url, data, format="json")
+        assert response.status_code == HTTPStatus.CREATED
+        assert len(many) == len(single)
+        assert self.get_members(response.json()["id"]) == {
+            user.id: False,
+            another_user.id: False,
+            third_user.id: False,
+        }
+
+    def test_update_members_keeps_organizer(
+        self, user_client, user, another_user, third_user, event_1
+    ):
+        """Обновление участников сохраняет организатора."""
+        user.is_staff = True
+        user.save()
+        EventMember.objects.create(event=event_1, user=user, is_organizer=True)
+        EventMember.objects.create(
+            event=event_1, user=another_user, is_organizer=False
+        )
+        response = user_client.patch(
+            self.event_detail_url.format(event_id=event_1.id),
+            {"members": [{"id": third_user.id}]},
+            format="json",
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert self.get_members(event_1) == {
+            user.id: True,
+            third_user.id: False,
+        }
+
+    @pytest.mark.parametrize(
+        "members", [[{"id": 0}], [{"user": 1}], "1", [{"id": "x"}]]
+    )
+    def test_create_event_with_invalid_members(self, user_client, members):
+        """Мероприятие с неверным списком участников не создаётся."""
+        response = user_client.post(
+            self.event_url,
+            {
+                "name": "Встреча",
+                "description": "Описание",
+                "event_type": "Прогулка",
+                "members": members,
+            },
+            format="json",
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert "members" in response.json()
+        assert not Event.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestEventList:
+    """Тесты списка мероприятий."""
+
+    event_url = "/api/v1/events/"
+
+    def create_event(self, number, members):
+        """Мероприятие с участниками."""
+        event = Event.objects.create(
+            name=f"Мероприятие {number}",
+            description="Описание",
+            event_type="Прогулка",
+        )
+        for member in members:
+            EventMember.objects.create(
+                event=event, user=member, is_organizer=False
+            )
+        return event
+
+    def test_event_list_constant_queries(
+        self, client, user, another_user, third_user
+    ):
+        """Число запросов не зависит от числа мероприятий на странице."""
+        self.create_event(0, [user])
+        with CaptureQueriesContext(connection) as single:
+            client.get(self.event_url)
+        for number in range(1, 4):
+            self.create_event(number, [user, another_user, third_user])
+        with CaptureQueriesContext(connection) as many:
+            response = client.get(self.event_url)
+        assert len(many) == len(single)
+        results = response.json()["results"]
+        assert sorted(
+            (event["members_count"], len(event["members"]))
+            for event in results
+        ) == [(1, 1), (3, 3), (3, 3), (3, 3)]
+
+    def test_event_list_without_members(self, client, user, another_user):
+        """Список участников можно исключить из ответа."""
+        event = self.create_event(0, [user, another_user])
+        response = client.get(self.event_url, {"include_members": "false"})
+        result = response.json()["results"][0]
+        assert "members" not in result
+        assert result["members_count"] == 2
+        response = client.get(f"{self.event_url}{event.id}/")
+        assert sorted(
+            member["id"] for member in response.json()["members"]
+        ) == [user.id, another_user.id]
+
+    def test_members_count_is_read_only(self, user_client):
+        """Число участников нельзя задать при создании."""
+        response = user_client.post(
+            self.event_url,
+            {
+                "name": "Встреча",
+                "description": "Описание",
+                "event_type": "Прогулка",
+                "members_count": 10,
+            },
+            format="json",
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        assert response.json()["members_count"] == 0
+
+
+@pytest.mark.django_db(transaction=True)
+class TestEventNearFilter:
+    """Тесты фильтрации мероприятий по расстоянию."""
+
+    event_url = "/api/v1/events/"
+    center = "55.7558,37.6173"
+
+    @pytest.fixture
+    def events(self):
+        """Мероприятия в центре Москвы, в Москве и в Санкт-Петербурге."""
+        events = {}
+        for name, event_type, lat, lon in (
+            ("Кремль", "Прогулка", 55.7520, 37.6175),
+            ("Парк", "Прогулка", 55.7298, 37.6010),
+            ("Концерт", "Концерт", 55.7600, 37.6200),
+            ("Эрмитаж", "Прогулка", 59.9398, 30.3146),
+        ):
+            events[name] = Event.objects.create(
+                name=name, description="Описание", event_type=event_type
+            )
+            EventLocation.objects.create(event=events[name], lat=lat, lon=lon)
+        Event.objects.create(
+            name="Без адреса", description="Описание", event_type="Прогулка"
+        )
+        return events
+
+    def test_near_radius_ordering(self, client, events):
+        """Ближайшие мероприятия в радиусе с учётом других фильтров."""
+        response = client.get(
+            self.event_url,
+            {
+                "near": self.center,
+                "radius": 10,
+                "ordering": "distance",
+                "event_type": "Прогулка",
+            },
+        )
+        assert response.status_code == HTTPStatus.OK
+        data = response.json()
+        assert data["count"] == 2
+        assert [event["name"] for event in data["results"]] == [
+            "Кремль",
+            "Парк",
+        ]
+        assert data["results"][0]["distance"] == pytest.approx(0.42, abs=0.01)
+        assert data["results"][1]["distance"] == pytest.approx(3.06, abs=0.01)
+
+    def test_near_default_radius(self, client, events):
+        """Без radius используется радиус по умолчанию."""
+        response = client.get(
+            self.event_url, {"near": self.center, "ordering": "distance"}
+        )
+        names = [event["name"] for event in response.json()["results"]]
+        assert names == ["Кремль", "Концерт", "Парк"]
+
+    def test_distance_without_near(self, client, events):
+        """Без near расстояние не вычисляется."""
+        response = client.get(self.event_url)
+        assert all(
+            event["distance"] is None for event in response.json()["results"]
+        )
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {"near": "55.75"},
+            {"near": "abc,def"},
+            {"near": "95,37"},
+            {"near": "55.75,37.61", "radius": -1},
+            {"ordering": "distance"},
+            {"near": "55.75,37.61", "ordering": "name"},
+        ],
+    )
+    def test_invalid_near_params(self, client, events, params):
+        """Неверные параметры поиска по расстоянию."""
+        response = client.get(self.event_url, params)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.django_db(transaction=True)
+class TestEventDateFilters:
+    """Тесты фильтрации мероприятий по датам."""
+
+    event_url = "/api/v1/events/"
+
+    def create_event(self, name, start_date, end_date=None):
+        """Мероприятие с датами."""
+        return Event.objects.create(
+            name=name,
+            description="Описание",
+            event_type="Прогулка",
+            start_date=start_date,
+            end_date=end_date,
+        )
+
+    def get_names(self, client, params):
+        """Названия найденных мероприятий."""
+        response = client.get(self.event_url, {**params, "limit": 100})
+        assert response.status_code == HTTPStatus.OK
+        return sorted(event["name"] for event in response.json()["results"])
+
+    def test_date_filter(self, client):
+        """Фильтр по дате учитывает мероприятия, идущие в этот день."""
+        now = timezone.now()
+        day = timezone.localdate() + timedelta(days=10)
+        self.create_event("Идёт", now, now + timedelta(days=20))
+        self.create_event("Без окончания", now)
+        self.create_event(
+            "В этот день", get_day_bounds(day)[0] + timedelta(hours=12)
+        )
+        self.create_event("Закончилось", now, now + timedelta(days=2))
+        self.create_event("Позже", now + timedelta(days=15))
+        assert self.get_names(client, {"date": day.isoformat()}) == [
+            "В этот день",
+            "Идёт",
+        ]
+
+    def test_event_without_end_date(self, client):
+        """Все фильтры по датам одинаково понимают пустую дату окончания.
+
+        Мероприятие без даты окончания проходит в момент начала.
+        """
+        today = timezone.localdate()
+        yesterday = today - timedelta(days=1)
+        start = get_day_bounds(yesterday)[0] + timedelta(hours=12)
+        self.create_event("Вчера", start)
+        assert self.get_names(client, {"date": yesterday.isoformat()}) == [
+            "Вчера"
+        ]
+        assert self.get_names(
+            client,
+            {
+                "date_from": get_day_bounds(yesterday)[0].isoformat(),
+                "date_to": get_day_bounds(yesterday)[1].isoformat(),
+            },
+        ) == ["Вчера"]
+        assert self.get_names(client, {"date": today.isoformat()}) == []
+        assert (
+            self.get_names(
+                client, {"date_from": get_day_bounds(today)[0].isoformat()}
+            )
+            == []
+        )
+        assert self.get_names(client, {"period": "upcoming"}) == []
+
+    def test_invalid_date(self, client):
+        """Дата в неверном формате."""
+        response = client.get(self.event_url, {"date": "10.03.2024"})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_date_window_and_upcoming(self, client):
+        """Фильтры интервала дат и предстоящих мероприятий."""
+        now = timezone.now()
+        self.create_event("Прошло", now - timedelta(days=3))
+        self.create_event(
+            "Идёт", now - timedelta(days=1), now + timedelta(days=1)
+        )
+        self.create_event("Через неделю", now + timedelta(days=7))
+        self.create_event("Через месяц", now + timedelta(days=30))
+        assert self.get_names(
+            client,
+            {
+                "date_from": now.isoformat(),
+                "date_to": (now + timedelta(days=8)).isoformat(),
+            },
+        ) == ["Идёт", "Через неделю"]
+        assert self.get_names(client, {"period": "upcoming"}) == [
+            "Идёт",
+            "Через месяц",
+            "Через неделю",
+        ]
+
+    def test_weekend(self, client):
+        """Мероприятия текущих или ближайших выходных."""
+        start, end = get_weekend_bounds()
+        assert start.weekday() == 5
+        assert end - start == timedelta(days=2)
+        self.create_event("Суббота", start + timedelta(hours=12))
+        self.create_event("Воскресенье", end - timedelta(hours=1))
+        self.create_event("Понедельник", end)
+        self.create_event("Пятница", start - timedelta(hours=1))
+        assert self.get_names(client, {"period": "weekend"}) == [
+            "Воскресенье",
+            "Суббота",
+        ]
+
+    def test_benchmark_event_dates(self):
+        """Команда замера выводит планы и удаляет временные данные."""
+        out = StringIO()
+        call_command(
+            "benchmark_event_dates",
+            events=200,
+            cities=2,
+            repeat=1,
+            stdout=out,
+        )
+        assert "event_dates_idx" in out.getvalue()
+        assert not Event.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestEventOrganizer:
+    """Тесты организатора мероприятия."""
+
+    event_url = "/api/v1/events/"
+    accept_url = "/api/v1/participation/{request_id}/accept/"
+
+    @pytest.fixture
+    def organized_event(self, event_1, user, another_user):
+        """Мероприятие, организованное пользователем 1."""
+        EventMember.objects.create(event=event_1, user=user, is_organizer=True)
+        EventMember.objects.create(
+            event=event_1, user=another_user, is_organizer=False
+        )
+        event_1.refresh_from_db()
+        return event_1
+
+    def test_organizer_sync(self, organized_event, user):
+        """Организатор и его имя обновляются вместе с участниками."""
+        assert organized_event.organizer == user
+        assert organized_event.organizer_name == "тестовый юзер"
+        user.last_name = "Организатор"
+        user.save()
+        organized_event.refresh_from_db()
+        assert organized_event.organizer_name == "тестовый организатор"
+        EventMember.objects.filter(user=user).delete()
+        organized_event.refresh_from_db()
+        assert organized_event.organizer is None
+        assert organized_event.organizer_name == ""
+
+    def test_members_update_keeps_organizer(
+        self, user_client, organized_event, user, third_user
+    ):
+        """Обновление состава участников не меняет организатора."""
+        user.is_staff = True
+        user.save()
+        user_client.patch(
+            f"{self.event_url}{organized_event.id}/",
+            {"members": [{"id": third_user.id}]},
+            format="json",
+        )
+        organized_event.refresh_from_db()
+        assert organized_event.organizer == user
+
+    def test_filter_by_organizer_name(self, client, organized_event, event_2):
+        """Поиск мероприятий по части имени организатора."""
+        for value in ("ЮЗЕР", "тест", "стовый ю"):
+            response = client.get(self.event_url, {"organizer": value})
+            assert [event["id"] for event in response.json()["results"]] == [
+                organized_event.id
+            ], value
+        response = client.get(self.event_url, {"organizer": "Второй"})
+        assert response.json()["results"] == []
+
+    def test_filter_organizer_is_friend(
+        self, create_token, organized_event, event_2, friends, another_user
+    ):
+        """Фильтр мероприятий, организованных друзьями."""
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f"Token {create_token(another_user)}"
+        )
+        response = client.get(self.event_url, {"organizer_is_friend": True})
+        assert [event["id"] for event in response.json()["results"]] == [
+            organized_event.id
+        ]
+
+    def test_organizer_permission(
+        self, user_client, third_user_client, organized_event, third_user
+    ):
+        """Заявку принимает только организатор мероприятия."""
+        participation = ParticipationRequest.objects.create(
+            from_user=third_user, event=organized_event
+        )
+        url = self.accept_url.format(request_id=participation.id)
+        response = third_user_client.post(url)
+        assert response.status_code == HTTPStatus.FORBIDDEN
+        response = user_client.post(url)
+        assert response.status_code == HTTPStatus.OK
+        assert EventMember.objects.filter(
+            event=organized_event, user=third_user, is_organizer=False
+        ).exists()
@@ -0,0 +1,119 @@
+from http import HTTPStatus
+
+import pytest
+from rest_framework.test import APIClient
+
+from api.recommendations import compute_recommendations
+from api.services import FriendshipService
+from users.models import (
+    Blacklist,
+    City,
+    FriendLink,
+    FriendRecommendation,
+    Friendship,
+)
+
+API_URL = "/api/v1"
+
+
+@pytest.mark.django_db(transaction=True)
+class TestFriendsAPI:
+    """Тесты графа друзей."""
+
+    def test_friend_links_symmetric(self, user, another_user, friends):
+        """Проверка создания связей дружбы в обоих направлениях."""
+        assert set(FriendLink.objects.values_list("user_id", "friend_id")) == {
+            (user.id, another_user.id),
+            (another_user.id, user.id),
+        }, "Проверьте, что для дружбы создаются связи в обоих направлениях."
+        assert FriendshipService.are_friends(another_user.id, user.id)
+        friends.delete()
+        assert not FriendLink.objects.exists()
+        assert not FriendshipService.are_friends(
+            another_user.id, user.id
+        ), "Проверьте, что кэш друзей сбрасывается при удалении дружбы."
+
+    @pytest.mark.parametrize("client_name", ["user", "another_user"])
+    def test_my_friends_both_directions(
+        self, create_token, user, another_user, friends, client_name
+    ):
+        """Проверка списка друзей инициатора и друга."""
+        current_user = user if client_name == "user" else another_user
+        other_user = another_user if client_name == "user" else user
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f"Token {create_token(current_user)}"
+        )
+        url = f"{API_URL}/users/my_friends/"
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        assert [item["id"] for item in response.json()] == [other_user.id], (
+            f"Проверьте, что ответ на GET-запрос к `{url}` содержит друзей "
+            "независимо от того, кто был инициатором дружбы."
+        )
+        assert response.json()[0]["friends"][0]["id"] == current_user.id
+
+    def test_remove_friend_on_update(
+        self, user_client, user, another_user, friends
+    ):
+        """Проверка удаления друга при обновлении пользователя."""
+        url = f"{API_URL}/users/{user.id}/"
+        response = user_client.patch(url, data={"friends": []}, format="json")
+        assert response.status_code == HTTPStatus.OK
+        assert not Friendship.objects.exists(), (
+            f"Проверьте, что PATCH-запрос к `{url}` удаляет дружбу с "
+            "пользователями, отсутствующими в списке друзей."
+        )
+        assert not FriendshipService.are_friends(user.id, another_user.id)
+
+    def test_recommendations_friends_of_friends(
+        self, user_client, user, another_user, third_user, friends
+    ):
+        """Проверка рекомендации друзей друзей."""
+        Friendship.objects.create(initiator=third_user, friend=another_user)
+        url = f"{API_URL}/users/recommendations/"
+        response = user_client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        info = response.json()["results"]
+        assert [item["id"] for item in info] == [third_user.id], (
+            f"Проверьте, что ответ на GET-запрос к `{url}` содержит друзей "
+            "друзей и не содержит текущих друзей."
+        )
+        assert info[0]["mutual_friends"] == 1
+        Blacklist.objects.create(user=third_user, blocked_user=user)
+        response = user_client.get(url)
+        assert response.json()["results"] == [], (
+            f"Проверьте, что ответ на GET-запрос к `{url}` не содержит "
+            "пользователей из черного списка."
+        )
+        assert not FriendRecommendation.objects.filter(user=user).exists()
+
+    def test_recommendations_refreshed_for_affected_users(
+        self, user, another_user, third_user, city
+    ):
+        """Проверка пересчёта чужих рекомендаций при смене профиля."""
+        for member in (user, another_user, third_user):
+            member.city = city
+            member.save()
+        compute_recommendations(another_user.id)
+        assert FriendRecommendation.objects.filter(
+            user=another_user, candidate=user
+        ).exists()
+
+        user.city = City.objects.create(name="Тула")
+        user.save()
+        assert not FriendRecommendation.objects.filter(
+            user=another_user, candidate=user
+        ).exists(), (
+            "Проверьте, что после смены города пересчитываются "
+            "рекомендации пользователей, которым он был рекомендован."
+        )
+
+        third_user.is_active = False
+        third_user.save(update_fields=["is_active"])
+        assert not FriendRecommendation.objects.filter(
+            candidate=third_user
+        ).exists(), (
+            "Проверьте, что неактивные пользователи удаляются из "
+            "рекомендаций."
+        )
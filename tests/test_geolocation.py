@@ -1,7 +1,16 @@
 from http import HTTPStatus
+from math import radians
 
 import pytest
 
+from api.geo import (
+    get_client_ip,
+    get_distance,
+    get_distances,
+    get_geo_ip,
+    get_geoip_cache_stats,
+)
+from config.constants import EARTH_RADIUS_KM
 from users.models import UserLocation
 
 API_URL = "/api/v1"
@@ -190,7 +199,7 @@ class TestUserGeolocatioAPI:
         url = f"{API_URL}/users/{user.id}/"
         user.is_geoip_allowed = True
         user.save()
-        response = user_client.get(url)
+        response = user_client.get(url, HTTP_X_REAL_IP="77.88.55.242")
         assert response.status_code == HTTPStatus.OK, (
             "Проверьте, что авторизованному пользователю при попытке "
             "сохранить геолокацию возвращается статус 200."
@@ -204,6 +213,70 @@ class TestUserGeolocatioAPI:
             f"Проверьте, что " f"сохранена геолокация пользователя:`{user}`"
         )
 
+    def test_user_location_refresh_throttled(
+        self, monkeypatch, user_client, user
+    ):
+        """Проверка ограничения частоты обновления геолокации."""
+        client_ips = []
+
+        def fake_geo_ip(ip_address):
+            client_ips.append(ip_address)
+            return {"latitude": 55.7386, "longitude": 37.6068}
+
+        monkeypatch.setattr("api.geo.get_geo_ip", fake_geo_ip)
+        url = f"{API_URL}/users/{user.id}/"
+        user.is_geoip_allowed = True
+        user.save()
+        for _ in range(3):
+            response = user_client.get(
+                url,
+                HTTP_X_REAL_IP="77.88.55.242",
+                HTTP_X_FORWARDED_FOR="10.0.0.1, 77.88.55.242",
+            )
+            assert response.status_code == HTTPStatus.OK
+        assert client_ips == ["77.88.55.242"], (
+            "Проверьте, что геолокация определяется по IP-адресу клиента "
+            "из X-Real-IP, а не из подделываемого клиентом X-Forwarded-For, "
+            "и не чаще одного раза за период ограничения."
+        )
+        assert UserLocation.objects.filter(user=user).count() == 1
+
+    def test_geo_ip_cached(self, monkeypatch):
+        """Проверка кэширования определения геолокации по IP-адресу."""
+        lookups = []
+
+        class FakeReader:
+            def city(self, ip_address):
+                lookups.append(ip_address)
+                return {"latitude": 55.7386, "longitude": 37.6068}
+
+        monkeypatch.setattr("api.geo._geoip_reader", FakeReader())
+        for _ in range(3):
+            assert get_geo_ip("77.88.55.242")["latitude"] == 55.7386
+        assert lookups == ["77.88.55.242"], (
+            "Проверьте, что повторные запросы геолокации по одному "
+            "IP-адресу обслуживаются из кэша."
+        )
+        assert get_geoip_cache_stats()["hits"] == 2
+
+    def test_client_ip_ignores_forwarded_for(self, rf):
+        """Проверка, что IP-адрес клиента берётся из X-Real-IP."""
+        request = rf.get(
+            "/",
+            HTTP_X_FORWARDED_FOR="1.2.3.4, 77.88.55.242",
+            HTTP_X_REAL_IP="77.88.55.242",
+            REMOTE_ADDR="172.18.0.5",
+        )
+        assert get_client_ip(request) == "77.88.55.242", (
+            "Проверьте, что IP-адрес клиента берётся из заголовка "
+            "X-Real-IP, который выставляет nginx."
+        )
+        request = rf.get("/", HTTP_X_FORWARDED_FOR="1.2.3.4")
+        assert get_client_ip(request) == "127.0.0.1", (
+            "Проверьте, что без X-Real-IP используется REMOTE_ADDR, "
+            "а не подделываемый клиентом X-Forwarded-For."
+        )
+
     def test_user_get_location_not_auth(
         self, client, another_user, user_location_2
     ):
@@ -293,6 +366,12 @@ class TestUserGeolocatioAPI:
                 f"неполную информацию о рассстоянии. Проверьте, что поле "
                 f"`{field}` получено из модели `UserLocation`."
             )
+        response = user_client.get(f"{API_URL}/users/distances/")
+        nearby = response.json()["results"]
+        assert [item["distance"] for item in nearby] == [info["distance"]], (
+            f"Проверьте, что `{url}` и список расстояний возвращают "
+            "одинаковое расстояние для одной пары пользователей."
+        )
 
     def test_user_get_distances_not_auth(
         self, client, user, another_user, user_location_1, user_location_2
@@ -317,7 +396,7 @@ class TestUserGeolocatioAPI:
             "Проверьте, что авторизованному пользователю при попытке "
             "получения расстояния без разрешения возвращается статус 200."
         )
-        info = response.json()
+        info = response.json()["results"]
         assert len(info) == 0, (
             "Проверьте, что авторизованному пользователю при попытке "
             "получения расстояния без разрешения возвращается пустой список."
@@ -338,7 +417,7 @@ class TestUserGeolocatioAPI:
             "получения расстояний с разрешением возвращается статус 200."
         )
         fields = ["user", "first_name", "last_name", "distance"]
-        info = response.json()[0]
+        info = response.json()["results"][0]
         for field in fields:
             assert field in info, (
                 f"Ответ на GET-запрос к `{url}` содержит "
@@ -360,8 +439,107 @@ class TestUserGeolocatioAPI:
             "Проверьте, что авторизованному пользователю при попытке "
             "получения расстояний с разрешением возвращается статус 200."
         )
-        info = response.json()
+        info = response.json()["results"]
         assert len(info) == 0, (
             "Проверьте, что авторизованному пользователю при попытке "
             "получения расстояния с ограничением возвращается пустой список."
         )
+
+    def test_user_get_distances_nearest_first(
+        self,
+        user_client,
+        user,
+        another_user,
+        third_user,
+        user_location_1,
+        user_location_2,
+    ):
+        """Проверка сортировки пользователей по возрастанию расстояния."""
+        url = f"{API_URL}/users/distances/"
+        UserLocation.objects.create(user=third_user, lon=37.6, lat=55.75)
+        for allowed_user in (user, another_user, third_user):
+            allowed_user.is_geoip_allowed = True
+            allowed_user.save()
+        response = user_client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        info = response.json()["results"]
+        assert [item["user"] for item in info] == [
+            third_user.id,
+            another_user.id,
+        ], (
+            f"Проверьте, что ответ на GET-запрос к `{url}` отсортирован "
+            "по возрастанию расстояния."
+        )
+        assert UserLocation.objects.get(user=third_user).geohash, (
+            "Проверьте, что при сохранении геолокации пользователя "
+            "заполняется геохеш."
+        )
+
+
+class TestGetDistances:
+    """Тесты пакетного расчёта расстояний."""
+
+    # Точки на экваторе в 3, 1, 2 и 0.5 градусах долготы от начала
+    origin = (0, 0)
+    coordinates = [(0, 3), (0, 1), (0, 2), (0, 0.5)]
+    degree = round(radians(1) * EARTH_RADIUS_KM, 3)
+
+    def test_sorted_by_distance(self):
+        """Проверка расстояний и сортировки по возрастанию."""
+        indexes, distances = get_distances(self.origin, self.coordinates)
+        assert indexes.tolist() == [3, 1, 2, 0], (
+            "Проверьте, что индексы отсортированы по возрастанию "
+            "расстояния."
+        )
+        assert distances.tolist() == pytest.approx(
+            [self.degree / 2, self.degree, self.degree * 2, self.degree * 3],
+            abs=0.01,
+        )
+
+    def test_max_distance(self):
+        """Проверка отсечения точек дальше max_distance."""
+        indexes, distances = get_distances(
+            self.origin, self.coordinates, max_distance=self.degree * 2.5
+        )
+        assert indexes.tolist() == [
+            3,
+            1,
+            2,
+        ], "Проверьте, что точки дальше max_distance отсекаются."
+        assert max(distances) <= self.degree * 2.5
+
+    @pytest.mark.parametrize(
+        "limit, max_distance, expected",
+        [
+            (2, None, [3, 1]),
+            (1, None, [3]),
+            (10, None, [3, 1, 2, 0]),
+            (2, 100, [3]),
+            (3, 250, [3, 1, 2]),
+        ],
+    )
+    def test_limit(self, limit, max_distance, expected):
+        """Проверка, что limit оставляет ближайшие точки."""
+        indexes, _ = get_distances(
+            self.origin,
+            self.coordinates,
+            max_distance=max_distance,
+            limit=limit,
+        )
+        assert indexes.tolist() == expected, (
+            "Проверьте, что limit оставляет не более limit ближайших "
+            "точек в радиусе max_distance."
+        )
+
+    def test_single_distance(self):
+        """Проверка расстояния между двумя точками."""
+        _, distances = get_distances(self.origin, self.coordinates)
+        assert get_distance(self.origin, self.coordinates[1]) == distances[1]
+
+    def test_empty(self):
+        """Проверка расчёта для пустого списка координат."""
+        indexes, distances = get_distances(
+            self.origin, [], max_distance=10, limit=5
+        )
+        assert len(indexes) == 0
+        assert len(distances) == 0